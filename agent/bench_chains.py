@@ -0,0 +1,90 @@
+"""
+提示词链构建开销微基准
+对比每次请求重新构建 ChatPromptTemplate | llm | StrOutputParser（旧方式）与
+使用 ChainRegistry 预构建链（新方式）的单次调用开销。
+使用本地假模型，不发起网络请求，测得的差值即每次调用的链构建开销。
+
+用法:
+    python bench_chains.py
+    python bench_chains.py --iterations 5000
+"""
+
+import time
+import argparse
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+
+from prompt_chains import ChainRegistry, load_prompts
+
+
+SAMPLE_TEXT = "LangGraph 用状态图编排 LLM 调用。配置示例: {\"retries\": 3}。" * 4
+
+
+def _per_call_us(func, iterations: int) -> float:
+    func()  # 预热
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="提示词链构建开销微基准")
+    parser.add_argument("--iterations", type=int, default=2000, help="每项测量的调用次数")
+    args = parser.parse_args()
+
+    llm = FakeListChatModel(responses=["ok"])
+    config = load_prompts()["agent"]
+    chains = ChainRegistry(llm, config)
+
+    # 旧方式：用户文本拼进模板，每次调用重新构建链（文本中的花括号会被当作模板变量）
+    def rebuild_summarize():
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", config["summarize"]["system_prompt"]),
+            ("human", f"请对以下文本进行总结：\n\n{SAMPLE_TEXT.replace('{', '{{').replace('}', '}}')}")
+        ])
+        return (prompt | llm | StrOutputParser()).invoke({})
+
+    def prebuilt_summarize():
+        return chains["summarize"].invoke({"text": SAMPLE_TEXT, "length_requirement": ""})
+
+    def rebuild_response():
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", config["response"]["system_prompt"]),
+            ("human", "{input}")
+        ])
+        return (prompt | llm | StrOutputParser()).invoke({"context": SAMPLE_TEXT, "input": "总结一下"})
+
+    def prebuilt_response():
+        return chains["response"].invoke({"context": SAMPLE_TEXT, "input": "总结一下"})
+
+    def build_only():
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", config["response"]["system_prompt"]),
+            ("human", "{input}")
+        ])
+        return prompt | llm | StrOutputParser()
+
+    print(f"每项 {args.iterations} 次调用，单位: 微秒/次（假模型，不含网络耗时）\n")
+    print(f"{'链':<12} {'每次重建':>10} {'预构建':>10} {'节省':>10}")
+    for name, rebuild, prebuilt in (
+        ("summarize", rebuild_summarize, prebuilt_summarize),
+        ("response", rebuild_response, prebuilt_response),
+    ):
+        before = _per_call_us(rebuild, args.iterations)
+        after = _per_call_us(prebuilt, args.iterations)
+        print(f"{name:<12} {before:>10.1f} {after:>10.1f} {before - after:>10.1f}")
+    print(f"\n仅构建模板和链: {_per_call_us(build_only, args.iterations):.1f} 微秒/次")
+
+    # 旧方式未转义时，文本中的花括号会导致模板解析失败
+    try:
+        ChatPromptTemplate.from_messages([("human", f"请对以下文本进行总结：\n\n{SAMPLE_TEXT}")]).invoke({})
+        print("未转义的花括号: 旧方式正常")
+    except Exception as e:
+        print(f"未转义的花括号: 旧方式失败 ({type(e).__name__})，预构建链不受影响")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,6 @@
 """
 
 import os
-import json
-from pathlib import Path
 from typing import List, Dict, Optional
 from dotenv import load_dotenv
 
@@ -16,6 +14,7 @@ from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 
 from memory_store import MemoryStore
+from prompt_chains import ChainRegistry, load_prompts
 
 
 class SimpleConversationMemory:
@@ -62,6 +61,22 @@ class ChatbotWithMemory:
     6. 支持文本总结、信息提取等多种功能
     """
     
+    # prompts.json 中未配置时使用的总结 / 信息提取 / 翻译提示词
+    _TASK_PROMPT_DEFAULTS = {
+        "summarize": {
+            "system_prompt": "你是一个专业的文本总结助手。",
+            "user_template": "请对以下文本进行总结：\n\n{text}{length_requirement}"
+        },
+        "extract_info": {
+            "system_prompt": "你是一个信息提取专家。",
+            "user_template": "请从以下文本中提取关键信息：\n\n{text}"
+        },
+        "translate": {
+            "system_prompt": "你是一个专业的翻译助手。",
+            "user_template": "请将以下文本翻译成{target_language}：\n\n{text}"
+        }
+    }
+    
     def __init__(
         self,
         api_key: Optional[str] = None,
@@ -128,6 +143,12 @@ class ChatbotWithMemory:
         
         # 构建 LCEL 链
         self.chain = self.prompt | self.llm | StrOutputParser()
+        
+        # 预构建总结 / 信息提取 / 翻译链（用户文本通过变量传入，不再拼进模板）
+        self.task_chains = ChainRegistry(self.llm, {
+            name: {**default, **self.prompts.get(name, {})}
+            for name, default in self._TASK_PROMPT_DEFAULTS.items()
+        })
 
     def _load_prompts(self, prompts_file: str) -> Dict:
         """
@@ -139,32 +160,7 @@ class ChatbotWithMemory:
         Returns:
             prompt配置字典
         """
-        prompts_path = Path(prompts_file)
-        
-        # 如果是相对路径，从当前脚本目录查找
-        if not prompts_path.is_absolute():
-            script_dir = Path(__file__).parent
-            prompts_path = script_dir / prompts_file
-        
-        try:
-            with open(prompts_path, 'r', encoding='utf-8') as f:
-                prompts = json.load(f)
-            print(f"✓ 成功加载 prompt 配置文件: {prompts_path}")
-            return prompts
-        except FileNotFoundError:
-            print(f"⚠ 未找到 prompt 配置文件: {prompts_path}，使用默认配置")
-            return {
-                "chat": {
-                    "system_prompt": "你是一个友好、有帮助的AI助手。"
-                }
-            }
-        except json.JSONDecodeError as e:
-            print(f"⚠ prompt 配置文件格式错误: {e}，使用默认配置")
-            return {
-                "chat": {
-                    "system_prompt": "你是一个友好、有帮助的AI助手。"
-                }
-            }
+        return load_prompts(prompts_file)
 
     def _build_memory_context(self, query: str) -> str:
         """
@@ -270,26 +266,11 @@ class ChatbotWithMemory:
         Returns:
             总结后的文本
         """
-        # 获取总结的 prompt 配置
-        summarize_config = self.prompts.get("summarize", {})
-        system_prompt = summarize_config.get("system_prompt", "你是一个专业的文本总结助手。")
-        user_template = summarize_config.get("user_template", "请对以下文本进行总结：\n\n{text}")
-        
-        # 构建总结提示
-        user_message = user_template.format(text=text)
-        if max_length:
-            user_message += f"\n\n要求：总结长度不超过{max_length}字。"
-        
-        # 创建简单的总结链
-        summarize_prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("human", user_message)
-        ])
-        
-        summarize_chain = summarize_prompt | self.llm | StrOutputParser()
-        
         try:
-            summary = summarize_chain.invoke({})
+            summary = self.task_chains["summarize"].invoke({
+                "text": text,
+                "length_requirement": f"\n\n要求：总结长度不超过{max_length}字。" if max_length else ""
+            })
             return summary
         except Exception as e:
             return f"总结失败: {str(e)}"
@@ -304,21 +285,8 @@ class ChatbotWithMemory:
         Returns:
             提取的关键信息
         """
-        extract_config = self.prompts.get("extract_info", {})
-        system_prompt = extract_config.get("system_prompt", "你是一个信息提取专家。")
-        user_template = extract_config.get("user_template", "请从以下文本中提取关键信息：\n\n{text}")
-        
-        user_message = user_template.format(text=text)
-        
-        extract_prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("human", user_message)
-        ])
-        
-        extract_chain = extract_prompt | self.llm | StrOutputParser()
-        
         try:
-            result = extract_chain.invoke({})
+            result = self.task_chains["extract_info"].invoke({"text": text})
             return result
         except Exception as e:
             return f"信息提取失败: {str(e)}"
@@ -334,21 +302,8 @@ class ChatbotWithMemory:
         Returns:
             翻译后的文本
         """
-        translate_config = self.prompts.get("translate", {})
-        system_prompt = translate_config.get("system_prompt", "你是一个专业的翻译助手。")
-        user_template = translate_config.get("user_template", "请将以下文本翻译成{target_language}：\n\n{text}")
-        
-        user_message = user_template.format(text=text, target_language=target_language)
-        
-        translate_prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("human", user_message)
-        ])
-        
-        translate_chain = translate_prompt | self.llm | StrOutputParser()
-        
         try:
-            result = translate_chain.invoke({})
+            result = self.task_chains["translate"].invoke({"text": text, "target_language": target_language})
             return result
         except Exception as e:
             return f"翻译失败: {str(e)}"
@@ -361,18 +316,34 @@ class ChatbotWithMemory:
             "short_term_messages": len(chat_history)
         }
     
+    def get_memory_page(
+        self,
+        page: int = 1,
+        page_size: int = 20,
+        memory_type: Optional[str] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> Dict:
+        """分页浏览长时记忆（按时间倒序）"""
+        return self.memory_store.get_memory_page(page, page_size, memory_type, session_id, user_id)
+    
     def clear_short_term_memory(self):
         """清空短时记忆"""
         self.short_term_memory.clear()
     
-    def clear_all_memory(self):
-        """清空所有记忆"""
-        self.short_term_memory.clear()
-        self.memory_store.clear_all_memories()
+    def clear_all_memory(self, session_id: Optional[str] = None, user_id: Optional[str] = None) -> bool:
+        """清空所有记忆（指定 session_id / user_id 时只清空该命名空间的长时记忆）"""
+        if session_id is None and user_id is None:
+            self.short_term_memory.clear()
+        return self.memory_store.clear_all_memories(session_id=session_id, user_id=user_id)
+    
+    def export_memories(self, filepath: str, include_embeddings: bool = False) -> bool:
+        """导出长时记忆到 JSONL 文件（.gz 后缀自动压缩）"""
+        return self.memory_store.export_memories(filepath, include_embeddings=include_embeddings)
     
-    def export_memories(self, filepath: str) -> bool:
-        """导出长时记忆到文件"""
-        return self.memory_store.export_memories(filepath)
+    def import_memories(self, filepath: str) -> int:
+        """从导出文件导入长时记忆"""
+        return self.memory_store.import_memories(filepath)
     
     def get_retriever(self):
         """获取向量存储的 Retriever（用于 RAG）"""
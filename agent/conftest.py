@@ -0,0 +1,77 @@
+"""
+pytest 公共夹具
+用本地的字符哈希嵌入替代 HuggingFace 模型，在临时目录中创建真实的 Chroma 记忆存储。
+"""
+
+import hashlib
+from typing import List
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+import memory_store as memory_store_module
+from embedding_service import EmbeddingService
+
+
+class CharEmbeddings(Embeddings):
+    """按字符哈希计数的确定性嵌入：字符组成相近的文本向量相近"""
+
+    def __init__(self, size: int = 64):
+        self.size = size
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for char in text:
+            vector[int(hashlib.md5(char.encode("utf-8")).hexdigest(), 16) % self.size] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def embeddings():
+    return CharEmbeddings()
+
+
+@pytest.fixture
+def store_factory(tmp_path, monkeypatch, embeddings):
+    """
+    创建 MemoryStore 的工厂：默认使用同一个临时目录（可关闭后重新打开），
+    每个存储获取独立的 EmbeddingService，测试结束时关闭所有存储
+    """
+    services = {}
+    stores = []
+    monkeypatch.setattr(memory_store_module, "get_embedding_model", lambda name: embeddings)
+
+    def acquire(name):
+        service = EmbeddingService(embeddings, max_wait_ms=0)
+        services.setdefault(name, []).append(service)
+        return service
+
+    monkeypatch.setattr(memory_store_module, "acquire_embedding_service", acquire)
+    monkeypatch.setattr(memory_store_module, "release_embedding_service", lambda name: services[name].pop(0).close())
+
+    def create(**kwargs):
+        kwargs.setdefault("persist_directory", str(tmp_path / "chroma"))
+        kwargs.setdefault("collection_name", "test_memory")
+        store = memory_store_module.MemoryStore(**kwargs)
+        stores.append(store)
+        return store
+
+    yield create
+    for store in stores:
+        store.close()
+
+
+@pytest.fixture
+def memory_store(store_factory):
+    """基于临时目录和 CharEmbeddings 的 MemoryStore"""
+    return store_factory()
@@ -0,0 +1,157 @@
+"""
+上下文组装
+按 token 预算拼装放进提示词的上下文（记忆、搜索结果、工具结果、文件内容）：
+1. 使用 tiktoken 计数，每个来源有独立的 token 预算
+2. 条目按重要性排列（检索/重排序的顺序），放不下时先丢弃排在最后的条目，
+   跨越预算边界的条目截断，整段文本（工具结果、文件内容）保留开头并截断
+3. 记忆条目的 token 数按记忆ID缓存，重复检索到的记忆不再重新计数
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional, Tuple
+
+from ttl_cache import TTLCache
+
+
+_CJK_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af]")
+_TRUNCATED = "…(内容已截断)"
+
+
+class TokenCounter:
+    """
+    tiktoken 计数器
+
+    tiktoken 不可用（未安装或编码文件无法下载）时退化为估算：
+    CJK 字符按 1 token，其余字符按 4 个字符 1 token。
+    """
+
+    def __init__(self, encoding_name: str = "cl100k_base", cache_size: int = 4096):
+        self.encoding_name = encoding_name
+        self._cache = TTLCache(maxsize=cache_size, ttl=None)
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            print(f"⚠️ tiktoken 不可用，使用估算的 token 数: {e}")
+            self._encoding = None
+
+    def _estimate(self, text: str) -> int:
+        cjk = len(_CJK_PATTERN.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    def count(self, text: str, key: Optional[str] = None) -> int:
+        """
+        统计 token 数
+
+        Args:
+            text: 文本
+            key: 缓存键（如记忆ID）；为 None 时不缓存
+        """
+        if not text:
+            return 0
+        if key is not None:
+            # 同一ID的内容被覆盖写入时长度通常会变化，一并作为键
+            cache_key = (key, len(text))
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return cached
+        tokens = len(self._encoding.encode(text)) if self._encoding is not None else self._estimate(text)
+        if key is not None:
+            self._cache.set(cache_key, tokens)
+        return tokens
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """截断到最多 max_tokens 个 token（保留开头）"""
+        if max_tokens <= 0:
+            return ""
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text)
+            if len(tokens) <= max_tokens:
+                return text
+            # 截断点可能落在多字节字符中间，去掉解码出的替换字符
+            return self._encoding.decode(tokens[:max_tokens]).rstrip("\ufffd")
+        if self._estimate(text) <= max_tokens:
+            return text
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self._estimate(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low]
+
+    def stats(self) -> Dict:
+        return {"encoding": self.encoding_name if self._encoding is not None else "estimate", "cache": self._cache.stats()}
+
+
+def _default_budgets() -> Dict[str, int]:
+    return {
+        "memory": int(os.getenv("CONTEXT_MEMORY_TOKENS", "800")),
+        "search": int(os.getenv("CONTEXT_SEARCH_TOKENS", "1500")),
+        "tool": int(os.getenv("CONTEXT_TOOL_TOKENS", "1000")),
+        "file": int(os.getenv("CONTEXT_FILE_TOKENS", "4000")),
+    }
+
+
+@dataclass
+class ContextAssembler:
+    """
+    按来源分配 token 预算的上下文组装器
+
+    budgets: 各来源的 token 预算（memory / search / tool / file）
+    min_item_tokens: 截断后剩余不足该值的条目直接丢弃
+    """
+    counter: TokenCounter = field(default_factory=TokenCounter)
+    budgets: Dict[str, int] = field(default_factory=_default_budgets)
+    min_item_tokens: int = 24
+
+    def fit_items(
+        self,
+        source: str,
+        items: Iterable[Tuple[str, Optional[str]]],
+        header: str = ""
+    ) -> str:
+        """
+        在来源预算内拼装条目，条目按重要性从高到低排列
+
+        Args:
+            source: 来源（决定预算）
+            items: (条目文本, 缓存键) 列表；缓存键通常为记忆ID
+            header: 标题行（计入预算）
+
+        Returns:
+            拼装后的文本；没有条目时返回空字符串
+        """
+        items = list(items)
+        if not items:
+            return ""
+        budget = self.budgets.get(source, 0) - self.counter.count(header)
+        parts, dropped = [], 0
+        for index, (text, key) in enumerate(items):
+            tokens = self.counter.count(text, key)
+            if tokens <= budget:
+                parts.append(text)
+                budget -= tokens
+                continue
+            # 跨越预算边界的条目截断，之后的条目丢弃
+            if budget >= self.min_item_tokens:
+                truncated = self.counter.truncate(text, budget - self.counter.count(_TRUNCATED))
+                parts.append(truncated + _TRUNCATED + ("\n" if text.endswith("\n") else ""))
+            else:
+                dropped += 1
+            dropped += len(items) - index - 1
+            break
+        if dropped:
+            print(f"📐 上下文[{source}]: 超出 {self.budgets.get(source, 0)} token 预算，丢弃 {dropped} 条")
+        return header + "".join(parts) if parts else ""
+
+    def fit_text(self, source: str, text: str) -> str:
+        """把整段文本（工具结果、文件内容）截断到来源预算内，保留开头"""
+        budget = self.budgets.get(source, 0)
+        if not text or self.counter.count(text) <= budget:
+            return text
+        print(f"📐 上下文[{source}]: 超出 {budget} token 预算，已截断")
+        return self.counter.truncate(text, budget - self.counter.count(_TRUNCATED)) + _TRUNCATED
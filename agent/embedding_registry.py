@@ -0,0 +1,163 @@
+"""
+嵌入模型注册表
+进程内按模型名共享嵌入模型和嵌入服务：
+1. 模型延迟加载，首次嵌入（或预热）时才真正加载，同一模型在进程内只加载一次
+2. 同一模型的所有 MemoryStore 共享一个 EmbeddingService（查询缓存 + 微批处理），按引用计数关闭
+3. 启动时在后台预热（加载模型并做一次编码），健康检查据此报告就绪状态
+"""
+
+import os
+import time
+import threading
+from typing import Dict, List, Optional
+
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
+
+from embedding_service import EmbeddingService
+
+
+DEFAULT_EMBEDDING_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    延迟加载的 HuggingFace 嵌入模型
+
+    构造时不加载模型，第一次 embed_documents / embed_query 或 warmup 时加载，
+    并发的首次调用只会加载一次。
+    """
+
+    def __init__(self, model_name: str, device: str = "cpu"):
+        self.model_name = model_name
+        self.device = device
+        self.load_seconds: Optional[float] = None
+        self._model: Optional[HuggingFaceEmbeddings] = None
+        self._load_lock = threading.Lock()
+        self._warm = threading.Event()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def ready(self) -> bool:
+        """模型已加载且完成过一次编码"""
+        return self._warm.is_set()
+
+    @property
+    def model(self) -> HuggingFaceEmbeddings:
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    print(f"正在加载嵌入模型: {self.model_name}")
+                    started = time.monotonic()
+                    self._model = HuggingFaceEmbeddings(
+                        model_name=self.model_name,
+                        model_kwargs={'device': self.device},
+                        encode_kwargs={'normalize_embeddings': True}
+                    )
+                    self.load_seconds = round(time.monotonic() - started, 3)
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.model.embed_documents(texts)
+        self._warm.set()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.model.embed_query(text)
+        self._warm.set()
+        return vector
+
+    def warmup(self) -> float:
+        """加载模型并做一次编码（触发权重加载和首次推理的初始化开销），返回耗时（秒）"""
+        started = time.monotonic()
+        self.embed_documents(["warmup"])
+        return round(time.monotonic() - started, 3)
+
+
+_lock = threading.Lock()
+_models: Dict[str, LazyEmbeddings] = {}
+_services: Dict[str, EmbeddingService] = {}
+_service_refs: Dict[str, int] = {}
+
+
+def get_embedding_model(model_name: str = DEFAULT_EMBEDDING_MODEL) -> LazyEmbeddings:
+    """获取进程内共享的（延迟加载的）嵌入模型"""
+    with _lock:
+        model = _models.get(model_name)
+        if model is None:
+            model = _models[model_name] = LazyEmbeddings(model_name)
+        return model
+
+
+def acquire_embedding_service(model_name: str = DEFAULT_EMBEDDING_MODEL) -> EmbeddingService:
+    """
+    获取共享的嵌入服务（引用计数 +1），用完后调用 release_embedding_service
+
+    缓存和批处理参数从环境变量 EMBED_QUERY_CACHE_SIZE / EMBED_MAX_BATCH / EMBED_BATCH_WAIT_MS 读取。
+    """
+    model = get_embedding_model(model_name)
+    with _lock:
+        service = _services.get(model_name)
+        if service is None:
+            service = _services[model_name] = EmbeddingService(
+                model,
+                cache_size=int(os.getenv("EMBED_QUERY_CACHE_SIZE", "2048")),
+                max_batch_size=int(os.getenv("EMBED_MAX_BATCH", "64")),
+                max_wait_ms=float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+            )
+        _service_refs[model_name] = _service_refs.get(model_name, 0) + 1
+        return service
+
+
+def release_embedding_service(model_name: str = DEFAULT_EMBEDDING_MODEL) -> None:
+    """释放嵌入服务（引用计数 -1），最后一个使用者释放时停止微批处理线程"""
+    with _lock:
+        refs = _service_refs.get(model_name, 0) - 1
+        if refs > 0:
+            _service_refs[model_name] = refs
+            return
+        _service_refs.pop(model_name, None)
+        service = _services.pop(model_name, None)
+    if service is not None:
+        service.close()
+
+
+def warmup(model_names: Optional[List[str]] = None) -> Dict[str, float]:
+    """
+    预热嵌入模型（默认预热所有已注册的模型）
+
+    Returns:
+        {模型名: 预热耗时（秒）}
+    """
+    if model_names is None:
+        with _lock:
+            model_names = list(_models)
+    timings = {}
+    for model_name in model_names:
+        timings[model_name] = get_embedding_model(model_name).warmup()
+        print(f"🔥 嵌入模型预热完成: {model_name} ({timings[model_name]}s)")
+    return timings
+
+
+def is_ready() -> bool:
+    """所有已注册的嵌入模型都已预热（没有注册任何模型时为 False）"""
+    with _lock:
+        models = list(_models.values())
+    return bool(models) and all(model.ready for model in models)
+
+
+def get_status() -> Dict[str, Dict]:
+    """各嵌入模型的加载状态"""
+    with _lock:
+        models = list(_models.values())
+    return {
+        model.model_name: {
+            "loaded": model.loaded,
+            "ready": model.ready,
+            "load_seconds": model.load_seconds
+        }
+        for model in models
+    }
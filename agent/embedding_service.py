@@ -0,0 +1,186 @@
+"""
+嵌入服务层
+位于 MemoryStore 与 HuggingFace 嵌入模型之间：
+1. 查询向量 LRU 缓存（按规范化文本哈希，内存有界）
+2. 跨请求微批处理：多个线程同时发起的嵌入请求合并为一次模型前向计算
+"""
+
+import re
+import time
+import queue
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from ttl_cache import TTLCache
+
+
+class _EmbedRequest:
+    """一次待处理的嵌入请求"""
+
+    __slots__ = ("texts", "future")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+
+
+class EmbeddingService(Embeddings):
+    """
+    带缓存和微批处理的嵌入服务（实现 LangChain Embeddings 接口，可直接作为
+    Chroma 的 embedding_function）
+
+    特性：
+    1. embed_query 结果按规范化文本的哈希缓存，重复查询不再重新计算
+    2. 后台线程收集 max_wait_ms 内到达的所有请求（最多 max_batch_size 条文本），
+       合并为一次 embed_documents 调用，再把结果分发回各个调用方
+    3. max_wait_ms 为 0 时不做微批处理，直接在调用线程中计算
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache_size: int = 2048,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0
+    ):
+        """
+        初始化嵌入服务
+
+        Args:
+            embeddings: 底层嵌入模型（如 HuggingFaceEmbeddings）
+            cache_size: 查询向量缓存条目上限
+            max_batch_size: 单次前向计算的最大文本数
+            max_wait_ms: 收集同批请求的最长等待时间（毫秒）
+        """
+        self.embeddings = embeddings
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._query_cache = TTLCache(maxsize=cache_size, ttl=None)
+
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.batched_texts = 0
+        self.batched_requests = 0
+
+        self._queue: "queue.Queue[Optional[_EmbedRequest]]" = queue.Queue()
+        # 入队与关闭互斥：关闭后不再有请求进入队列，不会出现无人处理、永远等待的请求
+        self._queue_lock = threading.Lock()
+        self._closed = False
+        self._worker = None
+        if self.max_wait > 0:
+            self._worker = threading.Thread(target=self._batch_loop, name="embedding-batcher", daemon=True)
+            self._worker.start()
+
+    @staticmethod
+    def _cache_key(text: str) -> str:
+        normalized = re.sub(r"\s+", " ", text).strip()
+        return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        """编码一组文本（启用微批处理时与其他线程的请求合并）"""
+        if not texts:
+            return []
+        if self._closed:
+            raise RuntimeError("嵌入服务已关闭")
+        if self._worker is None:
+            self._record_batch(len(texts), 1)
+            return self.embeddings.embed_documents(texts)
+        request = _EmbedRequest(texts)
+        with self._queue_lock:
+            if self._closed:
+                raise RuntimeError("嵌入服务已关闭")
+            self._queue.put(request)
+        return request.future.result()
+
+    def _record_batch(self, texts: int, requests: int) -> None:
+        with self._stats_lock:
+            self.batches += 1
+            self.batched_texts += texts
+            self.batched_requests += requests
+
+    def _batch_loop(self) -> None:
+        """后台线程：收集请求 → 一次前向计算 → 分发结果"""
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            size = len(first.texts)
+            stopping = False
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+                size += len(request.texts)
+
+            # 同一批中的重复文本（如并发的相同查询）只计算一次
+            unique = list(dict.fromkeys(text for request in batch for text in request.texts))
+            try:
+                vectors = dict(zip(unique, self.embeddings.embed_documents(unique)))
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+            else:
+                self._record_batch(len(unique), len(batch))
+                for request in batch:
+                    request.future.set_result([vectors[text] for text in request.texts])
+            if stopping:
+                return
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """嵌入文档（不缓存，参与微批处理）"""
+        return self._encode(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        """嵌入查询（命中缓存时不做任何计算）"""
+        key = self._cache_key(text)
+        vector = self._query_cache.get(key)
+        if vector is None:
+            vector = self._encode([text])[0]
+            self._query_cache.set(key, vector)
+        return vector
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存和批处理统计"""
+        with self._stats_lock:
+            batches, texts, requests = self.batches, self.batched_texts, self.batched_requests
+        return {
+            "query_cache": self._query_cache.stats(),
+            "batches": batches,
+            "avg_batch_size": round(texts / batches, 2) if batches else 0.0,
+            "avg_requests_per_batch": round(requests / batches, 2) if batches else 0.0
+        }
+
+    def close(self) -> None:
+        """停止微批处理线程，之后的嵌入请求会抛出 RuntimeError"""
+        with self._queue_lock:
+            if self._closed:
+                return
+            self._closed = True
+            worker, self._worker = self._worker, None
+            if worker is not None:
+                self._queue.put(None)
+        if worker is None:
+            return
+        worker.join()
+        # 兜底：仍留在队列中的请求直接失败，调用方不会永远阻塞
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if request is not None:
+                request.future.set_exception(RuntimeError("嵌入服务已关闭"))
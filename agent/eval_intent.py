@@ -0,0 +1,106 @@
+"""
+本地意图路由离线评估
+在带标注的样本（JSONL: {"text": ..., "intent": ...}）上评估 IntentRouter：
+本地决定率（跳过 LLM 的比例）、本地决定的准确率、各层级的准确率和耗时，
+并列出判断错误的样本，用于调整 INTENT_MIN_CONFIDENCE / INTENT_MIN_MARGIN 和规则。
+
+用法:
+    python eval_intent.py
+    python eval_intent.py --samples my_samples.jsonl --min-confidence 0.6 --min-margin 0.1
+    python eval_intent.py --rules-only
+    python eval_intent.py --sweep
+"""
+
+import os
+# 禁用 tokenizers 并行化警告
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+import json
+import time
+import argparse
+from typing import Dict, List
+
+from intent_router import IntentRouter
+from embedding_registry import get_embedding_model
+
+
+def load_samples(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(router: IntentRouter, samples: List[Dict], verbose: bool = True) -> Dict:
+    """逐条分类并汇总结果"""
+    tiers: Dict[str, Dict] = {}
+    errors = []
+    deferred = 0
+    for sample in samples:
+        started = time.perf_counter()
+        decision = router.classify(sample["text"])
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if decision is None:
+            deferred += 1
+            continue
+        tier = tiers.setdefault(decision.tier, {"decided": 0, "correct": 0, "total_ms": 0.0})
+        tier["decided"] += 1
+        tier["total_ms"] += elapsed_ms
+        if decision.intent == sample["intent"]:
+            tier["correct"] += 1
+        else:
+            errors.append((sample["text"], sample["intent"], decision.intent, decision.tier, decision.confidence))
+
+    decided = len(samples) - deferred
+    correct = sum(tier["correct"] for tier in tiers.values())
+    result = {
+        "samples": len(samples),
+        "local_rate": round(decided / len(samples), 4) if samples else 0.0,
+        "local_accuracy": round(correct / decided, 4) if decided else 0.0,
+        "deferred_to_llm": deferred,
+        "tiers": {
+            name: {
+                "decided": tier["decided"],
+                "accuracy": round(tier["correct"] / tier["decided"], 4),
+                "avg_ms": round(tier["total_ms"] / tier["decided"], 3)
+            }
+            for name, tier in tiers.items()
+        }
+    }
+    if verbose:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        if errors:
+            print("\n判断错误的样本:")
+            for text, expected, actual, tier, confidence in errors:
+                print(f"  [{tier} {confidence:.2f}] 期望 {expected} / 实际 {actual}: {text}")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地意图路由离线评估")
+    parser.add_argument("--samples", default=os.path.join(os.path.dirname(__file__), "intent_samples.jsonl"),
+                        help="带标注的样本文件 (JSONL)")
+    parser.add_argument("--min-confidence", type=float, default=float(os.getenv("INTENT_MIN_CONFIDENCE", "0.55")))
+    parser.add_argument("--min-margin", type=float, default=float(os.getenv("INTENT_MIN_MARGIN", "0.08")))
+    parser.add_argument("--rules-only", action="store_true", help="只评估规则层")
+    parser.add_argument("--sweep", action="store_true", help="扫描阈值组合，输出本地决定率和准确率")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    embeddings = None if args.rules_only else get_embedding_model()
+    if embeddings is not None:
+        print(f"嵌入模型预热耗时: {embeddings.warmup()}s")
+
+    if not args.sweep:
+        evaluate(IntentRouter(embeddings, args.min_confidence, args.min_margin), samples)
+        return
+
+    print(f"{'min_confidence':>14} {'min_margin':>10} {'local_rate':>10} {'accuracy':>9}")
+    router = IntentRouter(embeddings)
+    for min_confidence in (0.45, 0.5, 0.55, 0.6, 0.65, 0.7):
+        for min_margin in (0.0, 0.04, 0.08, 0.12, 0.16):
+            router.min_confidence, router.min_margin = min_confidence, min_margin
+            result = evaluate(router, samples, verbose=False)
+            print(f"{min_confidence:>14} {min_margin:>10} {result['local_rate']:>10} {result['local_accuracy']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+本地意图路由
+在调用 LLM 做意图分析之前，先用本地分类器判断 search / file / calculate / chat：
+1. 规则层：关键词和正则（问候、算式、文件名、"最新/天气/新闻" 等），只有一个意图命中时直接决定
+2. 向量层：复用已加载的 MiniLM 嵌入，与各意图示例句的质心做余弦相似度（最近质心），
+   最高分和第二名的差距都足够大时决定
+3. 两层都不够确定时返回 None，由调用方再请求 LLM
+用户输入的查询向量会被嵌入服务缓存，随后的记忆检索可以直接复用。
+"""
+
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+INTENTS = ("search", "file", "calculate", "chat")
+
+
+class IntentTier:
+    """做出意图判断的层级"""
+    RULE = "rule"          # 关键词 / 正则规则
+    EMBEDDING = "embedding"  # MiniLM 最近质心
+    LLM = "llm"            # LLM 意图分析
+    FALLBACK = "fallback"  # LLM 分析失败，默认普通对话
+
+
+@dataclass
+class IntentDecision:
+    """一次本地意图判断的结果"""
+    intent: str
+    confidence: float
+    tier: str
+    reason: str
+
+
+# 每个意图的规则；同一输入命中多个意图时视为不确定，交给下一层
+_RULES: Dict[str, List[re.Pattern]] = {
+    "search": [
+        re.compile(r"最新|新闻|热搜|实时|天气|气温|汇率|股价|行情|比分|赛况|票房|搜索一下|搜一下|上网查|联网|网上查"),
+        re.compile(r"(今天|今日|昨天|昨日|本周|这周|最近)的?.{0,6}(消息|新闻|发布|价格|赛果|发生)"),
+        re.compile(r"\b(latest|news|weather|stock price|search for)\b", re.IGNORECASE),
+    ],
+    "file": [
+        re.compile(r"(读取|打开|查看|列出|保存|写入|写进|删除|新建|创建|上传|下载).{0,10}(文件|目录|文件夹|文档)"),
+        re.compile(r"(文件|目录|文件夹)(里|中|下).{0,6}(有什么|有哪些|内容)|保存到|保存为|另存为|工作区"),
+        re.compile(r"[\w\-/]+\.(txt|md|json|csv|py|log|yaml|yml|xml|html|pdf|docx?)\b", re.IGNORECASE),
+        re.compile(r"\b(read|write|list|delete)\s+(the\s+)?(file|folder|directory)\b", re.IGNORECASE),
+    ],
+    "calculate": [
+        re.compile(r"^[\s\d.,+\-*/×÷^%()（）=?？]*\d\s*[+\-*/×÷^%]\s*[\d(（][\s\d.,+\-*/×÷^%()（）=?？]*$"),
+        re.compile(r"(帮我|请|麻烦你?)计算|计算\s*[\d(（]|算一下|算算|帮我算|平方根|开方|阶乘"),
+        re.compile(r"^(?=.*\d).*(乘以|除以|加上|减去|等于多少|等于几|次方|百分之)"),
+        re.compile(r"\b(calculate|compute|sqrt|factorial)\b", re.IGNORECASE),
+    ],
+    "chat": [
+        re.compile(
+            r"^\s*(你好|您好|嗨|哈喽|hello|hi|hey|早上好|早安|中午好|下午好|晚上好|晚安|谢谢|多谢|感谢|"
+            r"再见|拜拜|好的|好吧|嗯+|哈+|ok|okay|thanks?( you)?|bye)[\s!！。.~～,，?？]*$",
+            re.IGNORECASE
+        ),
+    ],
+}
+
+# 各意图的示例句，用于计算 MiniLM 质心
+_EXAMPLES: Dict[str, List[str]] = {
+    "search": [
+        "今天北京天气怎么样",
+        "最近有什么科技新闻",
+        "帮我查一下英伟达现在的股价",
+        "昨晚的比赛谁赢了",
+        "美元兑人民币汇率是多少",
+        "最新发布的 iPhone 有什么新功能",
+        "今年诺贝尔文学奖得主是谁",
+        "这周末上映的电影有哪些",
+    ],
+    "file": [
+        "读取 notes.txt 的内容",
+        "把这段话保存到文件里",
+        "列出工作区里的所有文件",
+        "删除 uploads 目录下的旧文件",
+        "帮我新建一个 markdown 文档写入会议纪要",
+        "看看 data.csv 里有什么",
+        "打开我上传的那个文件",
+        "把结果写进 report.md",
+    ],
+    "calculate": [
+        "123 乘以 456 等于多少",
+        "帮我算一下 (3+5)*12",
+        "2 的 10 次方是多少",
+        "144 的平方根",
+        "一万块钱年利率 3% 存三年有多少利息",
+        "15% 的 80 是多少",
+        "计算 1 到 100 的和",
+        "sqrt(2) 约等于多少",
+    ],
+    "chat": [
+        "你好呀",
+        "你是谁",
+        "给我讲个笑话",
+        "我今天心情不太好",
+        "你记得我叫什么名字吗",
+        "解释一下什么是机器学习",
+        "帮我写一首关于春天的诗",
+        "推荐几本好看的小说",
+        "Python 的列表和元组有什么区别",
+        "谢谢你的帮助",
+    ],
+}
+
+
+class IntentRouter:
+    """
+    本地意图分类器（规则 + MiniLM 最近质心）
+
+    classify 返回 IntentDecision，或在本地置信度不足时返回 None（应交给 LLM）。
+    """
+
+    def __init__(
+        self,
+        embeddings: Optional[Embeddings] = None,
+        min_confidence: float = 0.55,
+        min_margin: float = 0.08,
+        rule_confidence: float = 0.95,
+        examples: Optional[Dict[str, List[str]]] = None
+    ):
+        """
+        初始化本地意图分类器
+
+        Args:
+            embeddings: 嵌入模型（通常为 MemoryStore.embeddings）；为 None 时只使用规则层
+            min_confidence: 向量层最高余弦相似度下限
+            min_margin: 向量层最高分与第二名的最小差距
+            rule_confidence: 规则命中时报告的置信度
+            examples: 各意图的示例句（默认使用内置示例）
+        """
+        self.embeddings = embeddings
+        self.min_confidence = min_confidence
+        self.min_margin = min_margin
+        self.rule_confidence = rule_confidence
+        self.examples = examples or _EXAMPLES
+        self._centroids: Optional[np.ndarray] = None
+        self._centroid_intents: List[str] = []
+        self._centroid_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._tier_counts: Dict[str, int] = {}
+
+    def _rule_match(self, text: str) -> List[str]:
+        """返回规则命中的意图"""
+        return [intent for intent, patterns in _RULES.items() if any(p.search(text) for p in patterns)]
+
+    def _get_centroids(self) -> Tuple[List[str], np.ndarray]:
+        """首次使用时嵌入示例句并计算各意图的归一化质心"""
+        if self._centroids is None:
+            with self._centroid_lock:
+                if self._centroids is None:
+                    intents = [intent for intent in INTENTS if self.examples.get(intent)]
+                    centroids = []
+                    for intent in intents:
+                        vectors = np.asarray(self.embeddings.embed_documents(self.examples[intent]), dtype=np.float32)
+                        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+                        centroid = vectors.mean(axis=0)
+                        centroids.append(centroid / max(float(np.linalg.norm(centroid)), 1e-12))
+                    self._centroid_intents = intents
+                    self._centroids = np.stack(centroids)
+        return self._centroid_intents, self._centroids
+
+    def nearest_centroid(self, text: str) -> List[Tuple[str, float]]:
+        """返回按余弦相似度降序排列的 (意图, 相似度)"""
+        intents, centroids = self._get_centroids()
+        query = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        scores = centroids @ query
+        order = np.argsort(-scores)
+        return [(intents[i], float(scores[i])) for i in order]
+
+    def classify(self, text: str) -> Optional[IntentDecision]:
+        """
+        本地判断意图
+
+        Returns:
+            IntentDecision；本地置信度不足时返回 None
+        """
+        text = (text or "").strip()
+        if not text:
+            return IntentDecision("chat", 1.0, IntentTier.RULE, "空输入")
+
+        matched = self._rule_match(text)
+        if len(matched) == 1:
+            return IntentDecision(matched[0], self.rule_confidence, IntentTier.RULE, "规则命中")
+
+        if self.embeddings is None:
+            return None
+        ranked = self.nearest_centroid(text)
+        # 多条规则命中时只在命中的意图之间比较
+        if matched:
+            ranked = [item for item in ranked if item[0] in matched]
+        (best, score), runner_up = ranked[0], (ranked[1][1] if len(ranked) > 1 else 0.0)
+        if score >= self.min_confidence and score - runner_up >= self.min_margin:
+            return IntentDecision(best, round(score, 4), IntentTier.EMBEDDING, f"最近质心（领先 {score - runner_up:.2f}）")
+        return None
+
+    def record(self, tier: str) -> None:
+        """累计各层级做出的判断数量"""
+        with self._stats_lock:
+            self._tier_counts[tier] = self._tier_counts.get(tier, 0) + 1
+
+    def get_stats(self) -> Dict:
+        """各层级的判断数量和本地命中率"""
+        with self._stats_lock:
+            counts = dict(self._tier_counts)
+        total = sum(counts.values())
+        local = counts.get(IntentTier.RULE, 0) + counts.get(IntentTier.EMBEDDING, 0)
+        return {
+            "tiers": counts,
+            "total": total,
+            "local_rate": round(local / total, 4) if total else 0.0
+        }
@@ -4,18 +4,28 @@ LangGraph Agent - 智能对话代理
 """
 
 import json
-from typing import TypedDict, Annotated, Sequence, Literal, Generator
+import asyncio
+import functools
+import threading
+from concurrent.futures import Executor
+from typing import TypedDict, Annotated, Sequence, Literal, Generator, AsyncGenerator, Optional, Callable, List, Union
 from datetime import datetime
 
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, ToolMessage
 from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.output_parsers import StrOutputParser
 
 from tools import FileHandler, WebSearcher, Calculator
-from memory_store import MemoryStore
-from tot_reasoner import TreeOfThoughtReasoner, StreamEvent
+from prompt_chains import ChainRegistry, load_prompts, DEFAULT_PROMPTS_FILE
+from context_assembler import ContextAssembler
+from response_cache import SemanticResponseCache
+from memory_store import MemoryStore, SearchMode
+from memory_reranker import MemoryReranker
+from memory_compactor import MemoryCompactor
+from memory_retention import RetentionPolicy, RetentionSweeper
+from intent_router import IntentRouter, IntentDecision, IntentTier
+from tot_reasoner import TreeOfThoughtReasoner, StreamEvent, ScoreStrategy, SearchLimits
+from worker_pool import StreamBridge
 
 
 class AgentState(TypedDict):
@@ -32,9 +42,17 @@ class AgentState(TypedDict):
     needs_web_search: bool  # 是否需要网络搜索
     needs_file_operation: bool  # 是否需要文件操作
     needs_calculation: bool  # 是否需要计算
+    intent_tier: str  # 做出意图判断的层级: rule / embedding / llm / fallback
+    recalled_memory: str  # 与意图分析并行预取的记忆上下文（由 merge_memory 按路由采用或丢弃）
+    recalled_ids: list  # 预取记忆的ID（采用时才记录检索命中）
     deep_think: bool  # 是否启用深度思考(TOT)
     thought_branches: int  # 分支数量
     thought_depth: int  # 深度
+    score_strategy: str  # TOT 打分策略: single / batch
+    session_id: Optional[str]  # 会话ID（记忆命名空间）
+    user_id: Optional[str]  # 用户ID（记忆命名空间）
+    use_cache: bool  # 是否使用语义响应缓存
+    cache_hit: bool  # 回答是否来自语义响应缓存
 
 
 class LangGraphAgent:
@@ -50,8 +68,20 @@ class LangGraphAgent:
        - 数学计算
        - 普通对话
     4. 整合结果并返回
+    
+    同时提供同步接口（chat / chat_stream）和原生异步接口（achat / astream），
+    异步接口使用 ainvoke / astream 调用 LLM，阻塞操作（向量检索、网络搜索、TOT）
+    放到 executor（如 Agent 工作池的有界线程池）中执行，一个进程可以同时承载
+    大量进行中的 LLM 调用，而阻塞操作的并发仍然有上限。
     """
     
+    # 必需的预构建链（prompts.json 的 agent 配置）
+    _CHAIN_NAMES = (
+        "response", "search_response", "stream_response", "search_stream",
+        "deep_answer", "search_deep_answer", "summarize", "extract_info", "translate",
+        "file_analysis"
+    )
+    
     def __init__(
         self,
         api_key: str = None,
@@ -60,7 +90,11 @@ class LangGraphAgent:
         memory_dir: str = "./memory_db",
         workspace_dir: str = "./workspace",
         default_branches: int = 5,
-        default_depth: int = 3
+        default_depth: int = 3,
+        stream_bridge: Optional[StreamBridge] = None,
+        tot_concurrency: Optional[int] = None,
+        prompts_file: str = DEFAULT_PROMPTS_FILE,
+        executor: Optional[Executor] = None
     ):
         """
         初始化 LangGraph Agent
@@ -71,6 +105,10 @@ class LangGraphAgent:
             model: 模型名称
             memory_dir: 记忆存储目录
             workspace_dir: 工作空间目录
+            stream_bridge: 异步流中运行同步 TOT 生成器的桥接（默认自行创建）
+            tot_concurrency: TOT 并发 LLM 调用上限，默认读取 TOT_MAX_CONCURRENCY，否则为 8；1 表示串行
+            prompts_file: prompt配置文件路径（使用其中的 agent 配置）
+            executor: 异步接口中执行阻塞操作的线程池（默认使用事件循环的默认线程池）
         """
         import os
         api_key = api_key or os.getenv("OPENAI_API_KEY")
@@ -85,79 +123,181 @@ class LangGraphAgent:
             max_tokens=2000
         )
         
+        # 预构建所有回答 / 总结 / 提取 / 翻译链（只构建一次，请求时只传变量）
+        self.prompts = load_prompts(prompts_file)
+        agent_prompts = self.prompts.get("agent", {})
+        if any(name not in agent_prompts for name in self._CHAIN_NAMES) and prompts_file != DEFAULT_PROMPTS_FILE:
+            # 自定义配置文件（旧版、缺少 agent 配置或格式错误）缺少的链使用内置 prompts.json 补全
+            agent_prompts = {**load_prompts(DEFAULT_PROMPTS_FILE).get("agent", {}), **agent_prompts}
+        self.chains = ChainRegistry(self.llm, agent_prompts)
+        missing = self.chains.missing(self._CHAIN_NAMES)
+        if missing:
+            raise ValueError(f"prompt 配置缺少 agent 链: {', '.join(missing)}")
+        
+        # 按来源 token 预算组装上下文（记忆 / 搜索 / 工具结果 / 文件内容）
+        self.context_assembler = ContextAssembler()
+        
         # 初始化工具
         self.file_handler = FileHandler(workspace_dir)
         self.web_searcher = WebSearcher()
         self.calculator = Calculator()
+        
+        # 初始化记忆（默认延迟写入：保存记忆不再阻塞响应，由后台线程批量落盘）
+        self.memory_store = MemoryStore(
+            persist_directory=memory_dir,
+            write_behind=os.getenv("MEMORY_WRITE_BEHIND", "true").lower() in ("1", "true", "yes"),
+            flush_batch_size=int(os.getenv("MEMORY_FLUSH_BATCH", "32")),
+            flush_interval=float(os.getenv("MEMORY_FLUSH_INTERVAL", "1.0")),
+            search_mode=os.getenv("MEMORY_SEARCH_MODE", SearchMode.HYBRID),
+            reranker=MemoryReranker(
+                half_life_days=float(os.getenv("MEMORY_HALF_LIFE_DAYS", "30"))
+            ) if os.getenv("MEMORY_RERANK", "true").lower() in ("1", "true", "yes") else None
+        )
+        # 放进提示词的记忆条数（重排序后质量更高，可以少放几条）
+        self.memory_top_k = int(os.getenv("MEMORY_TOP_K", "3"))
+        
+        # 记忆压缩（由 main.py 按 MEMORY_COMPACT_INTERVAL 启动后台任务，或通过接口手动触发）
+        self.memory_compactor = MemoryCompactor(
+            self.memory_store,
+            self.llm,
+            min_age_days=float(os.getenv("MEMORY_COMPACT_MIN_AGE_DAYS", "7"))
+        )
+        
+        # 记忆保留策略（容量上限 / 按类型过期，后台任务由 main.py 按 MEMORY_RETENTION_INTERVAL 启动）
+        self.retention_sweeper = RetentionSweeper(self.memory_store, RetentionPolicy.from_env())
+        
+        # TOT 复用记忆模块已加载的嵌入模型做兄弟思路去重（阈值 <= 0 表示关闭）；
+        # 提前结束和自适应束宽默认关闭，通过 TOT_SCORE_THRESHOLD 等环境变量启用
+        dedup_threshold = float(os.getenv("TOT_DEDUP_THRESHOLD", "0.9"))
         self.tot_reasoner = TreeOfThoughtReasoner(
             llm=self.llm,
             default_branches=default_branches,
-            default_depth=default_depth
+            default_depth=default_depth,
+            max_concurrency=tot_concurrency or int(os.getenv("TOT_MAX_CONCURRENCY", "8")),
+            embeddings=self.memory_store.embeddings,
+            dedup_threshold=dedup_threshold if dedup_threshold > 0 else None,
+            limits=SearchLimits.from_env()
+        )
+        
+        # 本地意图路由：规则 + MiniLM 最近质心，本地不确定时才请求 LLM（INTENT_LOCAL_ROUTER=false 关闭）
+        self.intent_router = IntentRouter(
+            embeddings=self.memory_store.embeddings,
+            min_confidence=float(os.getenv("INTENT_MIN_CONFIDENCE", "0.55")),
+            min_margin=float(os.getenv("INTENT_MIN_MARGIN", "0.08"))
+        ) if os.getenv("INTENT_LOCAL_ROUTER", "true").lower() in ("1", "true", "yes") else None
+        
+        # 语义响应缓存：相近问题复用之前的回答（请求通过 use_cache 显式启用）
+        cache_ttl = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+        self.response_cache = SemanticResponseCache(
+            embeddings=self.memory_store.embeddings,
+            threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95")),
+            ttl=cache_ttl if cache_ttl > 0 else None,
+            maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "1000")),
+            scope=os.getenv("RESPONSE_CACHE_SCOPE", "session")
         )
         
-        # 初始化记忆
-        self.memory_store = MemoryStore(persist_directory=memory_dir)
+        self.stream_bridge = stream_bridge or StreamBridge()
+        self.executor = executor
         
-        # 构建状态图
+        # 构建状态图（同步版本供 chat 使用，异步版本供 achat 使用，结构完全相同）
         self.graph = self._build_graph()
         self.app = self.graph.compile()
+        self.async_app = self._build_graph(use_async=True).compile()
+    
+    async def _run_blocking(self, func: Callable, *args, **kwargs):
+        """在 executor 中执行阻塞调用（向量检索、网络搜索、TOT 等）"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
     
-    def _build_graph(self) -> StateGraph:
+    def _in_thread(self, func: Callable[[AgentState], AgentState]) -> Callable:
+        """将阻塞的同步节点包装为在 executor 中执行的异步节点"""
+        async def node(state: AgentState) -> AgentState:
+            return await self._run_blocking(func, state)
+        node.__name__ = func.__name__
+        return node
+    
+    def _build_graph(self, use_async: bool = False) -> StateGraph:
         """
         构建 LangGraph 状态图
         
         流程:
         1. 入口节点 check_deep_think 判断是否启用深度思考
         2. 如果启用深度思考 → 直接进入 deep_think_flow（检索记忆 + TOT）
-        3. 如果普通模式 → 走 analyze_intent 意图分析流程
+        3. 如果普通模式 → analyze_intent 意图分析与 prefetch_memory 记忆检索并行执行（fan-out），
+           在 merge_memory 汇合（fan-in）后按意图路由：普通对话采用预取的记忆，工具分支丢弃
+        
+        Args:
+            use_async: 是否使用异步节点（LLM 节点用 ainvoke，阻塞节点放到 executor 中执行）
         """
         
         workflow = StateGraph(AgentState)
         
+        if use_async:
+            analyze_intent = self._aanalyze_intent
+            file_operation = self._afile_operation
+            calculate = self._acalculate
+            generate_response = self._agenerate_response
+            retrieve_memory = self._in_thread(self._retrieve_memory)
+            prefetch_memory = self._in_thread(self._prefetch_memory)
+            # 记录命中在积累过多时会写回存储，同样放到 executor 中
+            merge_memory = self._in_thread(self._merge_memory)
+            web_search = self._in_thread(self._web_search)
+            deep_think = self._in_thread(self._deep_think)
+            save_memory = self._in_thread(self._save_memory)
+        else:
+            analyze_intent = self._analyze_intent
+            file_operation = self._file_operation
+            calculate = self._calculate
+            generate_response = self._generate_response
+            retrieve_memory = self._retrieve_memory
+            prefetch_memory = self._prefetch_memory
+            merge_memory = self._merge_memory
+            web_search = self._web_search
+            deep_think = self._deep_think
+            save_memory = self._save_memory
+        
         # 添加节点
         workflow.add_node("check_deep_think", self._check_deep_think)  # 入口：检查是否深度思考
-        workflow.add_node("retrieve_memory_for_tot", self._retrieve_memory)  # 深度思考前的记忆检索
-        workflow.add_node("deep_think", self._deep_think)  # 深度思考(TOT)
-        workflow.add_node("analyze_intent", self._analyze_intent)  # 意图分析（普通模式）
-        workflow.add_node("retrieve_memory", self._retrieve_memory)  # 检索记忆
-        workflow.add_node("web_search", self._web_search)  # 网络搜索
-        workflow.add_node("file_operation", self._file_operation)  # 文件操作
-        workflow.add_node("calculate", self._calculate)  # 计算
-        workflow.add_node("generate_response", self._generate_response)  # 生成响应
-        workflow.add_node("save_memory", self._save_memory)  # 保存记忆
+        workflow.add_node("retrieve_memory_for_tot", retrieve_memory)  # 深度思考前的记忆检索
+        workflow.add_node("deep_think", deep_think)  # 深度思考(TOT)
+        workflow.add_node("analyze_intent", analyze_intent)  # 意图分析（普通模式）
+        workflow.add_node("prefetch_memory", prefetch_memory)  # 与意图分析并行的记忆检索
+        workflow.add_node("merge_memory", merge_memory)  # 汇合：按意图采用或丢弃预取的记忆
+        workflow.add_node("web_search", web_search)  # 网络搜索
+        workflow.add_node("file_operation", file_operation)  # 文件操作
+        workflow.add_node("calculate", calculate)  # 计算
+        workflow.add_node("generate_response", generate_response)  # 生成响应
+        workflow.add_node("save_memory", save_memory)  # 保存记忆
         
         # 设置入口：首先检查是否深度思考
         workflow.set_entry_point("check_deep_think")
         
-        # 入口路由：深度思考 vs 普通模式
+        # 入口路由：深度思考先检索记忆；普通模式同时进入意图分析和记忆检索
         workflow.add_conditional_edges(
             "check_deep_think",
             self._route_entry,
-            {
-                "deep_think": "retrieve_memory_for_tot",  # 深度思考：先检索记忆
-                "normal": "analyze_intent"  # 普通模式：走意图分析
-            }
+            ["retrieve_memory_for_tot", "analyze_intent", "prefetch_memory"]
         )
         
         # 深度思考流程：检索记忆 → TOT → 保存
         workflow.add_edge("retrieve_memory_for_tot", "deep_think")
         workflow.add_edge("deep_think", "save_memory")
         
-        # 普通模式：意图分析后路由
+        # 普通模式：两个并行分支都完成后汇合，再按意图路由
+        workflow.add_edge(["analyze_intent", "prefetch_memory"], "merge_memory")
         workflow.add_conditional_edges(
-            "analyze_intent",
+            "merge_memory",
             self._route_decision,
             {
-                "memory": "retrieve_memory",
+                "memory": "generate_response",
                 "search": "web_search",
                 "file": "file_operation",
                 "calculate": "calculate",
-                "chat": "retrieve_memory"
+                "chat": "generate_response"
             }
         )
         
-        # 普通模式各节点 → 生成响应
-        workflow.add_edge("retrieve_memory", "generate_response")
+        # 普通模式各工具节点 → 生成响应
         workflow.add_edge("web_search", "generate_response")
         workflow.add_edge("file_operation", "generate_response")
         workflow.add_edge("calculate", "generate_response")
@@ -179,26 +319,15 @@ class LangGraphAgent:
             print("💬 普通对话模式")
         return state
     
-    def _route_entry(self, state: AgentState) -> Literal["deep_think", "normal"]:
-        """入口路由：根据 deep_think 参数决定走哪条路径"""
+    def _route_entry(self, state: AgentState) -> Union[str, List[str]]:
+        """入口路由：深度思考先检索记忆；普通模式并行执行意图分析和记忆检索"""
         if state.get("deep_think", False):
-            return "deep_think"
-        return "normal"
+            return "retrieve_memory_for_tot"
+        return ["analyze_intent", "prefetch_memory"]
     
-    def _analyze_intent(self, state: AgentState) -> AgentState:
-        """
-        分析用户意图
-        
-        判断用户需要:
-        - 网络搜索 (最新信息、新闻、实时数据)
-        - 文件操作 (读写文件、查看目录)
-        - 计算 (数学计算、数据处理)
-        - 普通对话
-        """
-        user_input = state["user_input"]
-        
-        # 使用 LLM 分析意图
-        intent_prompt = f"""分析用户的意图，判断需要执行什么操作。
+    def _intent_prompt(self, user_input: str) -> str:
+        """构建意图分析提示"""
+        return f"""分析用户的意图，判断需要执行什么操作。
 
 用户输入: {user_input}
 
@@ -218,26 +347,92 @@ class LangGraphAgent:
 - chat: 普通对话、回答知识性问题
 
 只返回JSON，不要其他内容。"""
+    
+    def _apply_intent(self, state: AgentState, raw: str) -> None:
+        """解析意图分析结果并写入状态"""
+        intent_data = json.loads(raw)
+        
+        state["next_action"] = intent_data.get("intent", "chat")
+        state["needs_web_search"] = intent_data.get("needs_web_search", False)
+        state["needs_file_operation"] = intent_data.get("needs_file_operation", False)
+        state["needs_calculation"] = intent_data.get("needs_calculation", False)
+        self._record_intent_tier(state, IntentTier.LLM)
         
+        print(f"🔍 意图分析: {intent_data.get('intent')} - {intent_data.get('reason')}")
+    
+    def _default_intent(self, state: AgentState, error: Exception) -> None:
+        """意图分析失败时回退为普通对话"""
+        print(f"⚠️ 意图分析失败，默认为普通对话: {error}")
+        state["next_action"] = "chat"
+        state["needs_web_search"] = False
+        state["needs_file_operation"] = False
+        state["needs_calculation"] = False
+        self._record_intent_tier(state, IntentTier.FALLBACK)
+    
+    def _record_intent_tier(self, state: AgentState, tier: str) -> None:
+        state["intent_tier"] = tier
+        if self.intent_router is not None:
+            self.intent_router.record(tier)
+    
+    def _local_intent(self, state: AgentState) -> bool:
+        """本地意图路由；判断成功时写入状态并返回 True，不确定时返回 False（交给 LLM）"""
+        if self.intent_router is None:
+            return False
         try:
-            response = self.llm.invoke([HumanMessage(content=intent_prompt)])
-            intent_data = json.loads(response.content)
-            
-            state["next_action"] = intent_data.get("intent", "chat")
-            state["needs_web_search"] = intent_data.get("needs_web_search", False)
-            state["needs_file_operation"] = intent_data.get("needs_file_operation", False)
-            state["needs_calculation"] = intent_data.get("needs_calculation", False)
-            
-            print(f"🔍 意图分析: {intent_data.get('intent')} - {intent_data.get('reason')}")
-            
+            decision: Optional[IntentDecision] = self.intent_router.classify(state["user_input"])
         except Exception as e:
-            print(f"⚠️ 意图分析失败，默认为普通对话: {e}")
-            state["next_action"] = "chat"
-            state["needs_web_search"] = False
-            state["needs_file_operation"] = False
-            state["needs_calculation"] = False
+            print(f"⚠️ 本地意图路由失败，交给 LLM: {e}")
+            return False
+        if decision is None:
+            return False
+        
+        state["next_action"] = decision.intent
+        state["needs_web_search"] = decision.intent == "search"
+        state["needs_file_operation"] = decision.intent == "file"
+        state["needs_calculation"] = decision.intent == "calculate"
+        self._record_intent_tier(state, decision.tier)
+        
+        print(f"⚡ 本地意图路由[{decision.tier}]: {decision.intent} ({decision.confidence:.2f}) - {decision.reason}")
+        return True
+    
+    # 意图分析节点写入的键
+    _INTENT_KEYS = ("next_action", "needs_web_search", "needs_file_operation", "needs_calculation", "intent_tier")
+    
+    def _analyze_intent(self, state: AgentState) -> dict:
+        """
+        分析用户意图
         
-        return state
+        判断用户需要:
+        - 网络搜索 (最新信息、新闻、实时数据)
+        - 文件操作 (读写文件、查看目录)
+        - 计算 (数学计算、数据处理)
+        - 普通对话
+        
+        先走本地意图路由（规则 + 最近质心），本地置信度不足时才使用 LLM 分析。
+        与 prefetch_memory 并行执行，因此只返回意图相关的键（同一步内一个键只能有一个写入）
+        """
+        intent = {"user_input": state["user_input"]}
+        if not self._local_intent(intent):
+            # 使用 LLM 分析意图
+            try:
+                response = self.llm.invoke([HumanMessage(content=self._intent_prompt(state["user_input"]))])
+                self._apply_intent(intent, response.content)
+            except Exception as e:
+                self._default_intent(intent, e)
+        
+        return {key: intent[key] for key in self._INTENT_KEYS}
+    
+    async def _aanalyze_intent(self, state: AgentState) -> dict:
+        """分析用户意图（异步版本，本地路由的查询嵌入放到线程中执行）"""
+        intent = {"user_input": state["user_input"]}
+        if not await self._run_blocking(self._local_intent, intent):
+            try:
+                response = await self.llm.ainvoke([HumanMessage(content=self._intent_prompt(state["user_input"]))])
+                self._apply_intent(intent, response.content)
+            except Exception as e:
+                self._default_intent(intent, e)
+        
+        return {key: intent[key] for key in self._INTENT_KEYS}
     
     def _route_decision(self, state: AgentState) -> Literal["memory", "search", "file", "calculate", "chat"]:
         """路由决策"""
@@ -250,25 +445,49 @@ class LangGraphAgent:
         else:
             return "memory"
     
-    def _retrieve_memory(self, state: AgentState) -> AgentState:
-        """检索相关记忆"""
-        user_input = state["user_input"]
-        
-        # 检索相关记忆
-        relevant_memories = self.memory_store.search_memories(user_input, n_results=5)
-        
-        if relevant_memories:
-            memory_context = "【相关历史记忆】\n"
-            for i, memory in enumerate(relevant_memories, 1):
-                memory_context += f"{i}. {memory['content']}\n"
-        else:
-            memory_context = "（暂无相关历史记忆）"
+    def _search_memory_context(self, state: AgentState, record_hits: bool = True) -> tuple:
+        """
+        检索相关记忆并格式化为上下文
         
-        state["memory_context"] = memory_context
+        Returns:
+            (记忆上下文, 记忆ID列表)
+        """
+        relevant_memories = self.memory_store.search_memories(
+            state["user_input"],
+            n_results=self.memory_top_k,
+            session_id=state.get("session_id"),
+            user_id=state.get("user_id"),
+            record_hits=record_hits
+        )
         print(f"📚 检索到 {len(relevant_memories)} 条相关记忆")
-        
+        context = self._format_memories(relevant_memories) or "（暂无相关历史记忆）"
+        return context, [memory["id"] for memory in relevant_memories]
+    
+    def _retrieve_memory(self, state: AgentState) -> AgentState:
+        """检索相关记忆"""
+        state["memory_context"], _ = self._search_memory_context(state)
         return state
     
+    def _prefetch_memory(self, state: AgentState) -> dict:
+        """
+        与意图分析并行检索记忆（只写入 recalled_memory / recalled_ids）
+        
+        意图分析的本地路由和这里对同一输入的嵌入请求会被嵌入服务合并为一次计算。
+        此时还不知道记忆是否会被使用，不记录检索命中，由 merge_memory 按路由决定。
+        """
+        context, ids = self._search_memory_context(state, record_hits=False)
+        return {"recalled_memory": context, "recalled_ids": ids}
+    
+    def _merge_memory(self, state: AgentState) -> dict:
+        """
+        汇合节点：普通对话采用预取的记忆并记录检索命中；
+        工具分支丢弃（上下文由工具结果提供），不计入命中统计，避免影响 LRU / LFU 淘汰
+        """
+        if self._route_decision(state) == "memory":
+            self.memory_store.record_hits(state.get("recalled_ids") or [])
+            return {"memory_context": state.get("recalled_memory") or "（暂无相关历史记忆）"}
+        return {"recalled_memory": "", "recalled_ids": []}
+    
     def _web_search(self, state: AgentState) -> AgentState:
         """执行网络搜索"""
         user_input = state["user_input"]
@@ -277,28 +496,17 @@ class LangGraphAgent:
         search_result = self.web_searcher.search(user_input, num_results=5)
         
         if search_result["success"]:
-            results_text = "【网络搜索结果】\n"
-            for i, result in enumerate(search_result["results"], 1):
-                results_text += f"{i}. {result['title']}\n"
-                results_text += f"   {result['snippet']}\n"
-                results_text += f"   来源: {result['link']}\n\n"
+            results_text = self._format_search_results(search_result["results"])
             
             state["tool_results"] = [{"type": "search", "content": results_text}]
-            state["memory_context"] = results_text
         else:
             state["tool_results"] = [{"type": "search", "content": f"搜索失败: {search_result.get('error')}"}]
-            state["memory_context"] = "搜索未能返回结果"
         
         return state
     
-    def _file_operation(self, state: AgentState) -> AgentState:
-        """执行文件操作"""
-        user_input = state["user_input"]
-        
-        print(f"📁 执行文件操作")
-        
-        # 使用LLM解析文件操作意图
-        file_prompt = f"""用户想要执行文件操作，请解析具体操作并返回JSON格式:
+    def _file_operation_prompt(self, user_input: str) -> str:
+        """构建文件操作解析提示"""
+        return f"""用户想要执行文件操作，请解析具体操作并返回JSON格式:
 
 用户输入: {user_input}
 
@@ -310,44 +518,60 @@ class LangGraphAgent:
 }}
 
 只返回JSON，不要其他内容。"""
+    
+    def _apply_file_operation(self, state: AgentState, raw: str) -> None:
+        """解析文件操作并执行，结果写入状态"""
+        file_op = json.loads(raw)
+        
+        operation = file_op.get("operation")
+        filepath = file_op.get("filepath", "")
+        
+        if operation == "read":
+            result = self.file_handler.read_file(filepath)
+        elif operation == "write":
+            content = file_op.get("content", "")
+            result = self.file_handler.write_file(filepath, content)
+        elif operation == "list":
+            result = self.file_handler.list_files(filepath or ".")
+        elif operation == "delete":
+            result = self.file_handler.delete_file(filepath)
+        else:
+            result = {"success": False, "error": "未知的文件操作"}
         
+        state["tool_results"] = [{"type": "file", "content": json.dumps(result, ensure_ascii=False, indent=2)}]
+    
+    def _file_operation_failed(self, state: AgentState, error: Exception) -> None:
+        error_msg = f"文件操作解析失败: {str(error)}"
+        state["tool_results"] = [{"type": "file", "content": error_msg}]
+    
+    def _file_operation(self, state: AgentState) -> AgentState:
+        """执行文件操作"""
+        print(f"📁 执行文件操作")
+        
+        # 使用LLM解析文件操作意图
         try:
-            response = self.llm.invoke([HumanMessage(content=file_prompt)])
-            file_op = json.loads(response.content)
-            
-            operation = file_op.get("operation")
-            filepath = file_op.get("filepath", "")
-            
-            if operation == "read":
-                result = self.file_handler.read_file(filepath)
-            elif operation == "write":
-                content = file_op.get("content", "")
-                result = self.file_handler.write_file(filepath, content)
-            elif operation == "list":
-                result = self.file_handler.list_files(filepath or ".")
-            elif operation == "delete":
-                result = self.file_handler.delete_file(filepath)
-            else:
-                result = {"success": False, "error": "未知的文件操作"}
-            
-            state["tool_results"] = [{"type": "file", "content": json.dumps(result, ensure_ascii=False, indent=2)}]
-            state["memory_context"] = f"文件操作结果: {json.dumps(result, ensure_ascii=False)}"
-            
+            response = self.llm.invoke([HumanMessage(content=self._file_operation_prompt(state["user_input"]))])
+            self._apply_file_operation(state, response.content)
         except Exception as e:
-            error_msg = f"文件操作解析失败: {str(e)}"
-            state["tool_results"] = [{"type": "file", "content": error_msg}]
-            state["memory_context"] = error_msg
+            self._file_operation_failed(state, e)
         
         return state
     
-    def _calculate(self, state: AgentState) -> AgentState:
-        """执行计算"""
-        user_input = state["user_input"]
+    async def _afile_operation(self, state: AgentState) -> AgentState:
+        """执行文件操作（异步版本，文件读写放到线程中执行）"""
+        print(f"📁 执行文件操作")
         
-        print(f"🧮 执行计算")
+        try:
+            response = await self.llm.ainvoke([HumanMessage(content=self._file_operation_prompt(state["user_input"]))])
+            await self._run_blocking(self._apply_file_operation, state, response.content)
+        except Exception as e:
+            self._file_operation_failed(state, e)
         
-        # 使用LLM提取数学表达式
-        calc_prompt = f"""从用户输入中提取数学表达式并返回JSON:
+        return state
+    
+    def _calculation_prompt(self, user_input: str) -> str:
+        """构建数学表达式提取提示"""
+        return f"""从用户输入中提取数学表达式并返回JSON:
 
 用户输入: {user_input}
 
@@ -357,21 +581,42 @@ class LangGraphAgent:
 }}
 
 只返回JSON，不要其他内容。"""
+    
+    def _apply_calculation(self, state: AgentState, raw: str) -> None:
+        """解析表达式并计算，结果写入状态"""
+        calc_op = json.loads(raw)
+        
+        expression = calc_op.get("expression", "")
+        result = self.calculator.calculate(expression)
+        
+        state["tool_results"] = [{"type": "calculate", "content": json.dumps(result, ensure_ascii=False)}]
+    
+    def _calculation_failed(self, state: AgentState, error: Exception) -> None:
+        error_msg = f"计算失败: {str(error)}"
+        state["tool_results"] = [{"type": "calculate", "content": error_msg}]
+    
+    def _calculate(self, state: AgentState) -> AgentState:
+        """执行计算"""
+        print(f"🧮 执行计算")
         
+        # 使用LLM提取数学表达式
         try:
-            response = self.llm.invoke([HumanMessage(content=calc_prompt)])
-            calc_op = json.loads(response.content)
-            
-            expression = calc_op.get("expression", "")
-            result = self.calculator.calculate(expression)
-            
-            state["tool_results"] = [{"type": "calculate", "content": json.dumps(result, ensure_ascii=False)}]
-            state["memory_context"] = f"计算结果: {result}"
-            
+            response = self.llm.invoke([HumanMessage(content=self._calculation_prompt(state["user_input"]))])
+            self._apply_calculation(state, response.content)
+        except Exception as e:
+            self._calculation_failed(state, e)
+        
+        return state
+    
+    async def _acalculate(self, state: AgentState) -> AgentState:
+        """执行计算（异步版本）"""
+        print(f"🧮 执行计算")
+        
+        try:
+            response = await self.llm.ainvoke([HumanMessage(content=self._calculation_prompt(state["user_input"]))])
+            self._apply_calculation(state, response.content)
         except Exception as e:
-            error_msg = f"计算失败: {str(e)}"
-            state["tool_results"] = [{"type": "calculate", "content": error_msg}]
-            state["memory_context"] = error_msg
+            self._calculation_failed(state, e)
         
         return state
     
@@ -382,15 +627,10 @@ class LangGraphAgent:
         tool_results = state.get("tool_results", [])
         thought_branches = state.get("thought_branches", 3)
         thought_depth = state.get("thought_depth", 2)
+        score_strategy = state.get("score_strategy", ScoreStrategy.SINGLE)
         
         # 构建上下文
-        context_parts = []
-        if memory_context:
-            context_parts.append(memory_context)
-        if tool_results:
-            for result in tool_results:
-                context_parts.append(f"\n【{result['type']}工具结果】\n{result['content']}")
-        full_context = "\n".join(context_parts)
+        full_context = self._build_context(memory_context, tool_results)
         
         print("🧠 深度思考模式 (Tree-of-Thought)")
         print(f"   分支数: {thought_branches}, 深度: {thought_depth}")
@@ -401,7 +641,8 @@ class LangGraphAgent:
                 problem=user_input,
                 context=full_context,
                 max_branches=thought_branches,
-                max_depth=thought_depth
+                max_depth=thought_depth,
+                score_strategy=score_strategy
             )
             
             # 将思考过程和最终答案分开存储
@@ -418,13 +659,8 @@ class LangGraphAgent:
         
         return state
     
-    def _generate_response(self, state: AgentState) -> AgentState:
-        """生成最终响应（普通模式）"""
-        user_input = state["user_input"]
-        memory_context = state.get("memory_context", "")
-        tool_results = state.get("tool_results", [])
-        
-        # 构建上下文
+    def _build_context(self, memory_context: str, tool_results: list) -> str:
+        """将记忆上下文和工具结果拼接为完整上下文（工具结果已在结果中，不再重复写入记忆上下文）"""
         context_parts = []
         
         if memory_context:
@@ -432,34 +668,49 @@ class LangGraphAgent:
         
         if tool_results:
             for result in tool_results:
-                context_parts.append(f"\n【{result['type']}工具结果】\n{result['content']}")
+                # 搜索结果在格式化时已按搜索预算组装，其余工具结果按单个工具预算截断
+                content = result['content'] if result['type'] == "search" else self.context_assembler.fit_text("tool", result['content'])
+                context_parts.append(f"\n【{result['type']}工具结果】\n{content}")
+        
+        return "\n".join(context_parts)
+    
+    def _generate_response(self, state: AgentState) -> AgentState:
+        """生成最终响应（普通模式）"""
+        if self._cached_response(state):
+            return state
         
-        full_context = "\n".join(context_parts)
+        full_context = self._build_context(state.get("memory_context", ""), state.get("tool_results", []))
         
-        response_prompt = ChatPromptTemplate.from_messages([
-            ("system", """你是一个智能助手。根据提供的上下文信息回答用户问题。
-
-要求:
-1. 如果有搜索结果，基于搜索结果回答
-2. 如果有文件操作结果，说明操作结果
-3. 如果有计算结果，给出计算答案
-4. 回答要准确、友好、有帮助
-5. 如果信息不足，诚实说明
-
-上下文信息:
-{context}"""),
-            ("human", "{input}")
-        ])
+        try:
+            response = self.chains["response"].invoke({
+                "context": full_context,
+                "input": state["user_input"]
+            })
+            
+            state["final_response"] = response
+            self._cache_response(state, response)
+            print(f"✅ 生成响应完成")
+            
+        except Exception as e:
+            state["final_response"] = f"抱歉，生成响应时出错: {str(e)}"
         
-        chain = response_prompt | self.llm | StrOutputParser()
+        return state
+    
+    async def _agenerate_response(self, state: AgentState) -> AgentState:
+        """生成最终响应（普通模式，异步版本）"""
+        if self._cached_response(state):
+            return state
+        
+        full_context = self._build_context(state.get("memory_context", ""), state.get("tool_results", []))
         
         try:
-            response = chain.invoke({
+            response = await self.chains["response"].ainvoke({
                 "context": full_context,
-                "input": user_input
+                "input": state["user_input"]
             })
             
             state["final_response"] = response
+            self._cache_response(state, response)
             print(f"✅ 生成响应完成")
             
         except Exception as e:
@@ -467,37 +718,166 @@ class LangGraphAgent:
         
         return state
     
+    def _cacheable(self, state: AgentState) -> bool:
+        """
+        请求是否可以使用响应缓存
+        
+        只有普通对话（记忆路由）使用缓存：联网搜索和文件操作的结果随时间变化，
+        计算问题只差几个数字时向量几乎相同，都不走缓存
+        """
+        return bool(state.get("use_cache")) and self._route_decision(state) == "memory"
+    
+    def _cached_response(self, state: AgentState) -> bool:
+        """命中响应缓存时写入最终响应并返回 True"""
+        if not self._cacheable(state):
+            return False
+        cached = self.response_cache.lookup(state["user_input"], state.get("session_id"), state.get("user_id"))
+        if cached is None:
+            return False
+        state["final_response"], score = cached
+        state["cache_hit"] = True
+        print(f"♻️ 命中响应缓存 (相似度 {score:.3f})")
+        return True
+    
+    def _cache_response(self, state: AgentState, response: str) -> None:
+        if self._cacheable(state):
+            self.response_cache.store(state["user_input"], response, state.get("session_id"), state.get("user_id"))
+    
+    def _stream_cache_lookup(
+        self,
+        user_input: str,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> tuple:
+        """
+        流式接口的缓存查找（流式接口不做 LLM 意图分析，用本地意图路由排除搜索 / 文件 / 计算请求）
+        
+        Returns:
+            (是否可以使用缓存, 缓存的回答或 None)
+        """
+        if self.intent_router is not None:
+            try:
+                decision = self.intent_router.classify(user_input)
+            except Exception as e:
+                print(f"⚠️ 本地意图路由失败，不使用响应缓存: {e}")
+                return False, None
+            if decision is not None and decision.intent != "chat":
+                return False, None
+        # 本地不确定时仍可查找：缓存中只有普通对话的回答，高相似度命中即意味着意图相同
+        cached = self.response_cache.lookup(user_input, session_id, user_id)
+        if cached is None:
+            return True, None
+        print(f"♻️ 命中响应缓存 (相似度 {cached[1]:.3f})")
+        return True, cached[0]
+    
+    # 缓存回答回放时每个 RESPONSE_CHUNK 的字符数
+    _CACHE_REPLAY_CHUNK = 32
+    
+    def _replay_cached(self, response: str) -> Generator[dict, None, None]:
+        """把缓存的回答按块回放为流式事件"""
+        yield {"type": "status", "content": "命中响应缓存"}
+        for start in range(0, len(response), self._CACHE_REPLAY_CHUNK):
+            yield {"type": StreamEvent.RESPONSE_CHUNK, "content": response[start:start + self._CACHE_REPLAY_CHUNK]}
+        yield {
+            "type": StreamEvent.RESPONSE_END,
+            "content": "",
+            "tot_score": 0.0,
+            "deep_think": False,
+            "cached": True
+        }
+    
     def _save_memory(self, state: AgentState) -> AgentState:
-        """保存对话到记忆"""
+        """保存对话到记忆（回答来自响应缓存时不保存，原来的对话已在记忆中）"""
+        if state.get("cache_hit"):
+            return state
+        
         user_input = state["user_input"]
         final_response = state.get("final_response", "")
+        session_id = state.get("session_id")
+        user_id = state.get("user_id")
         
         # 保存到长期记忆
-        self.memory_store.add_memory(user_input, final_response)
+        self.memory_store.queue_memory(user_input, final_response, session_id=session_id, user_id=user_id)
         print(f"💾 保存记忆完成")
         
         return state
     
-    def chat(self, user_input: str, deep_think: bool = False, max_branches: int = 5, max_depth: int = 3) -> dict:
+    def _format_memories(self, memories: list) -> str:
         """
-        处理用户输入
+        将检索到的记忆格式化为上下文文本，无记忆时返回空字符串
+        
+        记忆按相关性排列，超出记忆 token 预算时丢弃排在最后的记忆
+        """
+        return self.context_assembler.fit_items(
+            "memory",
+            [(f"{i}. {memory['content']}\n", memory.get("id")) for i, memory in enumerate(memories, 1)],
+            header="【相关历史记忆】\n"
+        )
+    
+    def _format_search_results(self, results: list) -> str:
+        """将网络搜索结果格式化为上下文文本，超出搜索 token 预算时丢弃排在最后的结果"""
+        return self.context_assembler.fit_items(
+            "search",
+            [
+                (f"{i}. {result['title']}\n   {result['snippet']}\n   来源: {result['link']}\n\n", None)
+                for i, result in enumerate(results, 1)
+            ],
+            header="【网络搜索结果】\n"
+        ) or "【网络搜索结果】\n"
+    
+    def _recall(
+        self,
+        user_input: str,
+        n_results: Optional[int] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> tuple:
+        """
+        检索相关记忆（chat_with_search / 流式接口使用），只在会话/用户命名空间内检索
         
-        Args:
-            user_input: 用户输入
-            deep_think: 是否启用深度思考
-            max_branches: TOT 分支数
-            max_depth: TOT 深度
-            
         Returns:
-            dict: {
-                "response": str,           # 最终回答
-                "thinking_process": str,   # 思考过程（仅深度思考时有值）
-                "tot_score": float,        # TOT 得分（仅深度思考时有值）
-                "deep_think": bool         # 是否使用了深度思考
-            }
+            (记忆上下文文本, 记忆条数)
         """
-        # 初始化状态
-        initial_state = {
+        relevant_memories = self.memory_store.search_memories(
+            user_input,
+            n_results=n_results or self.memory_top_k,
+            session_id=session_id,
+            user_id=user_id
+        )
+        memory_context = self._format_memories(relevant_memories)
+        if memory_context:
+            memory_context = "\n\n" + memory_context
+        return memory_context, len(relevant_memories)
+    
+    def _search_web(self, user_input: str) -> tuple:
+        """
+        执行网络搜索（chat_with_search / 流式接口使用）
+        
+        Returns:
+            (搜索结果文本, 原始搜索结果)
+        """
+        search_result = self.web_searcher.search(user_input, num_results=5)
+        
+        if search_result["success"]:
+            results_text = self._format_search_results(search_result["results"])
+        else:
+            results_text = f"搜索未能返回结果: {search_result.get('error', '未知错误')}"
+        
+        return results_text, search_result
+    
+    def _initial_state(
+        self,
+        user_input: str,
+        deep_think: bool,
+        max_branches: int,
+        max_depth: int,
+        score_strategy: str = ScoreStrategy.SINGLE,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        use_cache: bool = False
+    ) -> dict:
+        """构建状态图的初始状态"""
+        return {
             "messages": [],
             "user_input": user_input,
             "next_action": "",
@@ -510,43 +890,134 @@ class LangGraphAgent:
             "needs_web_search": False,
             "needs_file_operation": False,
             "needs_calculation": False,
+            "intent_tier": "",
+            "recalled_memory": "",
+            "recalled_ids": [],
             "deep_think": deep_think,
             "thought_branches": max_branches,
-            "thought_depth": max_depth
+            "thought_depth": max_depth,
+            "score_strategy": score_strategy,
+            "session_id": session_id,
+            "user_id": user_id,
+            "use_cache": use_cache and not deep_think,
+            "cache_hit": False
         }
-        
-        # 运行状态图
-        print(f"\n{'='*50}")
-        print(f"📝 用户输入: {user_input}")
-        print(f"{'='*50}\n")
-        
-        final_state = self.app.invoke(initial_state)
-        
+    
+    def _chat_result(self, final_state: dict, deep_think: bool) -> dict:
         return {
             "response": final_state.get("final_response", ""),
             "thinking_process": final_state.get("thinking_process", ""),
             "tot_score": final_state.get("tot_score", 0.0),
-            "deep_think": deep_think
+            "deep_think": deep_think,
+            "cached": final_state.get("cache_hit", False)
         }
     
-    def chat_with_search(self, user_input: str, deep_think: bool = False, max_branches: int = 5, max_depth: int = 3) -> dict:
+    def chat(self, user_input: str, deep_think: bool = False, max_branches: int = 5, max_depth: int = 3, score_strategy: str = ScoreStrategy.SINGLE, session_id: Optional[str] = None, user_id: Optional[str] = None, use_cache: bool = False) -> dict:
         """
-        强制使用联网搜索处理用户输入
+        处理用户输入
         
         Args:
             user_input: 用户输入
             deep_think: 是否启用深度思考
             max_branches: TOT 分支数
             max_depth: TOT 深度
+            score_strategy: TOT 打分策略（single 逐个打分 / batch 批量打分）
+            session_id: 会话ID，记忆按会话隔离（None / "default" 表示全局）
+            user_id: 用户ID，指定时检索该用户所有会话的记忆
+            use_cache: 是否使用语义响应缓存（仅普通对话，深度思考 / 搜索 / 文件 / 计算不使用）
             
         Returns:
             dict: {
                 "response": str,           # 最终回答
                 "thinking_process": str,   # 思考过程（仅深度思考时有值）
                 "tot_score": float,        # TOT 得分（仅深度思考时有值）
-                "deep_think": bool         # 是否使用了深度思考
+                "deep_think": bool,        # 是否使用了深度思考
+                "cached": bool             # 回答是否来自语义响应缓存
             }
         """
+        # 初始化状态
+        initial_state = self._initial_state(
+            user_input, deep_think, max_branches, max_depth, score_strategy, session_id, user_id, use_cache
+        )
+        
+        # 运行状态图
+        print(f"\n{'='*50}")
+        print(f"📝 用户输入: {user_input}")
+        print(f"{'='*50}\n")
+        
+        final_state = self.app.invoke(initial_state)
+        
+        return self._chat_result(final_state, deep_think)
+    
+    async def achat(self, user_input: str, deep_think: bool = False, max_branches: int = 5, max_depth: int = 3, score_strategy: str = ScoreStrategy.SINGLE, session_id: Optional[str] = None, user_id: Optional[str] = None, use_cache: bool = False) -> dict:
+        """
+        处理用户输入（异步版本，参数和返回值同 chat）
+        
+        使用异步状态图，LLM 调用走 ainvoke，不占用线程等待网络响应
+        """
+        initial_state = self._initial_state(
+            user_input, deep_think, max_branches, max_depth, score_strategy, session_id, user_id, use_cache
+        )
+        
+        print(f"\n{'='*50}")
+        print(f"📝 用户输入: {user_input}")
+        print(f"{'='*50}\n")
+        
+        final_state = await self.async_app.ainvoke(initial_state)
+        
+        return self._chat_result(final_state, deep_think)
+    
+    def _search_deep_think(
+        self,
+        user_input: str,
+        context: str,
+        max_branches: int,
+        max_depth: int,
+        score_strategy: str = ScoreStrategy.SINGLE,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> dict:
+        """联网搜索 + TOT 深度思考，并保存记忆"""
+        print("🧠 深度思考模式 (搜索+TOT)")
+        try:
+            tot_result = self.tot_reasoner.solve(
+                problem=user_input,
+                context=context,
+                max_branches=max_branches,
+                max_depth=max_depth,
+                score_strategy=score_strategy
+            )
+            final_response = tot_result.get("final_answer", "")
+            thinking_process = tot_result.get("thinking_process", "")
+            tot_score = tot_result.get("best_score", 0.0)
+            
+            self.memory_store.queue_memory(user_input, final_response, session_id=session_id, user_id=user_id)
+            print("✅ 深度思考完成")
+            print("💾 保存记忆完成")
+            
+            return {
+                "response": final_response,
+                "thinking_process": thinking_process,
+                "tot_score": tot_score,
+                "deep_think": True
+            }
+        except Exception as e:
+            error_msg = f"深度思考失败: {str(e)}"
+            print(f"❌ 错误: {error_msg}")
+            return {
+                "response": error_msg,
+                "thinking_process": "",
+                "tot_score": 0.0,
+                "deep_think": True
+            }
+    
+    def _search_and_recall(
+        self,
+        user_input: str,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> str:
+        """执行网络搜索并检索相关记忆，返回拼接后的上下文"""
         print(f"\n{'='*50}")
         print(f"📝 用户输入: {user_input}")
         print(f"🌐 强制联网搜索模式")
@@ -554,113 +1025,169 @@ class LangGraphAgent:
         
         # 执行网络搜索
         print(f"🔍 执行网络搜索: {user_input}")
-        search_result = self.web_searcher.search(user_input, num_results=5)
-        
+        results_text, search_result = self._search_web(user_input)
         if search_result["success"]:
-            results_text = "【网络搜索结果】\n"
-            for i, result in enumerate(search_result["results"], 1):
-                results_text += f"{i}. {result['title']}\n"
-                results_text += f"   {result['snippet']}\n"
-                results_text += f"   来源: {result['link']}\n\n"
             print(f"✅ 搜索成功，获取 {len(search_result['results'])} 条结果")
         else:
-            results_text = f"搜索未能返回结果: {search_result.get('error', '未知错误')}"
             print(f"⚠️ 搜索失败: {search_result.get('error')}")
         
         # 检索相关记忆
-        relevant_memories = self.memory_store.search_memories(user_input, n_results=3)
-        memory_context = ""
-        if relevant_memories:
-            memory_context = "\n\n【相关历史记忆】\n"
-            for i, memory in enumerate(relevant_memories, 1):
-                memory_context += f"{i}. {memory['content']}\n"
+        memory_context, _ = self._recall(user_input, session_id=session_id, user_id=user_id)
         
-        if deep_think:
-            print("🧠 深度思考模式 (搜索+TOT)")
-            try:
-                tot_result = self.tot_reasoner.solve(
-                    problem=user_input,
-                    context=results_text + memory_context,
-                    max_branches=max_branches,
-                    max_depth=max_depth
-                )
-                final_response = tot_result.get("final_answer", "")
-                thinking_process = tot_result.get("thinking_process", "")
-                tot_score = tot_result.get("best_score", 0.0)
-                
-                self.memory_store.add_memory(user_input, final_response)
-                print("✅ 深度思考完成")
-                print("💾 保存记忆完成")
-                
-                return {
-                    "response": final_response,
-                    "thinking_process": thinking_process,
-                    "tot_score": tot_score,
-                    "deep_think": True
-                }
-            except Exception as e:
-                error_msg = f"深度思考失败: {str(e)}"
-                print(f"❌ 错误: {error_msg}")
-                return {
-                    "response": error_msg,
-                    "thinking_process": "",
-                    "tot_score": 0.0,
-                    "deep_think": True
-                }
-        else:
-            response_prompt = ChatPromptTemplate.from_messages([
-                ("system", """你是一个智能助手，能够利用网络搜索结果回答用户问题。
-
-要求:
-1. 基于搜索结果回答问题
-2. 如有多个来源，综合信息回答
-3. 适当引用来源
-4. 如果搜索结果不足以回答问题，诚实说明
-5. 回答要准确、有帮助
-
-{context}"""),
-                ("human", "{input}")
-            ])
-            
-            chain = response_prompt | self.llm | StrOutputParser()
+        return results_text + memory_context
+    
+    def _search_response_result(self, response: str) -> dict:
+        print(f"✅ 生成响应完成")
+        return {
+            "response": response,
+            "thinking_process": "",
+            "tot_score": 0.0,
+            "deep_think": False
+        }
+    
+    def _search_response_error(self, error: Exception) -> dict:
+        error_msg = f"抱歉，生成响应时出错: {str(error)}"
+        print(f"❌ 错误: {error_msg}")
+        return {
+            "response": error_msg,
+            "thinking_process": "",
+            "tot_score": 0.0,
+            "deep_think": False
+        }
+    
+    def chat_with_search(self, user_input: str, deep_think: bool = False, max_branches: int = 5, max_depth: int = 3, score_strategy: str = ScoreStrategy.SINGLE, session_id: Optional[str] = None, user_id: Optional[str] = None) -> dict:
+        """
+        强制使用联网搜索处理用户输入
+        
+        Args:
+            user_input: 用户输入
+            deep_think: 是否启用深度思考
+            max_branches: TOT 分支数
+            max_depth: TOT 深度
+            score_strategy: TOT 打分策略（single 逐个打分 / batch 批量打分）
+            session_id: 会话ID，记忆按会话隔离（None / "default" 表示全局）
+            user_id: 用户ID，指定时检索该用户所有会话的记忆
             
-            try:
-                response = chain.invoke({
-                    "context": results_text + memory_context,
-                    "input": user_input
-                })
-                print(f"✅ 生成响应完成")
-                
-                # 保存到长期记忆
-                self.memory_store.add_memory(user_input, response)
-                print(f"💾 保存记忆完成")
-                
-                return {
-                    "response": response,
-                    "thinking_process": "",
-                    "tot_score": 0.0,
-                    "deep_think": False
-                }
-                
-            except Exception as e:
-                error_msg = f"抱歉，生成响应时出错: {str(e)}"
-                print(f"❌ 错误: {error_msg}")
-                return {
-                    "response": error_msg,
-                    "thinking_process": "",
-                    "tot_score": 0.0,
-                    "deep_think": False
-                }
+        Returns:
+            dict: {
+                "response": str,           # 最终回答
+                "thinking_process": str,   # 思考过程（仅深度思考时有值）
+                "tot_score": float,        # TOT 得分（仅深度思考时有值）
+                "deep_think": bool         # 是否使用了深度思考
+            }
+        """
+        context = self._search_and_recall(user_input, session_id, user_id)
+        
+        if deep_think:
+            return self._search_deep_think(
+                user_input, context, max_branches, max_depth, score_strategy, session_id, user_id
+            )
+        
+        try:
+            response = self.chains["search_response"].invoke({
+                "context": context,
+                "input": user_input
+            })
+        except Exception as e:
+            return self._search_response_error(e)
+        
+        # 保存到长期记忆
+        self.memory_store.queue_memory(user_input, response, session_id=session_id, user_id=user_id)
+        print(f"💾 保存记忆完成")
+        
+        return self._search_response_result(response)
+    
+    async def achat_with_search(self, user_input: str, deep_think: bool = False, max_branches: int = 5, max_depth: int = 3, score_strategy: str = ScoreStrategy.SINGLE, session_id: Optional[str] = None, user_id: Optional[str] = None) -> dict:
+        """
+        强制使用联网搜索处理用户输入（异步版本，参数和返回值同 chat_with_search）
+        """
+        context = await self._run_blocking(self._search_and_recall, user_input, session_id, user_id)
+        
+        if deep_think:
+            return await self._run_blocking(
+                self._search_deep_think,
+                user_input, context, max_branches, max_depth, score_strategy, session_id, user_id
+            )
+        
+        try:
+            response = await self.chains["search_response"].ainvoke({
+                "context": context,
+                "input": user_input
+            })
+        except Exception as e:
+            return self._search_response_error(e)
+        
+        await self._run_blocking(
+            self.memory_store.queue_memory, user_input, response, session_id=session_id, user_id=user_id
+        )
+        print(f"💾 保存记忆完成")
+        
+        return self._search_response_result(response)
+    
+    def get_intent_stats(self) -> dict:
+        """获取意图路由统计（各层级的判断数量和本地命中率）"""
+        if self.intent_router is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.intent_router.get_stats()}
+    
+    def get_response_cache_stats(self) -> dict:
+        """获取语义响应缓存统计（条目数和命中率）"""
+        return self.response_cache.get_stats()
     
     def get_memory_stats(self):
         """获取记忆统计"""
+        stats = self.memory_store.get_stats()
         return {
-            "long_term_memories": self.memory_store.get_memory_count()
+            "long_term_memories": stats["memory_count"],
+            "memory_store": stats,
+            "context": {
+                "budgets": self.context_assembler.budgets,
+                "token_counter": self.context_assembler.counter.stats()
+            }
         }
     
-    def clear_all_memory(self):
-        """清除所有记忆"""
-        self.memory_store.clear_all_memories()
+    def get_memory_page(
+        self,
+        page: int = 1,
+        page_size: int = 20,
+        memory_type: Optional[str] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> dict:
+        """分页浏览记忆（按时间倒序）"""
+        return self.memory_store.get_memory_page(page, page_size, memory_type, session_id, user_id)
+    
+    def export_memories(self, filepath: str, include_embeddings: bool = False) -> bool:
+        """导出长时记忆到 JSONL 文件（.gz 后缀自动压缩）"""
+        return self.memory_store.export_memories(filepath, include_embeddings=include_embeddings)
+    
+    def import_memories(self, filepath: str) -> int:
+        """从导出文件导入长时记忆"""
+        return self.memory_store.import_memories(filepath)
+    
+    def clear_all_memory(self, session_id: Optional[str] = None, user_id: Optional[str] = None) -> bool:
+        """清除所有记忆（指定 session_id / user_id 时只清除该命名空间）"""
+        cleared = self.memory_store.clear_all_memories(session_id=session_id, user_id=user_id)
+        # 缓存的回答可能依赖已清除的记忆
+        self.response_cache.clear()
+        return cleared
+    
+    def compact_memories(self, dry_run: bool = False) -> dict:
+        """压缩久远的相似对话记忆，dry_run 时只返回计划"""
+        return self.memory_compactor.run(dry_run=dry_run).to_dict()
+    
+    def close(self):
+        """关闭 Agent：停止后台记忆压缩和保留策略清理，落盘尚未写入的记忆"""
+        self.memory_compactor.stop()
+        self.retention_sweeper.stop()
+        self.memory_store.close()
+    
+    @staticmethod
+    def _summarize_inputs(text: str, max_length: int = None) -> dict:
+        return {
+            "text": text,
+            "length_requirement": f"\n\n要求：总结长度不超过{max_length}字。" if max_length else ""
+        }
     
     def summarize(self, text: str, max_length: int = None) -> str:
         """
@@ -673,15 +1200,15 @@ class LangGraphAgent:
         Returns:
             总结后的文本
         """
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "你是一个专业的文本总结助手。请简洁、准确地总结用户提供的文本。"),
-            ("human", f"请对以下文本进行总结：\n\n{text}" + (f"\n\n要求：总结长度不超过{max_length}字。" if max_length else ""))
-        ])
-        
-        chain = prompt | self.llm | StrOutputParser()
-        
         try:
-            return chain.invoke({})
+            return self.chains["summarize"].invoke(self._summarize_inputs(text, max_length))
+        except Exception as e:
+            return f"总结失败: {str(e)}"
+    
+    async def asummarize(self, text: str, max_length: int = None) -> str:
+        """对文本进行总结（异步版本）"""
+        try:
+            return await self.chains["summarize"].ainvoke(self._summarize_inputs(text, max_length))
         except Exception as e:
             return f"总结失败: {str(e)}"
     
@@ -695,15 +1222,15 @@ class LangGraphAgent:
         Returns:
             提取的关键信息
         """
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "你是一个信息提取专家。请从用户提供的文本中提取关键信息，包括人物、时间、地点、事件等重要内容。"),
-            ("human", f"请从以下文本中提取关键信息：\n\n{text}")
-        ])
-        
-        chain = prompt | self.llm | StrOutputParser()
-        
         try:
-            return chain.invoke({})
+            return self.chains["extract_info"].invoke({"text": text})
+        except Exception as e:
+            return f"信息提取失败: {str(e)}"
+    
+    async def aextract_information(self, text: str) -> str:
+        """从文本中提取关键信息（异步版本）"""
+        try:
+            return await self.chains["extract_info"].ainvoke({"text": text})
         except Exception as e:
             return f"信息提取失败: {str(e)}"
     
@@ -718,21 +1245,147 @@ class LangGraphAgent:
         Returns:
             翻译后的文本
         """
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", f"你是一个专业的翻译助手。请将用户提供的文本准确翻译成{target_language}。只返回翻译结果，不要添加解释。"),
-            ("human", text)
-        ])
-        
-        chain = prompt | self.llm | StrOutputParser()
-        
         try:
-            return chain.invoke({})
+            return self.chains["translate"].invoke({"text": text, "target_language": target_language})
+        except Exception as e:
+            return f"翻译失败: {str(e)}"
+    
+    async def atranslate(self, text: str, target_language: str = "English") -> str:
+        """翻译文本（异步版本）"""
+        try:
+            return await self.chains["translate"].ainvoke({"text": text, "target_language": target_language})
         except Exception as e:
             return f"翻译失败: {str(e)}"
 
+    def _file_analysis_inputs(self, file_content: str, file_type: str, question: str) -> dict:
+        """构建文件分析链的输入，文件内容按文件 token 预算截断"""
+        return {
+            "file_type": file_type,
+            "file_content": self.context_assembler.fit_text("file", file_content),
+            "question": question
+        }
+    
+    def analyze_file(self, file_content: str, file_type: str = "unknown", question: str = "请分析这个文件的内容") -> str:
+        """
+        根据上传文件的内容回答问题
+        
+        Args:
+            file_content: 文件内容
+            file_type: 文件类型
+            question: 关于文件的问题
+            
+        Returns:
+            分析结果
+        """
+        try:
+            return self.chains["file_analysis"].invoke(self._file_analysis_inputs(file_content, file_type, question))
+        except Exception as e:
+            return f"文件分析失败: {str(e)}"
+    
+    async def aanalyze_file(self, file_content: str, file_type: str = "unknown", question: str = "请分析这个文件的内容") -> str:
+        """根据上传文件的内容回答问题（异步版本）"""
+        try:
+            return await self.chains["file_analysis"].ainvoke(self._file_analysis_inputs(file_content, file_type, question))
+        except Exception as e:
+            return f"文件分析失败: {str(e)}"
+
     # ==================== 流式方法 ====================
     
-    def chat_stream(self, user_input: str, deep_think: bool = False, max_branches: int = 5, max_depth: int = 3) -> Generator[dict, None, None]:
+    # 深度思考的最终回答之前输出的分隔块
+    _ANSWER_HEADER = "\n\n---\n\n**最终回答：**\n\n"
+    
+    def _prepare_stream(
+        self,
+        user_input: str,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        use_cache: bool = False
+    ) -> tuple:
+        """
+        流式接口的前置步骤（阻塞）：检索相关记忆，启用缓存时查找响应缓存
+        
+        Returns:
+            (记忆上下文, 状态事件列表, 是否可以使用缓存, 缓存的回答或 None)
+        """
+        memory_context, memory_count = self._recall(user_input, session_id=session_id, user_id=user_id)
+        events = [{"type": "status", "content": f"找到 {memory_count} 条相关记忆"}] if memory_count else []
+        cacheable, cached = self._stream_cache_lookup(user_input, session_id, user_id) if use_cache else (False, None)
+        return memory_context, events, cacheable, cached
+    
+    def _prepare_search_stream(
+        self,
+        user_input: str,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> tuple:
+        """
+        联网搜索流式接口的前置步骤（阻塞）：网络搜索 + 检索相关记忆
+        
+        Returns:
+            (搜索结果文本, 记忆上下文, 状态事件列表)
+        """
+        results_text, search_result = self._search_web(user_input)
+        if search_result["success"]:
+            status = f"✅ 搜索成功，获取 {len(search_result['results'])} 条结果"
+        else:
+            status = f"⚠️ 搜索失败: {search_result.get('error')}"
+        memory_context, _ = self._recall(user_input, session_id=session_id, user_id=user_id)
+        return results_text, memory_context, [{"type": "status", "content": status}]
+    
+    def _finish_stream(
+        self,
+        user_input: str,
+        response: str,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        cache: bool = False
+    ) -> None:
+        """流式接口的收尾步骤（阻塞）：保存记忆，需要时写入响应缓存（写入缓存要计算查询嵌入）"""
+        self.memory_store.queue_memory(user_input, response, session_id=session_id, user_id=user_id)
+        if cache:
+            self.response_cache.store(user_input, response, session_id, user_id)
+    
+    def _tot_stream(
+        self,
+        user_input: str,
+        context: str,
+        max_branches: int,
+        max_depth: int,
+        score_strategy: str,
+        cancelled: Optional[threading.Event] = None
+    ) -> Callable[[], Generator[dict, None, None]]:
+        """
+        返回创建 TOT 事件流的无参函数（同步接口直接调用，异步接口交给 stream_bridge）
+
+        cancelled 与 stream_bridge 共享：客户端断开后 TOT 在下一次 LLM 调用前停止
+        """
+        return functools.partial(
+            self.tot_reasoner.solve_stream,
+            problem=user_input,
+            context=context,
+            max_branches=max_branches,
+            max_depth=max_depth,
+            score_strategy=score_strategy,
+            cancelled=cancelled
+        )
+    
+    @staticmethod
+    def _chunk_event(chunk) -> Optional[dict]:
+        """将 LLM 流的输出块转换为 RESPONSE_CHUNK 事件（空块返回 None）"""
+        if hasattr(chunk, 'content') and chunk.content:
+            return {"type": StreamEvent.RESPONSE_CHUNK, "content": chunk.content}
+        return None
+    
+    @staticmethod
+    def _stream_end(tot_score: float = 0.0, deep_think: bool = False) -> dict:
+        return {
+            "type": StreamEvent.RESPONSE_END,
+            "content": "",
+            "tot_score": tot_score,
+            "deep_think": deep_think
+        }
+    
+    def chat_stream(self, user_input: str, deep_think: bool = False, max_branches: int = 5, max_depth: int = 3, score_strategy: str = ScoreStrategy.SINGLE, session_id: Optional[str] = None, user_id: Optional[str] = None, use_cache: bool = False) -> Generator[dict, None, None]:
         """
         流式处理用户输入，边思考边输出
         
@@ -741,20 +1394,24 @@ class LangGraphAgent:
             deep_think: 是否启用深度思考
             max_branches: TOT 分支数
             max_depth: TOT 深度
+            score_strategy: TOT 打分策略（single 逐个打分 / batch 批量打分）
+            session_id: 会话ID，记忆按会话隔离（None / "default" 表示全局）
+            user_id: 用户ID，指定时检索该用户所有会话的记忆
+            use_cache: 是否使用语义响应缓存（命中时回答按块回放为 RESPONSE_CHUNK 事件）
             
         Yields:
             dict: 流式事件
+            
+        调用方（如 SSE 客户端断开时）可对生成器调用 close()，
+        生成器会在当前 yield 处退出并释放底层 LLM 流，不再继续生成。
         """
         yield {"type": "status", "content": "开始处理..."}
         
-        # 检索相关记忆
-        relevant_memories = self.memory_store.search_memories(user_input, n_results=3)
-        memory_context = ""
-        if relevant_memories:
-            memory_context = "\n\n【相关历史记忆】\n"
-            for i, memory in enumerate(relevant_memories, 1):
-                memory_context += f"{i}. {memory['content']}\n"
-            yield {"type": "status", "content": f"找到 {len(relevant_memories)} 条相关记忆"}
+        # 检索相关记忆（普通模式同时查找响应缓存）
+        memory_context, events, cacheable, cached = self._prepare_stream(
+            user_input, session_id, user_id, use_cache and not deep_think
+        )
+        yield from events
         
         if deep_think:
             yield {"type": "status", "content": "启用深度思考模式 (Tree-of-Thought)..."}
@@ -763,12 +1420,7 @@ class LangGraphAgent:
             final_answer = ""
             best_score = 0.0
             
-            for event in self.tot_reasoner.solve_stream(
-                problem=user_input,
-                context=memory_context,
-                max_branches=max_branches,
-                max_depth=max_depth
-            ):
+            for event in self._tot_stream(user_input, memory_context, max_branches, max_depth, score_strategy)():
                 # 转发 TOT 事件
                 yield event
                 
@@ -777,75 +1429,118 @@ class LangGraphAgent:
                     best_score = event.get("best_score", 0.0)
             
             # 流式输出最终响应
-            yield {"type": StreamEvent.RESPONSE_CHUNK, "content": "\n\n---\n\n**最终回答：**\n\n"}
+            yield {"type": StreamEvent.RESPONSE_CHUNK, "content": self._ANSWER_HEADER}
             
             # 使用 LLM 流式生成最终响应
-            response_prompt = ChatPromptTemplate.from_messages([
-                ("system", """基于深度思考的结果，生成简洁清晰的回答。
+            try:
+                for chunk in self.chains["deep_answer"].stream({"thought": final_answer, "question": user_input}):
+                    event = self._chunk_event(chunk)
+                    if event:
+                        yield event
+            except Exception as e:
+                yield {"type": StreamEvent.ERROR, "content": f"生成响应失败: {str(e)}"}
+            
+            # 保存记忆
+            self._finish_stream(user_input, final_answer, session_id, user_id)
+            
+            yield self._stream_end(best_score, True)
+        else:
+            # 普通模式：命中响应缓存时回放缓存的回答（不再保存记忆，避免重复的对话记忆）
+            if cached is not None:
+                yield from self._replay_cached(cached)
+                return
+            
+            # 未命中：直接流式生成响应
+            yield {"type": "status", "content": "生成回答中..."}
+            
+            full_response = ""
+            
+            try:
+                for chunk in self.chains["stream_response"].stream({"context": memory_context, "input": user_input}):
+                    event = self._chunk_event(chunk)
+                    if event:
+                        full_response += event["content"]
+                        yield event
                 
-思考结果: {thought}
-用户问题: {question}
+                # 保存记忆（并写入响应缓存）
+                self._finish_stream(user_input, full_response, session_id, user_id, cache=cacheable)
+                
+                yield self._stream_end()
+            except Exception as e:
+                yield {"type": StreamEvent.ERROR, "content": f"生成响应失败: {str(e)}"}
 
-请直接回答用户问题，不要重复思考过程。"""),
-                ("human", "{question}")
-            ])
+    async def astream(self, user_input: str, deep_think: bool = False, max_branches: int = 5, max_depth: int = 3, score_strategy: str = ScoreStrategy.SINGLE, session_id: Optional[str] = None, user_id: Optional[str] = None, use_cache: bool = False) -> AsyncGenerator[dict, None]:
+        """
+        流式处理用户输入（异步版本，参数和事件同 chat_stream）
+        
+        LLM 使用 astream 输出；前置和收尾的阻塞步骤（检索、缓存嵌入、保存记忆）在 executor 中执行，
+        TOT 推理通过 stream_bridge 在线程池中运行。
+        调用方停止迭代（如客户端断开）时，底层 LLM 流和 TOT 推理随之停止。
+        """
+        yield {"type": "status", "content": "开始处理..."}
+        
+        memory_context, events, cacheable, cached = await self._run_blocking(
+            self._prepare_stream, user_input, session_id, user_id, use_cache and not deep_think
+        )
+        for event in events:
+            yield event
+        
+        if deep_think:
+            yield {"type": "status", "content": "启用深度思考模式 (Tree-of-Thought)..."}
             
-            chain = response_prompt | self.llm
+            final_answer = ""
+            best_score = 0.0
+            
+            cancelled = threading.Event()
+            async for event in self.stream_bridge.iterate(
+                self._tot_stream(user_input, memory_context, max_branches, max_depth, score_strategy, cancelled),
+                cancelled=cancelled
+            ):
+                yield event
+                
+                if event.get("type") == StreamEvent.THINKING_END:
+                    final_answer = event.get("final_answer", "")
+                    best_score = event.get("best_score", 0.0)
+            
+            yield {"type": StreamEvent.RESPONSE_CHUNK, "content": self._ANSWER_HEADER}
             
             try:
-                for chunk in chain.stream({"thought": final_answer, "question": user_input}):
-                    if hasattr(chunk, 'content') and chunk.content:
-                        yield {"type": StreamEvent.RESPONSE_CHUNK, "content": chunk.content}
+                async for chunk in self.chains["deep_answer"].astream({"thought": final_answer, "question": user_input}):
+                    event = self._chunk_event(chunk)
+                    if event:
+                        yield event
             except Exception as e:
                 yield {"type": StreamEvent.ERROR, "content": f"生成响应失败: {str(e)}"}
             
-            # 保存记忆
-            self.memory_store.add_memory(user_input, final_answer)
+            await self._run_blocking(self._finish_stream, user_input, final_answer, session_id, user_id)
             
-            yield {
-                "type": StreamEvent.RESPONSE_END,
-                "content": "",
-                "tot_score": best_score,
-                "deep_think": True
-            }
+            yield self._stream_end(best_score, True)
         else:
-            # 普通模式：直接流式生成响应
-            yield {"type": "status", "content": "生成回答中..."}
+            if cached is not None:
+                for event in self._replay_cached(cached):
+                    yield event
+                return
             
-            response_prompt = ChatPromptTemplate.from_messages([
-                ("system", """你是一个智能助手。根据提供的上下文信息回答用户问题。
-
-要求:
-1. 回答要准确、友好、有帮助
-2. 如果信息不足，诚实说明
-
-上下文信息:
-{context}"""),
-                ("human", "{input}")
-            ])
+            yield {"type": "status", "content": "生成回答中..."}
             
-            chain = response_prompt | self.llm
             full_response = ""
             
             try:
-                for chunk in chain.stream({"context": memory_context, "input": user_input}):
-                    if hasattr(chunk, 'content') and chunk.content:
-                        full_response += chunk.content
-                        yield {"type": StreamEvent.RESPONSE_CHUNK, "content": chunk.content}
+                async for chunk in self.chains["stream_response"].astream({"context": memory_context, "input": user_input}):
+                    event = self._chunk_event(chunk)
+                    if event:
+                        full_response += event["content"]
+                        yield event
                 
-                # 保存记忆
-                self.memory_store.add_memory(user_input, full_response)
+                await self._run_blocking(
+                    self._finish_stream, user_input, full_response, session_id, user_id, cache=cacheable
+                )
                 
-                yield {
-                    "type": StreamEvent.RESPONSE_END,
-                    "content": "",
-                    "tot_score": 0.0,
-                    "deep_think": False
-                }
+                yield self._stream_end()
             except Exception as e:
                 yield {"type": StreamEvent.ERROR, "content": f"生成响应失败: {str(e)}"}
 
-    def chat_with_search_stream(self, user_input: str, deep_think: bool = False, max_branches: int = 5, max_depth: int = 3) -> Generator[dict, None, None]:
+    def chat_with_search_stream(self, user_input: str, deep_think: bool = False, max_branches: int = 5, max_depth: int = 3, score_strategy: str = ScoreStrategy.SINGLE, session_id: Optional[str] = None, user_id: Optional[str] = None) -> Generator[dict, None, None]:
         """
         流式处理联网搜索请求
         
@@ -854,35 +1549,18 @@ class LangGraphAgent:
             deep_think: 是否启用深度思考
             max_branches: TOT 分支数
             max_depth: TOT 深度
+            score_strategy: TOT 打分策略（single 逐个打分 / batch 批量打分）
+            session_id: 会话ID，记忆按会话隔离（None / "default" 表示全局）
+            user_id: 用户ID，指定时检索该用户所有会话的记忆
             
         Yields:
             dict: 流式事件
         """
         yield {"type": "status", "content": "🌐 开始联网搜索..."}
         
-        # 执行网络搜索
-        search_result = self.web_searcher.search(user_input, num_results=5)
-        
-        if search_result["success"]:
-            results_text = "【网络搜索结果】\n"
-            for i, result in enumerate(search_result["results"], 1):
-                results_text += f"{i}. {result['title']}\n"
-                results_text += f"   {result['snippet']}\n"
-                results_text += f"   来源: {result['link']}\n\n"
-            yield {"type": "status", "content": f"✅ 搜索成功，获取 {len(search_result['results'])} 条结果"}
-        else:
-            results_text = f"搜索未能返回结果: {search_result.get('error', '未知错误')}"
-            yield {"type": "status", "content": f"⚠️ 搜索失败: {search_result.get('error')}"}
-        
-        # 检索相关记忆
-        relevant_memories = self.memory_store.search_memories(user_input, n_results=3)
-        memory_context = ""
-        if relevant_memories:
-            memory_context = "\n\n【相关历史记忆】\n"
-            for i, memory in enumerate(relevant_memories, 1):
-                memory_context += f"{i}. {memory['content']}\n"
-        
-        full_context = results_text + memory_context
+        # 执行网络搜索并检索相关记忆
+        results_text, memory_context, events = self._prepare_search_stream(user_input, session_id, user_id)
+        yield from events
         
         if deep_think:
             yield {"type": "status", "content": "🧠 启用深度思考模式 (搜索+TOT)..."}
@@ -890,86 +1568,103 @@ class LangGraphAgent:
             final_answer = ""
             best_score = 0.0
             
-            for event in self.tot_reasoner.solve_stream(
-                problem=user_input,
-                context=full_context,
-                max_branches=max_branches,
-                max_depth=max_depth
-            ):
+            tot_stream = self._tot_stream(
+                user_input, results_text + memory_context, max_branches, max_depth, score_strategy
+            )
+            for event in tot_stream():
                 yield event
                 
                 if event.get("type") == StreamEvent.THINKING_END:
                     final_answer = event.get("final_answer", "")
                     best_score = event.get("best_score", 0.0)
             
-            yield {"type": StreamEvent.RESPONSE_CHUNK, "content": "\n\n---\n\n**最终回答：**\n\n"}
+            yield {"type": StreamEvent.RESPONSE_CHUNK, "content": self._ANSWER_HEADER}
             
             # 使用搜索结果生成最终响应
-            response_prompt = ChatPromptTemplate.from_messages([
-                ("system", """基于网络搜索结果和深度思考，生成准确的回答。
-
-搜索结果: {search_results}
-思考结果: {thought}
-用户问题: {question}
+            try:
+                for chunk in self.chains["search_deep_answer"].stream({"search_results": results_text, "thought": final_answer, "question": user_input}):
+                    event = self._chunk_event(chunk)
+                    if event:
+                        yield event
+            except Exception as e:
+                yield {"type": StreamEvent.ERROR, "content": f"生成响应失败: {str(e)}"}
+            
+            self._finish_stream(user_input, final_answer, session_id, user_id)
+            
+            yield self._stream_end(best_score, True)
+        else:
+            yield {"type": "status", "content": "生成回答中..."}
+            
+            full_response = ""
+            
+            try:
+                for chunk in self.chains["search_stream"].stream({"search_results": results_text, "memory_context": memory_context, "input": user_input}):
+                    event = self._chunk_event(chunk)
+                    if event:
+                        full_response += event["content"]
+                        yield event
+                
+                self._finish_stream(user_input, full_response, session_id, user_id)
+                
+                yield self._stream_end()
+            except Exception as e:
+                yield {"type": StreamEvent.ERROR, "content": f"生成响应失败: {str(e)}"}
 
-请综合信息回答，适当引用来源。"""),
-                ("human", "{question}")
-            ])
+    async def astream_with_search(self, user_input: str, deep_think: bool = False, max_branches: int = 5, max_depth: int = 3, score_strategy: str = ScoreStrategy.SINGLE, session_id: Optional[str] = None, user_id: Optional[str] = None) -> AsyncGenerator[dict, None]:
+        """
+        流式处理联网搜索请求（异步版本，参数和事件同 chat_with_search_stream）
+        """
+        yield {"type": "status", "content": "🌐 开始联网搜索..."}
+        
+        results_text, memory_context, events = await self._run_blocking(
+            self._prepare_search_stream, user_input, session_id, user_id
+        )
+        for event in events:
+            yield event
+        
+        if deep_think:
+            yield {"type": "status", "content": "🧠 启用深度思考模式 (搜索+TOT)..."}
             
-            chain = response_prompt | self.llm
+            final_answer = ""
+            best_score = 0.0
+            
+            cancelled = threading.Event()
+            async for event in self.stream_bridge.iterate(self._tot_stream(
+                user_input, results_text + memory_context, max_branches, max_depth, score_strategy, cancelled
+            ), cancelled=cancelled):
+                yield event
+                
+                if event.get("type") == StreamEvent.THINKING_END:
+                    final_answer = event.get("final_answer", "")
+                    best_score = event.get("best_score", 0.0)
+            
+            yield {"type": StreamEvent.RESPONSE_CHUNK, "content": self._ANSWER_HEADER}
             
             try:
-                for chunk in chain.stream({"search_results": results_text, "thought": final_answer, "question": user_input}):
-                    if hasattr(chunk, 'content') and chunk.content:
-                        yield {"type": StreamEvent.RESPONSE_CHUNK, "content": chunk.content}
+                async for chunk in self.chains["search_deep_answer"].astream({"search_results": results_text, "thought": final_answer, "question": user_input}):
+                    event = self._chunk_event(chunk)
+                    if event:
+                        yield event
             except Exception as e:
                 yield {"type": StreamEvent.ERROR, "content": f"生成响应失败: {str(e)}"}
             
-            self.memory_store.add_memory(user_input, final_answer)
+            await self._run_blocking(self._finish_stream, user_input, final_answer, session_id, user_id)
             
-            yield {
-                "type": StreamEvent.RESPONSE_END,
-                "content": "",
-                "tot_score": best_score,
-                "deep_think": True
-            }
+            yield self._stream_end(best_score, True)
         else:
             yield {"type": "status", "content": "生成回答中..."}
             
-            response_prompt = ChatPromptTemplate.from_messages([
-                ("system", """你是一个智能助手，能够利用网络搜索结果回答用户问题。
-
-要求:
-1. 基于搜索结果回答问题
-2. 如有多个来源，综合信息回答
-3. 适当引用来源
-4. 如果搜索结果不足以回答问题，诚实说明
-5. 回答要准确、有帮助
-
-搜索结果:
-{search_results}
-
-历史记忆:
-{memory_context}"""),
-                ("human", "{input}")
-            ])
-            
-            chain = response_prompt | self.llm
             full_response = ""
             
             try:
-                for chunk in chain.stream({"search_results": results_text, "memory_context": memory_context, "input": user_input}):
-                    if hasattr(chunk, 'content') and chunk.content:
-                        full_response += chunk.content
-                        yield {"type": StreamEvent.RESPONSE_CHUNK, "content": chunk.content}
+                async for chunk in self.chains["search_stream"].astream({"search_results": results_text, "memory_context": memory_context, "input": user_input}):
+                    event = self._chunk_event(chunk)
+                    if event:
+                        full_response += event["content"]
+                        yield event
                 
-                self.memory_store.add_memory(user_input, full_response)
+                await self._run_blocking(self._finish_stream, user_input, full_response, session_id, user_id)
                 
-                yield {
-                    "type": StreamEvent.RESPONSE_END,
-                    "content": "",
-                    "tot_score": 0.0,
-                    "deep_think": False
-                }
+                yield self._stream_end()
             except Exception as e:
                 yield {"type": StreamEvent.ERROR, "content": f"生成响应失败: {str(e)}"}
@@ -46,6 +46,8 @@ def main() -> None:
         sys.stdout.write(reply + "\n")
         sys.stdout.flush()
 
+    agent.close()
+
 
 if __name__ == "__main__":
     main()
@@ -5,7 +5,7 @@ LangGraph Studio 入口文件
 
 from langgraph_agent import LangGraphAgent
 
-# 创建 Agent 实例
+# 创建 Agent 实例（嵌入模型延迟加载，导入本模块时不会加载 MiniLM）
 _agent = LangGraphAgent(
     memory_dir="./chat_memory_db",
     workspace_dir="./workspace"
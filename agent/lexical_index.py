@@ -0,0 +1,161 @@
+"""
+记忆词法索引
+与 ChromaDB 并存的内存 BM25 倒排索引，弥补向量检索对人名、数字、日期等
+精确词项召回不足的问题。中文（CJK）按字符二元组切分，英文和数字按词切分。
+"""
+
+import re
+import math
+import heapq
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# CJK 字符连续片段 / 英文数字词
+_TOKEN_PATTERN = re.compile(
+    r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af]+"
+    r"|[a-z0-9]+(?:[._:/-][a-z0-9]+)*"
+)
+_CJK_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    分词：CJK 片段切分为字符二元组（单字片段保留单字），其余按英文/数字词切分
+
+    例如 "张三生日是2024-03-05" → ["张三", "三生", "生日", "日是", "2024-03-05"]
+    """
+    tokens = []
+    for run in _TOKEN_PATTERN.findall((text or "").lower()):
+        if _CJK_PATTERN.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    倒数排名融合（RRF）：score(d) = Σ 1 / (k + rank(d))
+
+    Args:
+        rankings: 多个按相关度排序的ID列表
+        k: 平滑常数
+
+    Returns:
+        按融合得分降序排列的 (ID, 得分) 列表
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """
+    线程安全的增量 BM25 倒排索引
+
+    每个文档额外记录 type / session_id / user_id，检索时按与
+    MemoryStore 相同的作用域规则过滤（user_id 优先于 session_id）。
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_tokens: Dict[str, Counter] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._doc_scope: Dict[str, Tuple[Optional[str], Optional[str], Optional[str]]] = {}
+        self._total_len = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def _remove_locked(self, doc_id: str) -> None:
+        counts = self._doc_tokens.pop(doc_id, None)
+        if counts is None:
+            return
+        for token in counts:
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[token]
+        self._total_len -= self._doc_len.pop(doc_id, 0)
+        self._doc_scope.pop(doc_id, None)
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Optional[Dict]]) -> None:
+        """添加（或覆盖）文档"""
+        with self._lock:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                self._remove_locked(doc_id)
+                counts = Counter(tokenize(text))
+                metadata = metadata or {}
+                self._doc_tokens[doc_id] = counts
+                self._doc_len[doc_id] = sum(counts.values())
+                self._doc_scope[doc_id] = (
+                    metadata.get("type"), metadata.get("session_id"), metadata.get("user_id")
+                )
+                self._total_len += self._doc_len[doc_id]
+                for token, tf in counts.items():
+                    self._postings.setdefault(token, {})[doc_id] = tf
+
+    def remove(self, ids: List[str]) -> None:
+        """删除文档"""
+        with self._lock:
+            for doc_id in ids:
+                self._remove_locked(doc_id)
+
+    def clear(self) -> None:
+        """清空索引"""
+        with self._lock:
+            self._postings.clear()
+            self._doc_tokens.clear()
+            self._doc_len.clear()
+            self._doc_scope.clear()
+            self._total_len = 0
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        memory_type: Optional[str] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        BM25 检索
+
+        Returns:
+            按得分降序排列的 (ID, BM25 得分) 列表，最多 k 条
+        """
+        query_tokens = set(tokenize(query))
+        with self._lock:
+            total_docs = len(self._doc_len)
+            if not query_tokens or total_docs == 0:
+                return []
+            avg_len = self._total_len / total_docs or 1.0
+            scores: Dict[str, float] = {}
+            for token in query_tokens:
+                posting = self._postings.get(token)
+                if not posting:
+                    continue
+                idf = math.log(1 + (total_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    doc_type, doc_session, doc_user = self._doc_scope[doc_id]
+                    if memory_type and doc_type != memory_type:
+                        continue
+                    if user_id:
+                        if doc_user != user_id:
+                            continue
+                    elif session_id and doc_session != session_id:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
@@ -14,19 +14,20 @@ import json
 import asyncio
 import argparse
 import threading
-from typing import Optional, List, AsyncGenerator
+from typing import Optional, List, AsyncGenerator, Literal
 from contextlib import asynccontextmanager
-from concurrent.futures import ThreadPoolExecutor
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel, Field
 import uvicorn
 
 from chatbot import ChatbotWithMemory
 from langgraph_agent import LangGraphAgent
 from tools import FileHandler
+from worker_pool import AgentWorkerPool, StreamBridge, WorkerPoolFullError
+import embedding_registry
 
 
 # 配置: 选择使用哪个 agent (默认使用LangGraph)
@@ -36,12 +37,34 @@ USE_LANGGRAPH = os.getenv("USE_LANGGRAPH", "true").lower() == "true"
 chatbot: Optional[ChatbotWithMemory] = None
 langgraph_agent: Optional[LangGraphAgent] = None
 file_handler: Optional[FileHandler] = None
+worker_pool: Optional[AgentWorkerPool] = None
+stream_bridge: Optional[StreamBridge] = None
+
+# LangGraph Agent 的构造参数（混合模式下由命令行参数覆盖）
+AGENT_OPTIONS = {"memory_dir": "./chat_memory_db", "workspace_dir": "./workspace"}
+# lifespan 完成 Agent 初始化后置位（混合模式的 STDIO 交互等待它，复用同一个 Agent）
+agent_initialized = threading.Event()
+
+
+def _warmup_embeddings():
+    """后台预热嵌入模型（加载 + 一次编码），完成后 /health 报告就绪"""
+    try:
+        embedding_registry.warmup()
+    except Exception as e:
+        print(f"❌ 嵌入模型预热失败: {e}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    global chatbot, langgraph_agent, file_handler
+    global chatbot, langgraph_agent, file_handler, worker_pool, stream_bridge
+    
+    # 初始化 Agent 工作池（同步调用在线程池中执行，不阻塞事件循环）
+    worker_pool = AgentWorkerPool()
+    print(f"✅ Agent 工作池初始化完成，并发上限: {worker_pool.max_workers}")
+    
+    # 初始化流式桥接（所有流中的同步 TOT 推理共享一个有界线程池）
+    stream_bridge = StreamBridge()
     
     # 初始化文件处理器
     file_handler = FileHandler(workspace_dir="./workspace")
@@ -50,11 +73,24 @@ async def lifespan(app: FastAPI):
     if USE_LANGGRAPH:
         print("正在初始化 LangGraph Agent...")
         try:
+            # 异步接口中的阻塞操作（检索、搜索、TOT）在工作池的有界线程池中执行，受 AGENT_MAX_WORKERS 限制
             langgraph_agent = LangGraphAgent(
-                memory_dir="./chat_memory_db",
-                workspace_dir="./workspace"
+                **AGENT_OPTIONS,
+                stream_bridge=stream_bridge,
+                executor=worker_pool.executor
             )
             print("✅ LangGraph Agent 初始化完成")
+            
+            # 后台记忆压缩（0 表示关闭）
+            compact_interval = float(os.getenv("MEMORY_COMPACT_INTERVAL", "0"))
+            if compact_interval > 0:
+                langgraph_agent.memory_compactor.start(compact_interval)
+                print(f"✅ 记忆压缩任务已启动，间隔 {compact_interval} 秒")
+            
+            # 后台保留策略清理（同时写回检索命中统计，0 表示关闭）
+            retention_interval = float(os.getenv("MEMORY_RETENTION_INTERVAL", "300"))
+            if retention_interval > 0:
+                langgraph_agent.retention_sweeper.start(retention_interval)
         except Exception as e:
             print(f"❌ 初始化失败: {e}")
             raise
@@ -71,9 +107,18 @@ async def lifespan(app: FastAPI):
             print(f"❌ 初始化失败: {e}")
             raise
     
+    # 嵌入模型延迟加载：在后台预热，不阻塞服务启动，预热完成前 /health 返回 503
+    threading.Thread(target=_warmup_embeddings, name="embedding-warmup", daemon=True).start()
+    agent_initialized.set()
+    
     yield
     
     print("正在关闭 Agent...")
+    if langgraph_agent is not None:
+        # 落盘尚未写入的记忆
+        langgraph_agent.close()
+    worker_pool.shutdown(wait=False)
+    stream_bridge.shutdown(wait=False)
 
 
 # 创建 FastAPI 应用
@@ -97,11 +142,20 @@ app.add_middleware(
 # 请求/响应模型
 class ChatRequest(BaseModel):
     message: str = Field(..., description="用户消息")
-    session_id: str = Field(default="default", description="会话ID")
+    session_id: str = Field(default="default", description="会话ID（记忆按会话隔离，default 表示全局）")
+    user_id: Optional[str] = Field(default=None, description="用户ID（指定时检索该用户所有会话的记忆）")
     enable_web_search: bool = Field(default=False, description="是否启用联网搜索")
     deep_think: bool = Field(default=False, description="是否启用深度思考(TOT)")
     thought_branches: int = Field(default=5, description="思考分支数量")
     thought_depth: int = Field(default=3, description="思考深度")
+    score_strategy: Literal["single", "batch"] = Field(
+        default="single",
+        description="TOT打分策略: single(逐个思路打分) / batch(每个节点的思路一次批量打分)"
+    )
+    use_cache: bool = Field(
+        default=False,
+        description="是否使用语义响应缓存（相近问题复用之前的回答；联网搜索、文件操作、计算和深度思考不使用）"
+    )
 
 
 class ChatResponse(BaseModel):
@@ -110,6 +164,7 @@ class ChatResponse(BaseModel):
     thinking_process: str = Field(default="", description="TOT思考过程")
     tot_score: float = Field(default=0.0, description="TOT最佳得分")
     deep_think: bool = Field(default=False, description="是否使用了深度思考")
+    cached: bool = Field(default=False, description="回答是否来自语义响应缓存")
 
 
 class MemoryStatsResponse(BaseModel):
@@ -117,6 +172,24 @@ class MemoryStatsResponse(BaseModel):
     short_term_messages: int = Field(..., description="短时记忆消息数量")
 
 
+class MemoryItem(BaseModel):
+    id: str = Field(..., description="记忆ID")
+    content: str = Field(..., description="记忆内容")
+    metadata: dict = Field(default_factory=dict, description="记忆元数据")
+
+
+class MemoryPageResponse(BaseModel):
+    items: List[MemoryItem] = Field(default_factory=list, description="当前页的记忆（按时间倒序）")
+    total: int = Field(..., description="记忆总数")
+    page: int = Field(..., description="页码（从 1 开始）")
+    page_size: int = Field(..., description="每页数量")
+    has_more: bool = Field(..., description="是否还有下一页")
+
+
+class CompactRequest(BaseModel):
+    dry_run: bool = Field(default=True, description="只返回压缩计划，不修改记忆库")
+
+
 class SummarizeRequest(BaseModel):
     text: str = Field(..., description="需要总结的文本")
     max_length: Optional[int] = Field(15, description="总结的最大长度（字数）")
@@ -151,8 +224,51 @@ class SuccessResponse(BaseModel):
 # API 路由
 @app.get("/health")
 async def health_check():
-    """健康检查"""
-    return {"status": "healthy", "service": "chatbot-agent"}
+    """
+    健康检查
+    
+    Agent 初始化完成且嵌入模型预热完成后才报告就绪，预热期间返回 503
+    """
+    ready = (langgraph_agent or chatbot) is not None and embedding_registry.is_ready()
+    body = {
+        "status": "healthy" if ready else "warming",
+        "service": "chatbot-agent",
+        "ready": ready,
+        "embedding_models": embedding_registry.get_status()
+    }
+    if not ready:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+
+@app.get("/api/metrics/workers")
+async def get_worker_metrics():
+    """
+    获取 Agent 工作池统计信息（各接口的排队深度、等待时间等）
+    """
+    if worker_pool is None:
+        raise HTTPException(status_code=503, detail="Worker pool not initialized")
+    return worker_pool.get_metrics()
+
+
+@app.get("/api/metrics/intent")
+async def get_intent_metrics():
+    """
+    获取意图路由统计（规则 / 向量 / LLM 各层级做出的判断数量）
+    """
+    if langgraph_agent is None:
+        raise HTTPException(status_code=503, detail="LangGraph Agent not initialized")
+    return langgraph_agent.get_intent_stats()
+
+
+@app.get("/api/metrics/response-cache")
+async def get_response_cache_metrics():
+    """
+    获取语义响应缓存统计（条目数、命中率）
+    """
+    if langgraph_agent is None:
+        raise HTTPException(status_code=503, detail="LangGraph Agent not initialized")
+    return langgraph_agent.get_response_cache_stats()
 
 
 @app.post("/api/chat", response_model=ChatResponse)
@@ -173,18 +289,29 @@ async def chat(request: ChatRequest):
         try:
             # 如果启用联网搜索，使用带搜索的方法
             if request.enable_web_search:
-                result = langgraph_agent.chat_with_search(
+                result = await worker_pool.run_async(
+                    "chat",
+                    langgraph_agent.achat_with_search,
                     request.message,
                     deep_think=request.deep_think,
                     max_branches=request.thought_branches,
-                    max_depth=request.thought_depth
+                    max_depth=request.thought_depth,
+                    score_strategy=request.score_strategy,
+                    session_id=request.session_id,
+                    user_id=request.user_id
                 )
             else:
-                result = langgraph_agent.chat(
+                result = await worker_pool.run_async(
+                    "chat",
+                    langgraph_agent.achat,
                     request.message,
                     deep_think=request.deep_think,
                     max_branches=request.thought_branches,
-                    max_depth=request.thought_depth
+                    max_depth=request.thought_depth,
+                    score_strategy=request.score_strategy,
+                    session_id=request.session_id,
+                    user_id=request.user_id,
+                    use_cache=request.use_cache
                 )
             
             # result 现在是 dict，包含 response, thinking_process, tot_score, deep_think
@@ -193,8 +320,11 @@ async def chat(request: ChatRequest):
                 session_id=request.session_id,
                 thinking_process=result.get("thinking_process", ""),
                 tot_score=result.get("tot_score", 0.0),
-                deep_think=result.get("deep_think", False)
+                deep_think=result.get("deep_think", False),
+                cached=result.get("cached", False)
             )
+        except WorkerPoolFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
     else:
@@ -202,7 +332,7 @@ async def chat(request: ChatRequest):
             raise HTTPException(status_code=503, detail="Chatbot not initialized")
         
         try:
-            response = chatbot.chat(request.message)
+            response = await worker_pool.run("chat", chatbot.chat, request.message)
             return ChatResponse(
                 response=response,
                 session_id=request.session_id,
@@ -210,6 +340,8 @@ async def chat(request: ChatRequest):
                 tot_score=0.0,
                 deep_think=False
             )
+        except WorkerPoolFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
@@ -217,7 +349,8 @@ async def chat(request: ChatRequest):
 async def generate_sse_events(request: ChatRequest) -> AsyncGenerator[str, None]:
     """
     生成 SSE 事件流
-    使用线程池执行同步生成器，避免阻塞事件循环
+    使用 Agent 的原生异步流（astream），不占用线程等待 LLM；
+    客户端断开时异步生成器被关闭，底层 LLM 流随之停止，不再继续消耗 token
     """
     global langgraph_agent
     
@@ -228,57 +361,32 @@ async def generate_sse_events(request: ChatRequest) -> AsyncGenerator[str, None]
     try:
         # 选择流式方法
         if request.enable_web_search:
-            stream_func = lambda: langgraph_agent.chat_with_search_stream(
+            stream = langgraph_agent.astream_with_search(
                 request.message,
                 deep_think=request.deep_think,
                 max_branches=request.thought_branches,
-                max_depth=request.thought_depth
+                max_depth=request.thought_depth,
+                score_strategy=request.score_strategy,
+                session_id=request.session_id,
+                user_id=request.user_id
             )
         else:
-            stream_func = lambda: langgraph_agent.chat_stream(
+            stream = langgraph_agent.astream(
                 request.message,
                 deep_think=request.deep_think,
                 max_branches=request.thought_branches,
-                max_depth=request.thought_depth
+                max_depth=request.thought_depth,
+                score_strategy=request.score_strategy,
+                session_id=request.session_id,
+                user_id=request.user_id,
+                use_cache=request.use_cache
             )
         
-        # 使用队列来传递事件
-        import queue
-        event_queue = queue.Queue()
-        stream_done = threading.Event()
-        
-        def run_stream():
-            try:
-                for event in stream_func():
-                    event_queue.put(event)
-                event_queue.put(None)  # 结束信号
-            except Exception as e:
-                event_queue.put({'type': 'error', 'content': str(e)})
-                event_queue.put(None)
-            finally:
-                stream_done.set()
-        
-        # 在线程池中运行同步生成器
-        loop = asyncio.get_event_loop()
-        executor = ThreadPoolExecutor(max_workers=1)
-        loop.run_in_executor(executor, run_stream)
+        async for event in stream:
+            event_data = json.dumps(event, ensure_ascii=False)
+            yield f"data: {event_data}\n\n"
         
-        # 异步读取队列 - 使用更短的轮询间隔实现实时输出
-        while True:
-            try:
-                # 使用阻塞式获取，超时10ms，实现近实时输出
-                event = event_queue.get(timeout=0.01)
-                if event is None:
-                    yield f"data: {json.dumps({'type': 'done'})}\n\n"
-                    return
-                event_data = json.dumps(event, ensure_ascii=False)
-                yield f"data: {event_data}\n\n"
-            except queue.Empty:
-                # 检查流是否已完成
-                if stream_done.is_set() and event_queue.empty():
-                    yield f"data: {json.dumps({'type': 'done'})}\n\n"
-                    return
-                await asyncio.sleep(0.005)  # 5ms 轮询，更流畅
+        yield f"data: {json.dumps({'type': 'done'})}\n\n"
         
     except Exception as e:
         error_event = json.dumps({'type': 'error', 'content': str(e)}, ensure_ascii=False)
@@ -341,6 +449,58 @@ async def get_stats():
             raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/memory/recent", response_model=MemoryPageResponse)
+async def get_recent_memories(
+    page: int = Query(1, ge=1, description="页码"),
+    page_size: int = Query(20, ge=1, le=200, description="每页数量"),
+    memory_type: Optional[str] = Query(None, description="记忆类型: conversation / fact"),
+    session_id: Optional[str] = Query(None, description="会话ID"),
+    user_id: Optional[str] = Query(None, description="用户ID")
+):
+    """
+    分页浏览记忆（按时间倒序）
+    """
+    global chatbot, langgraph_agent
+    
+    agent = langgraph_agent if USE_LANGGRAPH else chatbot
+    if agent is None:
+        raise HTTPException(status_code=503, detail="Agent not initialized")
+    
+    try:
+        result = await worker_pool.run(
+            "memory-recent",
+            agent.get_memory_page,
+            page,
+            page_size,
+            memory_type,
+            session_id,
+            user_id
+        )
+        return MemoryPageResponse(**result)
+    except WorkerPoolFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/memory/compact")
+async def compact_memory(request: CompactRequest):
+    """
+    压缩久远的相似对话记忆（聚类 → 总结 → 删除原始记忆）
+    """
+    global langgraph_agent
+    
+    if langgraph_agent is None:
+        raise HTTPException(status_code=503, detail="LangGraph Agent not initialized")
+    
+    try:
+        return await worker_pool.run("memory-compact", langgraph_agent.compact_memories, request.dry_run)
+    except WorkerPoolFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/api/memory/clear-short-term", response_model=SuccessResponse)
 async def clear_short_term_memory():
     """
@@ -359,28 +519,31 @@ async def clear_short_term_memory():
 
 
 @app.post("/api/memory/clear-all", response_model=SuccessResponse)
-async def clear_all_memory():
+async def clear_all_memory(
+    session_id: Optional[str] = Query(None, description="只清除该会话的记忆"),
+    user_id: Optional[str] = Query(None, description="只清除该用户的记忆")
+):
     """
     清除所有记忆
+    
+    不带参数时删除并重建整个记忆集合；指定 session_id / user_id 时只清除该命名空间
     """
     global chatbot, langgraph_agent
     
-    if USE_LANGGRAPH:
-        if langgraph_agent is None:
-            raise HTTPException(status_code=503, detail="LangGraph Agent not initialized")
-        try:
-            langgraph_agent.clear_all_memory()
-            return SuccessResponse(success=True, message="All memory cleared")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
-    else:
-        if chatbot is None:
-            raise HTTPException(status_code=503, detail="Chatbot not initialized")
-        try:
-            chatbot.clear_all_memory()
-            return SuccessResponse(success=True, message="All memory cleared")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    agent = langgraph_agent if USE_LANGGRAPH else chatbot
+    if agent is None:
+        raise HTTPException(status_code=503, detail="Agent not initialized")
+    
+    try:
+        cleared = await worker_pool.run("memory-clear", agent.clear_all_memory, session_id, user_id)
+    except WorkerPoolFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not cleared:
+        raise HTTPException(status_code=500, detail="Failed to clear memory")
+    scope = user_id or session_id
+    return SuccessResponse(success=True, message=f"Memory cleared for {scope}" if scope else "All memory cleared")
 
 
 @app.post("/api/summarize", response_model=SummarizeResponse)
@@ -396,16 +559,20 @@ async def summarize_text(request: SummarizeRequest):
         if langgraph_agent is None:
             raise HTTPException(status_code=503, detail="LangGraph Agent not initialized")
         try:
-            summary = langgraph_agent.summarize(request.text, request.max_length)
+            summary = await worker_pool.run_async("summarize", langgraph_agent.asummarize, request.text, request.max_length)
             return SummarizeResponse(summary=summary)
+        except WorkerPoolFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
     else:
         if chatbot is None:
             raise HTTPException(status_code=503, detail="Chatbot not initialized")
         try:
-            summary = chatbot.summarize(request.text, request.max_length)
+            summary = await worker_pool.run("summarize", chatbot.summarize, request.text, request.max_length)
             return SummarizeResponse(summary=summary)
+        except WorkerPoolFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
@@ -423,16 +590,20 @@ async def extract_information(request: ExtractRequest):
         if langgraph_agent is None:
             raise HTTPException(status_code=503, detail="LangGraph Agent not initialized")
         try:
-            extracted = langgraph_agent.extract_information(request.text)
+            extracted = await worker_pool.run_async("extract", langgraph_agent.aextract_information, request.text)
             return ExtractResponse(extracted_info=extracted)
+        except WorkerPoolFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
     else:
         if chatbot is None:
             raise HTTPException(status_code=503, detail="Chatbot not initialized")
         try:
-            extracted = chatbot.extract_information(request.text)
+            extracted = await worker_pool.run("extract", chatbot.extract_information, request.text)
             return ExtractResponse(extracted_info=extracted)
+        except WorkerPoolFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
@@ -450,16 +621,24 @@ async def translate_text(request: TranslateRequest):
         if langgraph_agent is None:
             raise HTTPException(status_code=503, detail="LangGraph Agent not initialized")
         try:
-            translated = langgraph_agent.translate(request.text, request.target_language)
+            translated = await worker_pool.run_async(
+                "translate", langgraph_agent.atranslate, request.text, request.target_language
+            )
             return TranslateResponse(translated_text=translated)
+        except WorkerPoolFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
     else:
         if chatbot is None:
             raise HTTPException(status_code=503, detail="Chatbot not initialized")
         try:
-            translated = chatbot.translate(request.text, request.target_language)
+            translated = await worker_pool.run(
+                "translate", chatbot.translate, request.text, request.target_language
+            )
             return TranslateResponse(translated_text=translated)
+        except WorkerPoolFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
@@ -547,8 +726,13 @@ async def analyze_file(request: FileAnalyzeRequest):
         file_content = file_result["content"]
         file_type = file_result.get("file_type", "unknown")
         
-        # 构建分析提示
-        analysis_prompt = f"""用户上传了一个文件，请根据文件内容回答用户的问题。
+        # 使用AI分析（LangGraph Agent 按文件 token 预算截断文件内容）
+        if USE_LANGGRAPH and langgraph_agent:
+            analysis = await worker_pool.run_async(
+                "analyze-file", langgraph_agent.aanalyze_file, file_content, file_type, request.question
+            )
+        elif chatbot:
+            analysis_prompt = f"""用户上传了一个文件，请根据文件内容回答用户的问题。
 
 文件类型: {file_type}
 文件内容:
@@ -557,12 +741,7 @@ async def analyze_file(request: FileAnalyzeRequest):
 用户问题: {request.question}
 
 请提供详细的分析和回答。"""
-        
-        # 使用AI分析
-        if USE_LANGGRAPH and langgraph_agent:
-            analysis = langgraph_agent.chat(analysis_prompt)
-        elif chatbot:
-            analysis = chatbot.chat(analysis_prompt)
+            analysis = await worker_pool.run("analyze-file", chatbot.chat, analysis_prompt)
         else:
             raise HTTPException(status_code=503, detail="No agent available")
         
@@ -572,6 +751,8 @@ async def analyze_file(request: FileAnalyzeRequest):
             file_type=file_type
         )
         
+    except WorkerPoolFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -626,6 +807,8 @@ def run_stdio_mode(args):
             reply = f"error: {exc}"
         sys.stdout.write(reply + "\n")
         sys.stdout.flush()
+    
+    agent.close()
 
 
 def run_hybrid_mode(args):
@@ -634,17 +817,23 @@ def run_hybrid_mode(args):
     - HTTP API 在后台线程运行，供 Java 后端调用
     - STDIO 在主线程运行，可以直接命令行交互
     """
-    import threading
-    import time
-    
     print("🚀 启动混合模式 (HTTP API + STDIO)...")
     print(f"   HTTP API: http://localhost:{args.port}")
     print(f"   深度思考: {'开启' if args.deep else '关闭'}")
     
-    # 在后台线程启动 HTTP 服务
+    # STDIO 与 HTTP API 共用 lifespan 中创建的 Agent（只加载一次嵌入模型和记忆库）
+    AGENT_OPTIONS.update(
+        model=args.model,
+        memory_dir=args.memory,
+        workspace_dir=args.workspace,
+        default_branches=args.branches,
+        default_depth=args.depth,
+    )
+    
+    # 在后台线程启动 HTTP 服务（直接传入 app 对象，lifespan 写入的就是本模块的全局变量）
     def start_api():
         uvicorn.run(
-            "main:app",
+            app,
             host="0.0.0.0",
             port=args.port,
             reload=False,  # 混合模式下不能用 reload
@@ -654,20 +843,17 @@ def run_hybrid_mode(args):
     api_thread = threading.Thread(target=start_api, daemon=True)
     api_thread.start()
     
-    # 等待 API 启动
-    time.sleep(3)
+    # 等待 lifespan 完成 Agent 初始化
+    while not agent_initialized.wait(0.5):
+        if not api_thread.is_alive():
+            print("❌ HTTP API 启动失败")
+            return
     print(f"\n✅ HTTP API 已在后台运行 (端口 {args.port})")
     print("💬 STDIO 交互已就绪，输入消息后回车发送，输入 'quit' 退出\n")
     
-    # 使用全局的 langgraph_agent（由 FastAPI lifespan 初始化）
-    # 但这里需要单独创建一个，因为 lifespan 在另一个线程
-    agent = LangGraphAgent(
-        model=args.model,
-        memory_dir=args.memory,
-        workspace_dir=args.workspace,
-        default_branches=args.branches,
-        default_depth=args.depth,
-    )
+    # 使用全局的 langgraph_agent（由 FastAPI lifespan 初始化）；
+    # USE_LANGGRAPH 关闭时 lifespan 创建的是 Chatbot，此时单独创建一个（嵌入模型仍通过注册表共享）
+    agent = langgraph_agent or LangGraphAgent(**AGENT_OPTIONS)
     
     # STDIO 交互循环
     try:
@@ -695,6 +881,9 @@ def run_hybrid_mode(args):
                 print(f"Error: {exc}\n")
     except KeyboardInterrupt:
         print("\nGoodbye!")
+    finally:
+        # HTTP 服务在守护线程中，进程退出时不会执行 lifespan 的关闭流程，这里落盘记忆
+        agent.close()
 
 
 def run_api_mode(port: int):
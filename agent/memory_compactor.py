@@ -0,0 +1,324 @@
+"""
+记忆压缩
+定期把久远、内容相近的对话记忆聚类，用 LLM 总结为一条 summary 记忆，
+再分批删除原始记忆，使记忆库规模和检索延迟长期保持有界。
+"""
+
+import time
+import uuid
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+
+from memory_store import MemoryStore
+
+
+@dataclass
+class CompactionReport:
+    """一次压缩的结果（dry_run 时只包含计划，不做任何修改）"""
+    dry_run: bool
+    scanned: int = 0                  # 扫描的旧对话记忆数量
+    clusters: List[Dict] = field(default_factory=list)  # 每个聚类: ids / size / session_id / user_id / preview
+    summarized: int = 0               # 写入的摘要记忆数量
+    deleted: int = 0                  # 删除的原始记忆数量
+    purged_tombstones: int = 0        # 清理的上次中断遗留的墓碑记忆
+    errors: List[str] = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "dry_run": self.dry_run,
+            "scanned": self.scanned,
+            "cluster_count": len(self.clusters),
+            "memories_in_clusters": sum(cluster["size"] for cluster in self.clusters),
+            "clusters": self.clusters,
+            "summarized": self.summarized,
+            "deleted": self.deleted,
+            "purged_tombstones": self.purged_tombstones,
+            "errors": self.errors,
+            "elapsed_seconds": self.elapsed_seconds
+        }
+
+
+class MemoryCompactor:
+    """
+    对话记忆压缩任务
+
+    流程（每次 run）：
+    1. 清理上次中断遗留的墓碑记忆：摘要已写入的删除，摘要未写入的恢复为普通记忆
+    2. 通过时间索引从上次的扫描游标处接着取出早于 min_age_days 的对话记忆（最多 max_scan 条），
+       按 (user_id, session_id) 分组，组内用余弦相似度矩阵贪心聚类；处理完的分组推进游标，
+       扫描到末尾后游标归零。不成簇的旧记忆不会每次都占满扫描窗口，所有用户和会话轮流被压缩
+    3. 每个聚类（至少 min_cluster_size 条）用 LLM 总结，原始记忆先标记墓碑
+       （tombstoned=True, tombstone=预先生成的摘要ID），再写入该ID的 summary 记忆，
+       最后按 delete_batch_size 分批删除原始记忆；任一步骤中断都不会重复摘要或丢失记忆
+
+    节流：每个聚类、每批删除之间休眠 pause_seconds，每次最多处理 max_clusters 个聚类，
+    可以在线上节点后台运行。
+    """
+
+    # 扫描游标在时间索引中的名称
+    CURSOR_NAME = "memory_compactor"
+
+    def __init__(
+        self,
+        memory_store: MemoryStore,
+        llm,
+        min_age_days: float = 7.0,
+        similarity_threshold: float = 0.75,
+        min_cluster_size: int = 3,
+        max_cluster_size: int = 20,
+        max_scan: int = 2000,
+        max_clusters: int = 50,
+        delete_batch_size: int = 50,
+        pause_seconds: float = 0.2
+    ):
+        """
+        初始化记忆压缩任务
+
+        Args:
+            memory_store: 记忆存储
+            llm: 用于总结的聊天模型
+            min_age_days: 只压缩早于该天数的对话记忆
+            similarity_threshold: 聚类的余弦相似度阈值
+            min_cluster_size: 聚类的最少记忆数（更小的聚类不压缩）
+            max_cluster_size: 聚类的最多记忆数
+            max_scan: 每次最多扫描的旧记忆数量（下次从游标处继续）
+            max_clusters: 每次最多压缩的聚类数量
+            delete_batch_size: 每批删除的记忆数量
+            pause_seconds: 聚类之间、删除批次之间的休眠时间（节流）
+        """
+        self.memory_store = memory_store
+        self.min_age_days = min_age_days
+        self.similarity_threshold = similarity_threshold
+        self.min_cluster_size = max(2, min_cluster_size)
+        self.max_cluster_size = max(self.min_cluster_size, max_cluster_size)
+        self.max_scan = max_scan
+        self.max_clusters = max_clusters
+        self.delete_batch_size = max(1, delete_batch_size)
+        self.pause_seconds = max(0.0, pause_seconds)
+
+        self._summary_chain = ChatPromptTemplate.from_messages([
+            ("system",
+             "你是记忆整理助手。下面是同一用户在不同时间的多段相似对话记录，"
+             "请合并为一条简洁的中文长期记忆：保留用户的事实信息、偏好和结论，去掉寒暄和重复内容。"
+             "只输出整理后的记忆内容。"),
+            ("human", "{memories}")
+        ]) | llm | StrOutputParser()
+
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_report: Optional[CompactionReport] = None
+
+    def _cluster(self, memories: List[Dict]) -> List[List[int]]:
+        """组内贪心聚类：按时间顺序取未分配的记忆为中心，吸收相似度超过阈值的记忆"""
+        vectors = np.asarray([memory["embedding"] for memory in memories], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        similar = vectors @ vectors.T >= self.similarity_threshold
+
+        unassigned = np.ones(len(memories), dtype=bool)
+        clusters = []
+        for center in range(len(memories)):
+            if not unassigned[center]:
+                continue
+            members = np.flatnonzero(similar[center] & unassigned)[:self.max_cluster_size]
+            if len(members) >= self.min_cluster_size:
+                clusters.append(members.tolist())
+                unassigned[members] = False
+        return clusters
+
+    def plan(self) -> CompactionReport:
+        """只生成压缩计划（dry-run），不修改记忆库"""
+        return self.run(dry_run=True)
+
+    def _purge_tombstones(self, report: CompactionReport) -> None:
+        """
+        处理上次中断遗留的墓碑记忆
+
+        墓碑用正向的 tombstoned=True 标记（$ne 对缺少该键的记录的处理在不同 Chroma 版本间不一致）。
+        对应摘要已写入的原始记忆直接删除；摘要未写入的恢复为普通记忆，下次重新参与压缩。
+        """
+        collection = self.memory_store.vectorstore._collection
+        tombstoned = collection.get(
+            where={"tombstoned": True}, limit=self.max_scan, include=["documents", "metadatas"]
+        )
+        ids = tombstoned.get("ids") or []
+        report.purged_tombstones = len(ids)
+        if not ids or report.dry_run:
+            return
+
+        metadatas = [metadata or {} for metadata in tombstoned.get("metadatas") or [{}] * len(ids)]
+        summary_ids = list({metadata.get("tombstone") for metadata in metadatas if metadata.get("tombstone")})
+        written = set(collection.get(ids=summary_ids, include=[]).get("ids") or []) if summary_ids else set()
+
+        purge = [memory_id for memory_id, metadata in zip(ids, metadatas) if metadata.get("tombstone") in written]
+        restore = [
+            (memory_id, metadata) for memory_id, metadata in zip(ids, metadatas)
+            if metadata.get("tombstone") not in written
+        ]
+        if restore:
+            documents = dict(zip(ids, tombstoned.get("documents") or [""] * len(ids)))
+            restore_ids = [memory_id for memory_id, _ in restore]
+            restored = [{**metadata, "tombstoned": False, "tombstone": ""} for _, metadata in restore]
+            collection.update(ids=restore_ids, metadatas=restored)
+            self.memory_store.lexical_index.add(
+                restore_ids, [documents[memory_id] or "" for memory_id in restore_ids], restored
+            )
+        if purge:
+            self._delete(purge)
+        report.purged_tombstones = len(purge)
+
+    def _delete(self, ids: List[str]) -> int:
+        """分批删除，批次之间休眠"""
+        for start in range(0, len(ids), self.delete_batch_size):
+            self.memory_store.delete_memories(ids[start:start + self.delete_batch_size])
+            if self.pause_seconds and start + self.delete_batch_size < len(ids):
+                time.sleep(self.pause_seconds)
+        return len(ids)
+
+    def _compact_cluster(self, cluster: List[Dict], session_id: Optional[str], user_id: Optional[str]) -> int:
+        """总结一个聚类 → 原始记忆标记墓碑 → 写入摘要 → 分批删除"""
+        lines = [f"[{m['metadata'].get('timestamp', '')}] {m['content']}" for m in cluster]
+        summary = self._summary_chain.invoke({"memories": "\n\n".join(lines)}).strip()
+        if not summary:
+            raise ValueError("LLM 返回了空摘要")
+
+        ids = [m["id"] for m in cluster]
+        latest = max(m["metadata"].get("timestamp", "") for m in cluster) or None
+        # 先标记墓碑再写摘要：中断后下次运行按摘要是否存在决定删除还是恢复，
+        # 不会出现摘要与未标记的原始记忆并存、被重复摘要的情况
+        summary_id = str(uuid.uuid4())
+        self.memory_store.vectorstore._collection.update(
+            ids=ids,
+            metadatas=[{**m["metadata"], "tombstoned": True, "tombstone": summary_id} for m in cluster]
+        )
+        # 墓碑记忆不再参与检索（向量检索结果由 search_memories 过滤）
+        self.memory_store.lexical_index.remove(ids)
+        self.memory_store.add_summary(summary, ids, latest, session_id, user_id, memory_id=summary_id)
+        return self._delete(ids)
+
+    def _compact_group(
+        self,
+        rows: List[tuple],
+        session_id: Optional[str],
+        user_id: Optional[str],
+        report: CompactionReport
+    ) -> bool:
+        """
+        聚类并压缩一个 (user_id, session_id) 分组
+
+        Returns:
+            是否处理完整个分组（达到 max_clusters 或被停止时为 False，游标不越过该分组）
+        """
+        if len(report.clusters) >= self.max_clusters or self._stop.is_set():
+            return False
+        ids = [row[0] for row in rows]
+        if len(ids) < self.min_cluster_size:
+            return True
+        memories = [
+            memory for memory in self.memory_store.get_memories_by_ids(ids, include_embeddings=True)
+            if not memory["metadata"].get("tombstoned")
+        ]
+        memories.sort(key=lambda m: m["metadata"].get("timestamp", ""))
+        if len(memories) < self.min_cluster_size:
+            return True
+
+        for indices in self._cluster(memories):
+            if len(report.clusters) >= self.max_clusters or self._stop.is_set():
+                return False
+            cluster = [memories[i] for i in indices]
+            report.clusters.append({
+                "ids": [m["id"] for m in cluster],
+                "size": len(cluster),
+                "session_id": session_id,
+                "user_id": user_id,
+                "preview": cluster[0]["content"][:80]
+            })
+            if report.dry_run:
+                continue
+            try:
+                report.deleted += self._compact_cluster(cluster, session_id, user_id)
+                report.summarized += 1
+            except Exception as e:
+                report.errors.append(f"{cluster[0]['id']}: {e}")
+            if self.pause_seconds:
+                time.sleep(self.pause_seconds)
+        return True
+
+    def run(self, dry_run: bool = False) -> CompactionReport:
+        """
+        执行一次压缩
+
+        Args:
+            dry_run: 为 True 时只返回计划（聚类情况），不写入摘要也不删除
+
+        Returns:
+            CompactionReport
+        """
+        report = CompactionReport(dry_run=dry_run)
+        started = time.monotonic()
+        with self._run_lock:
+            try:
+                self._purge_tombstones(report)
+                # 升级前已有的记忆可能不在时间索引中，扫描前先补全
+                self.memory_store._ensure_index()
+
+                index = self.memory_store.recency_index
+                cursor = index.get_cursor(self.CURSOR_NAME)
+                cutoff = (datetime.now() - timedelta(days=self.min_age_days)).isoformat()
+                rows = index.older_than(cutoff, "conversation", self.max_scan, after=cursor)
+                report.scanned = len(rows)
+
+                groups = [(key, list(group)) for key, group in groupby(rows, key=lambda row: (row[3], row[2]))]
+                # 扫描窗口已满时最后一组可能被截断，留到下次从它开头扫描（只有一组时照常处理）
+                if len(rows) >= self.max_scan and len(groups) > 1:
+                    groups.pop()
+
+                completed = True
+                for (user_id, session_id), group in groups:
+                    if not self._compact_group(group, session_id, user_id, report):
+                        completed = False
+                        break
+                    cursor = index.cursor_for(group[-1])
+                if completed and len(rows) < self.max_scan:
+                    # 已扫描到末尾：下次从头开始，期间变旧的记忆会被重新扫描到
+                    cursor = None
+                if not dry_run:
+                    index.set_cursor(self.CURSOR_NAME, cursor)
+            except Exception as e:
+                report.errors.append(str(e))
+
+        report.elapsed_seconds = round(time.monotonic() - started, 3)
+        self.last_report = report
+        print(
+            f"🗜️ 记忆压缩{'（预演）' if dry_run else ''}: 扫描 {report.scanned} 条, "
+            f"聚类 {len(report.clusters)} 个, 摘要 {report.summarized} 条, 删除 {report.deleted} 条"
+        )
+        return report
+
+    def start(self, interval_seconds: float) -> None:
+        """启动后台线程，每隔 interval_seconds 执行一次压缩"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(interval_seconds):
+                self.run()
+
+        self._thread = threading.Thread(target=loop, name="memory-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止后台压缩（正在进行的压缩会在当前聚类完成后退出）"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
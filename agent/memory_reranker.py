@@ -0,0 +1,105 @@
+"""
+记忆重排序
+对检索阶段多取的候选记忆，综合相似度、时间衰减、记忆类型权重重新打分，
+再用 MMR（最大边际相关）去掉内容相近的记忆，只把少量高质量记忆放进提示词。
+全部计算以 NumPy 数组运算完成。
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def _default_type_weights() -> Dict[str, float]:
+    return {"fact": 1.2, "summary": 1.1, "conversation": 1.0}
+
+
+@dataclass
+class MemoryReranker:
+    """
+    候选记忆重排序器
+
+    综合得分 = (relevance_weight * 余弦相似度 + recency_weight * 时间衰减) * 类型权重
+    时间衰减 = 0.5 ^ (记忆年龄天数 / half_life_days)
+    MMR 选择：每次选出 mmr_lambda * 综合得分 - (1 - mmr_lambda) * 与已选记忆的最大相似度 最高者
+    """
+    relevance_weight: float = 0.7
+    recency_weight: float = 0.3
+    half_life_days: float = 30.0
+    mmr_lambda: float = 0.7
+    min_relevance: float = 0.0   # 余弦相似度低于该值的候选直接丢弃
+    overfetch: int = 3           # 检索阶段按 n_results * overfetch 取候选
+    type_weights: Dict[str, float] = field(default_factory=_default_type_weights)
+
+    @staticmethod
+    def _ages_in_days(memories: List[Dict], now: datetime) -> np.ndarray:
+        """解析 metadata.timestamp，返回年龄（天）；无法解析时为 inf"""
+        ages = np.full(len(memories), np.inf)
+        for i, memory in enumerate(memories):
+            timestamp = (memory.get("metadata") or {}).get("timestamp")
+            if not timestamp:
+                continue
+            try:
+                ages[i] = (now - datetime.fromisoformat(timestamp)).total_seconds() / 86400
+            except (TypeError, ValueError):
+                continue
+        return np.maximum(ages, 0.0)
+
+    def rerank(
+        self,
+        query_vector: List[float],
+        memories: List[Dict],
+        vectors: List[List[float]],
+        k: int,
+        now: Optional[datetime] = None
+    ) -> List[Dict]:
+        """
+        重排序候选记忆
+
+        Args:
+            query_vector: 查询向量
+            memories: 候选记忆（search_memories 的结果格式）
+            vectors: 与 memories 一一对应的记忆向量
+            k: 最多返回的记忆数量
+            now: 计算时间衰减的当前时间（默认 datetime.now()）
+
+        Returns:
+            选中的记忆（附带 rerank_score / relevance / recency 字段），按选择顺序排列
+        """
+        if not memories or k <= 0:
+            return []
+
+        embeddings = np.asarray(vectors, dtype=np.float32)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+
+        relevance = embeddings @ query
+        recency = np.power(0.5, self._ages_in_days(memories, now or datetime.now()) / self.half_life_days)
+        type_weight = np.array([
+            self.type_weights.get((memory.get("metadata") or {}).get("type"), 1.0) for memory in memories
+        ])
+        scores = (self.relevance_weight * relevance + self.recency_weight * recency) * type_weight
+
+        candidates = relevance >= self.min_relevance
+        similarity = embeddings @ embeddings.T
+        max_similarity = np.zeros(len(memories))
+        selected: List[int] = []
+        for _ in range(min(k, int(candidates.sum()))):
+            mmr = self.mmr_lambda * scores - (1 - self.mmr_lambda) * max_similarity
+            mmr[~candidates] = -np.inf
+            best = int(np.argmax(mmr))
+            selected.append(best)
+            candidates[best] = False
+            max_similarity = np.maximum(max_similarity, similarity[best])
+
+        results = []
+        for index in selected:
+            memory = dict(memories[index])
+            memory["rerank_score"] = float(scores[index])
+            memory["relevance"] = float(relevance[index])
+            memory["recency"] = float(recency[index])
+            results.append(memory)
+        return results
@@ -0,0 +1,141 @@
+"""
+记忆保留策略
+按命名空间容量上限和按类型的最长保存时间淘汰长期记忆，
+容量淘汰按检索命中情况（LRU / LFU）选择，后台增量执行、分批删除。
+"""
+
+import os
+import time
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from memory_store import MemoryStore
+
+
+@dataclass
+class RetentionPolicy:
+    """
+    保留策略
+
+    max_per_scope: 每个用户（有 user_id 时）或会话的最大记忆数，None 表示不限制
+    max_age_days: 按记忆类型的最长保存天数，如 {"conversation": 180}
+    eviction: 超出容量时的淘汰策略，lru（最久未被检索命中）或 lfu（命中次数最少）
+    batch_size: 每次删除的最大记忆数
+    max_deletes_per_sweep: 每轮清理最多删除的记忆数（增量执行，避免长时间占用集合）
+    """
+    max_per_scope: Optional[int] = None
+    max_age_days: Dict[str, float] = field(default_factory=dict)
+    eviction: str = "lru"
+    batch_size: int = 100
+    max_deletes_per_sweep: int = 1000
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_per_scope) or bool(self.max_age_days)
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        """
+        从环境变量读取保留策略
+
+        MEMORY_MAX_PER_SCOPE=5000
+        MEMORY_MAX_AGE_DAYS=conversation:180,summary:365
+        MEMORY_EVICTION=lru
+        """
+        max_age_days = {}
+        for item in os.getenv("MEMORY_MAX_AGE_DAYS", "").split(","):
+            if ":" in item:
+                memory_type, days = item.split(":", 1)
+                max_age_days[memory_type.strip()] = float(days)
+        return cls(
+            max_per_scope=int(os.getenv("MEMORY_MAX_PER_SCOPE", "0")) or None,
+            max_age_days=max_age_days,
+            eviction=os.getenv("MEMORY_EVICTION", "lru").lower()
+        )
+
+
+class RetentionSweeper:
+    """
+    后台保留策略清理
+
+    每轮（run）：
+    1. 写回累计的检索命中统计
+    2. 删除超过类型最长保存时间的记忆
+    3. 对超出容量的命名空间，按 LRU / LFU 删除多出的记忆
+    每轮删除量不超过 max_deletes_per_sweep，每批之间休眠 pause_seconds。
+    """
+
+    def __init__(self, memory_store: MemoryStore, policy: RetentionPolicy, pause_seconds: float = 0.1):
+        self.memory_store = memory_store
+        self.policy = policy
+        self.pause_seconds = max(0.0, pause_seconds)
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _delete(self, ids, budget: int) -> int:
+        """分批删除，最多删除 budget 条"""
+        ids = ids[:budget]
+        batch_size = max(1, self.policy.batch_size)
+        for start in range(0, len(ids), batch_size):
+            self.memory_store.delete_memories(ids[start:start + batch_size], batch_size)
+            if self.pause_seconds and start + batch_size < len(ids):
+                time.sleep(self.pause_seconds)
+        return len(ids)
+
+    def run(self) -> Dict:
+        """执行一轮清理，返回各类淘汰的数量"""
+        result = {"hits_flushed": 0, "expired": 0, "evicted": 0}
+        with self._run_lock:
+            result["hits_flushed"] = self.memory_store.flush_hits()
+            if not self.policy.enabled:
+                return result
+            self.memory_store._ensure_index()
+            index = self.memory_store.recency_index
+            budget = self.policy.max_deletes_per_sweep
+
+            for memory_type, days in self.policy.max_age_days.items():
+                if budget <= 0 or self._stop.is_set():
+                    break
+                cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+                deleted = self._delete(index.expired(memory_type, cutoff, budget), budget)
+                result["expired"] += deleted
+                budget -= deleted
+
+            if self.policy.max_per_scope:
+                for column, value, excess in index.over_capacity(self.policy.max_per_scope):
+                    if budget <= 0 or self._stop.is_set():
+                        break
+                    victims = index.eviction_candidates(column, value, min(excess, budget), self.policy.eviction)
+                    deleted = self._delete(victims, budget)
+                    result["evicted"] += deleted
+                    budget -= deleted
+
+        if result["expired"] or result["evicted"]:
+            print(f"🧹 记忆保留策略: 过期删除 {result['expired']} 条, 容量淘汰 {result['evicted']} 条")
+        return result
+
+    def start(self, interval_seconds: float) -> None:
+        """启动后台线程，每隔 interval_seconds 执行一轮清理"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.run()
+                except Exception as e:
+                    print(f"记忆保留策略清理失败: {e}")
+
+        self._thread = threading.Thread(target=loop, name="memory-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止后台清理"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
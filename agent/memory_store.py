@@ -4,12 +4,28 @@
 """
 
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_core.documents import Document
+from embedding_registry import DEFAULT_EMBEDDING_MODEL, get_embedding_model, acquire_embedding_service, release_embedding_service
+from recency_index import RecencyIndex
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from memory_reranker import MemoryReranker
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, Tuple
 import json
+import gzip
 import os
+import uuid
+import threading
+
+
+# 全局作用域：session_id / user_id 为空或等于该值时不限定命名空间
+DEFAULT_SCOPE = "default"
+
+
+class SearchMode:
+    """search_memories 的检索模式"""
+    VECTOR = "vector"  # 纯向量相似度
+    HYBRID = "hybrid"  # 向量 + BM25 词法检索，倒数排名融合（RRF）
 
 
 class MemoryStore:
@@ -21,13 +37,31 @@ class MemoryStore:
     2. 使用 LangChain 封装的 ChromaDB
     3. 支持按相似度检索相关记忆
     4. 支持记忆的时间戳和元数据
+    5. 嵌入经过 EmbeddingService：查询向量缓存 + 跨请求微批处理；
+       模型和嵌入服务由 embedding_registry 在进程内共享并延迟加载
+    6. 可选的延迟写入（write-behind）：对话记忆先进入内存队列，由后台线程
+       按数量或时间批量嵌入并写入；检索前会先落盘，保证读到自己刚写的记忆
+    7. 会话/用户命名空间：记忆写入时带上 session_id、user_id 元数据，
+       检索时通过 where 过滤下推到 Chroma，只在该用户（或会话）的记忆中排序
+    8. SQLite 时间索引（recency_index.sqlite3）：最近记忆和分页浏览不再拉取整个集合
+    9. 混合检索：内存 BM25 倒排索引（中文按字符二元组切分）与向量结果做 RRF 融合，
+       提升人名、数字、日期等精确词项的召回
+    10. 可选的重排序阶段（MemoryReranker）：多取候选后按相似度、时间衰减、类型权重
+        和 MMR 多样性重新选择，减少放进提示词的记忆条数
+    11. 检索命中统计：search_memories 返回的记忆累计命中次数，批量写回元数据
+        （hit_count / last_hit_at）和时间索引，供保留策略按 LRU / LFU 淘汰
     """
     
     def __init__(
         self,
         persist_directory: str = "./chroma_db",
         collection_name: str = "chat_memory",
-        embedding_model: str = "paraphrase-multilingual-MiniLM-L12-v2"
+        embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+        write_behind: bool = False,
+        flush_batch_size: int = 32,
+        flush_interval: float = 1.0,
+        search_mode: str = SearchMode.VECTOR,
+        reranker: Optional[MemoryReranker] = None
     ):
         """
         初始化记忆存储
@@ -36,44 +70,205 @@ class MemoryStore:
             persist_directory: ChromaDB持久化目录
             collection_name: 集合名称
             embedding_model: HuggingFace 嵌入模型名称
+            write_behind: 是否启用延迟写入（queue_memory 立即返回，后台批量落盘）
+            flush_batch_size: 待写入记忆达到该数量时立即落盘
+            flush_interval: 待写入记忆最长等待时间（秒）
+            search_mode: search_memories 的默认检索模式（vector / hybrid）
+            reranker: 默认使用的重排序器（None 表示不重排序）
         """
         self.persist_directory = persist_directory
         self.collection_name = collection_name
         
-        # 初始化嵌入模型（使用 LangChain 封装）
-        print(f"正在加载嵌入模型: {embedding_model}")
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=embedding_model,
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
+        # 嵌入模型由进程内注册表共享并延迟加载（首次嵌入或启动预热时才加载）
+        self.embedding_model_name = embedding_model
+        self.embedding_model = get_embedding_model(embedding_model)
+        # 所有嵌入（检索、写入、TOT 去重）都经过同一模型共享的嵌入服务，共享缓存和批处理
+        self.embeddings = acquire_embedding_service(embedding_model)
         
         # 初始化或加载 ChromaDB 向量存储
-        self.vectorstore = Chroma(
-            collection_name=collection_name,
-            embedding_function=self.embeddings,
-            persist_directory=persist_directory
-        )
+        self.vectorstore = self._open_vectorstore()
+        
+        # 记忆数量计数器：以集合原生 count() 为准，在增删时增量维护，
+        # 避免每次统计都通过 vectorstore.get() 拉取全部数据
+        self._count_lock = threading.Lock()
+        self._memory_count = self._native_count()
+        
+        # 时间索引：随增删增量维护；与集合数量不一致时在首次查询前重建
+        os.makedirs(persist_directory, exist_ok=True)
+        self.recency_index = RecencyIndex(os.path.join(persist_directory, "recency_index.sqlite3"))
+        self._index_lock = threading.Lock()
+        self._index_ready = self.recency_index.count() == self._memory_count
+        
+        # 词法索引：新写入的记忆实时加入；已有记忆在首次混合检索前分页回填
+        self.search_mode = search_mode
+        self.reranker = reranker
+        
+        # 检索命中统计：先在内存中累计，由 flush_hits 批量写回
+        self._hits: Dict[str, Tuple[int, str]] = {}
+        self._hits_lock = threading.Lock()
+        self.lexical_index = BM25Index()
+        self._lexical_ready = self._memory_count == 0
+        
+        # 延迟写入队列：_pending 由 _pending_cond 保护；_flush_lock 保证同一时间
+        # 只有一个批次在写入，检索前获取它即可等待正在进行的写入完成
+        self.write_behind = write_behind
+        self.flush_batch_size = max(1, flush_batch_size)
+        self.flush_interval = max(0.01, flush_interval)
+        self._pending: List[Document] = []
+        self._pending_ids: List[str] = []
+        self._pending_cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._flusher = None
+        if write_behind:
+            self._flusher = threading.Thread(
+                target=self._flush_loop,
+                name="memory-write-behind",
+                daemon=True
+            )
+            self._flusher.start()
         
         print(f"记忆存储初始化完成，当前记忆数量: {self.get_memory_count()}")
     
-    def add_memory(
-        self,
-        user_message: str,
-        assistant_response: str,
-        metadata: Optional[Dict] = None
-    ) -> str:
+    def _open_vectorstore(self) -> Chroma:
+        """打开（不存在时创建）Chroma 集合"""
+        return Chroma(
+            collection_name=self.collection_name,
+            embedding_function=self.embeddings,
+            persist_directory=self.persist_directory
+        )
+    
+    def _native_count(self) -> int:
+        """使用 Chroma 集合原生的 count() 获取记忆数量"""
+        try:
+            return self.vectorstore._collection.count()
+        except Exception as e:
+            print(f"获取记忆数量失败: {e}")
+            return 0
+    
+    @staticmethod
+    def _scope_metadata(session_id: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, str]:
+        """写入记忆时附加的作用域元数据（全局作用域不写入）"""
+        scope = {}
+        if session_id and session_id != DEFAULT_SCOPE:
+            scope["session_id"] = session_id
+        if user_id and user_id != DEFAULT_SCOPE:
+            scope["user_id"] = user_id
+        return scope
+    
+    @staticmethod
+    def _build_filter(
+        memory_type: Optional[str] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> Optional[Dict]:
         """
-        添加一条对话记忆
+        构建 Chroma where 过滤条件
         
-        Args:
-            user_message: 用户消息
-            assistant_response: 助手回复
-            metadata: 额外的元数据
-            
-        Returns:
-            记忆ID
+        指定 user_id 时检索该用户所有会话的记忆；否则指定 session_id 时只检索该会话；
+        两者都未指定（或为 "default"）时检索全部记忆。
         """
+        conditions = []
+        if memory_type:
+            conditions.append({"type": memory_type})
+        scope = MemoryStore._scope_metadata(session_id, user_id)
+        if "user_id" in scope:
+            conditions.append({"user_id": scope["user_id"]})
+        elif "session_id" in scope:
+            conditions.append({"session_id": scope["session_id"]})
+        
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+    
+    def _adjust_count(self, delta: int) -> None:
+        """增量更新记忆计数"""
+        with self._count_lock:
+            self._memory_count = max(0, self._memory_count + delta)
+    
+    def _sync_count(self) -> int:
+        """与集合原生计数重新同步（删除操作后调用，因为无法确认ID是否存在）"""
+        count = self._native_count()
+        with self._count_lock:
+            self._memory_count = count
+        return count
+    
+    def _write_documents(self, docs: List[Document], ids: Optional[List[str]] = None) -> List[str]:
+        """写入向量存储，并同步计数器和时间索引"""
+        ids = self.vectorstore.add_documents(docs, ids=ids) if ids else self.vectorstore.add_documents(docs)
+        self._adjust_count(len(ids))
+        self.recency_index.add(ids, [doc.metadata for doc in docs])
+        self._index_lexical(ids, [doc.page_content for doc in docs], [doc.metadata for doc in docs])
+        return ids
+    
+    def _index_lexical(self, ids: List[str], texts: List[str], metadatas: List[Optional[Dict]]) -> None:
+        """加入词法索引（跳过压缩中被标记墓碑的记忆）"""
+        entries = [
+            (memory_id, text, metadata) for memory_id, text, metadata in zip(ids, texts, metadatas)
+            if not (metadata or {}).get("tombstoned")
+        ]
+        if entries:
+            ids, texts, metadatas = (list(column) for column in zip(*entries))
+            self.lexical_index.add(ids, texts, metadatas)
+    
+    def _iter_collection(self, page_size: int = 1000, include: Optional[List[str]] = None) -> Iterator[Dict]:
+        """按固定页大小遍历集合，每次产出一页 vectorstore.get() 的结果"""
+        offset = 0
+        while True:
+            page = self.vectorstore.get(limit=page_size, offset=offset, include=include or ["metadatas"])
+            ids = page.get("ids") or []
+            if not ids:
+                return
+            yield page
+            if len(ids) < page_size:
+                return
+            offset += len(ids)
+    
+    def _ensure_index(self) -> None:
+        """时间索引与集合不一致时（如升级前已有数据），分页重建"""
+        if self._index_ready:
+            return
+        with self._index_lock:
+            if self._index_ready:
+                return
+            print("正在重建记忆时间索引...")
+            count = self.recency_index.rebuild(
+                (page["ids"], page.get("metadatas") or [{}] * len(page["ids"]))
+                for page in self._iter_collection()
+            )
+            self._index_ready = True
+            print(f"记忆时间索引重建完成: {count} 条")
+    
+    def _ensure_lexical(self) -> None:
+        """首次混合检索前，用集合中已有的记忆回填词法索引"""
+        if self._lexical_ready:
+            return
+        with self._index_lock:
+            if self._lexical_ready:
+                return
+            print("正在构建记忆词法索引...")
+            self.lexical_index.clear()
+            for page in self._iter_collection(include=["documents", "metadatas"]):
+                ids = page["ids"]
+                self._index_lexical(
+                    ids,
+                    page.get("documents") or [""] * len(ids),
+                    page.get("metadatas") or [None] * len(ids)
+                )
+            self._lexical_ready = True
+            print(f"记忆词法索引构建完成: {len(self.lexical_index)} 条")
+    
+    @staticmethod
+    def _conversation_document(
+        user_message: str,
+        assistant_response: str,
+        metadata: Optional[Dict] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> Document:
+        """构建对话记忆的 Document"""
         timestamp = datetime.now().isoformat()
         
         # 组合对话内容
@@ -86,28 +281,146 @@ class MemoryStore:
             "timestamp": timestamp,
             "type": "conversation"
         }
+        memory_metadata.update(MemoryStore._scope_metadata(session_id, user_id))
         
         if metadata:
             memory_metadata.update(metadata)
         
         # 创建 LangChain Document
-        doc = Document(
+        return Document(
             page_content=combined_content,
             metadata=memory_metadata
         )
+    
+    def add_memory(
+        self,
+        user_message: str,
+        assistant_response: str,
+        metadata: Optional[Dict] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> str:
+        """
+        添加一条对话记忆（同步写入）
+        
+        Args:
+            user_message: 用户消息
+            assistant_response: 助手回复
+            metadata: 额外的元数据
+            session_id: 会话ID（命名空间）
+            user_id: 用户ID（命名空间）
+            
+        Returns:
+            记忆ID
+        """
+        doc = self._conversation_document(user_message, assistant_response, metadata, session_id, user_id)
         
         # 添加到向量存储
-        ids = self.vectorstore.add_documents([doc])
+        ids = self._write_documents([doc])
         
         return ids[0] if ids else ""
     
-    def add_fact(self, fact: str, category: str = "general") -> str:
+    def queue_memory(
+        self,
+        user_message: str,
+        assistant_response: str,
+        metadata: Optional[Dict] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> str:
+        """
+        添加一条对话记忆（延迟写入）
+        
+        未启用 write_behind 或存储已关闭时退化为 add_memory。
+        
+        Returns:
+            预先生成的记忆ID
+        """
+        if not self.write_behind or self._closed:
+            return self.add_memory(user_message, assistant_response, metadata, session_id, user_id)
+        
+        doc = self._conversation_document(user_message, assistant_response, metadata, session_id, user_id)
+        memory_id = str(uuid.uuid4())
+        with self._pending_cond:
+            self._pending.append(doc)
+            self._pending_ids.append(memory_id)
+            if len(self._pending) >= self.flush_batch_size:
+                self._pending_cond.notify()
+        return memory_id
+    
+    def pending_count(self) -> int:
+        """获取尚未落盘的记忆数量"""
+        return len(self._pending)
+    
+    def flush(self) -> int:
+        """
+        将待写入的记忆批量嵌入并写入向量存储
+        
+        Returns:
+            本次写入的记忆数量
+        """
+        with self._flush_lock:
+            with self._pending_cond:
+                docs, ids = self._pending, self._pending_ids
+                self._pending, self._pending_ids = [], []
+            if not docs:
+                return 0
+            try:
+                # add_documents 对整批文本只调用一次 embed_documents
+                self._write_documents(docs, ids)
+            except Exception as e:
+                print(f"批量写入记忆失败，稍后重试: {e}")
+                with self._pending_cond:
+                    self._pending = docs + self._pending
+                    self._pending_ids = ids + self._pending_ids
+                return 0
+            return len(ids)
+    
+    def _flush_loop(self) -> None:
+        """后台线程：数量达到 flush_batch_size 或等待超过 flush_interval 时落盘"""
+        while True:
+            with self._pending_cond:
+                if not self._closed and len(self._pending) < self.flush_batch_size:
+                    self._pending_cond.wait(timeout=self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+    
+    def _ensure_flushed(self) -> None:
+        """读取前落盘待写入的记忆（read-your-writes）"""
+        if self._pending or self._flush_lock.locked():
+            self.flush()
+    
+    def close(self) -> None:
+        """停止后台写入线程、落盘剩余记忆，关闭时间索引并释放共享的嵌入服务"""
+        if self._closed:
+            return
+        with self._pending_cond:
+            self._closed = True
+            self._pending_cond.notify()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        self.flush_hits()
+        self.recency_index.close()
+        release_embedding_service(self.embedding_model_name)
+    
+    def add_fact(
+        self,
+        fact: str,
+        category: str = "general",
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> str:
         """
         添加一条事实记忆
         
         Args:
             fact: 事实内容
             category: 分类
+            session_id: 会话ID（命名空间）
+            user_id: 用户ID（命名空间）
             
         Returns:
             记忆ID
@@ -120,21 +433,84 @@ class MemoryStore:
             "timestamp": timestamp,
             "type": "fact"
         }
+        metadata.update(self._scope_metadata(session_id, user_id))
         
         doc = Document(
             page_content=fact,
             metadata=metadata
         )
         
-        ids = self.vectorstore.add_documents([doc])
+        ids = self._write_documents([doc])
         
         return ids[0] if ids else ""
     
+    def add_summary(
+        self,
+        summary: str,
+        source_ids: List[str],
+        timestamp: Optional[str] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        memory_id: Optional[str] = None
+    ) -> str:
+        """
+        添加一条摘要记忆（记忆压缩时替代一组相似的对话记忆）
+        
+        Args:
+            summary: 摘要内容
+            source_ids: 被合并的原始记忆ID
+            timestamp: 摘要的时间戳（默认当前时间，压缩时取被合并记忆中最新的时间）
+            memory_id: 预先生成的记忆ID（压缩时原始记忆的墓碑指向该ID）
+            
+        Returns:
+            记忆ID
+        """
+        metadata = {
+            "summary": summary,
+            "source_count": len(source_ids),
+            "timestamp": timestamp or datetime.now().isoformat(),
+            "compacted_at": datetime.now().isoformat(),
+            "type": "summary"
+        }
+        metadata.update(self._scope_metadata(session_id, user_id))
+        
+        ids = self._write_documents(
+            [Document(page_content=summary, metadata=metadata)],
+            [memory_id] if memory_id else None
+        )
+        
+        return ids[0] if ids else ""
+    
+    def get_memories_by_ids(self, ids: List[str], include_embeddings: bool = False) -> List[Dict]:
+        """按ID读取记忆（不存在的ID会被忽略）"""
+        if not ids:
+            return []
+        self._ensure_flushed()
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        data = self.vectorstore.get(ids=ids, include=include)
+        embeddings = data.get("embeddings")
+        memories = []
+        for i, memory_id in enumerate(data.get("ids", [])):
+            memory = {
+                "id": memory_id,
+                "content": data["documents"][i],
+                "metadata": data["metadatas"][i] or {}
+            }
+            if include_embeddings and embeddings is not None:
+                memory["embedding"] = embeddings[i]
+            memories.append(memory)
+        return memories
+    
     def search_memories(
         self,
         query: str,
         n_results: int = 5,
-        memory_type: Optional[str] = None
+        memory_type: Optional[str] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        mode: Optional[str] = None,
+        rerank: Optional[bool] = None,
+        record_hits: bool = True
     ) -> List[Dict]:
         """
         根据查询搜索相关记忆
@@ -143,38 +519,176 @@ class MemoryStore:
             query: 查询文本
             n_results: 返回结果数量
             memory_type: 过滤记忆类型（conversation/fact）
+            session_id: 只检索该会话的记忆
+            user_id: 只检索该用户的记忆（优先于 session_id）
+            mode: 检索模式（vector / hybrid），默认使用 search_mode
+            rerank: 是否重排序，默认取决于是否配置了 reranker
+            record_hits: 是否记录检索命中（结果可能不被使用时传 False，由调用方确认使用后再 record_hits）
             
         Returns:
             相关记忆列表
         """
+        self._ensure_flushed()
         if self.get_memory_count() == 0:
             return []
         
-        # 构建过滤条件
-        filter_dict = None
-        if memory_type:
-            filter_dict = {"type": memory_type}
+        # 构建过滤条件（类型 + 命名空间，下推到 Chroma 执行）
+        filter_dict = self._build_filter(memory_type, session_id, user_id)
+        
+        reranker = self.reranker
+        if rerank is not None:
+            reranker = (self.reranker or MemoryReranker()) if rerank else None
+        # 重排序时多取候选
+        fetch = n_results * max(1, reranker.overfetch) if reranker else n_results
+        
+        if (mode or self.search_mode) == SearchMode.HYBRID:
+            memories = self._hybrid_search(query, fetch, filter_dict, memory_type, session_id, user_id)
+        else:
+            memories = self._vector_search(query, fetch, filter_dict)
+        # 压缩中被标记墓碑的记忆已有摘要替代（或将在下次压缩时恢复），不返回。
+        # 在结果中过滤而不是用 $ne 下推：$ne 对缺少该键的记录的处理在不同 Chroma 版本间不一致
+        memories = [memory for memory in memories if not memory["metadata"].get("tombstoned")]
+        
+        if reranker is not None and memories:
+            memories = self._rerank(reranker, query, memories, n_results)
+        if record_hits:
+            self.record_hits([memory["id"] for memory in memories])
+        return memories
+    
+    def record_hits(self, ids: List[str]) -> None:
+        """记录一次检索命中（累计到内存，积累过多时立即写回）"""
+        if not ids:
+            return
+        now = datetime.now().isoformat()
+        with self._hits_lock:
+            for memory_id in ids:
+                count, _ = self._hits.get(memory_id, (0, now))
+                self._hits[memory_id] = (count + 1, now)
+            pending = len(self._hits)
+        if pending >= 1024:
+            self.flush_hits()
+    
+    def flush_hits(self, batch_size: int = 200) -> int:
+        """
+        将累计的命中统计写回时间索引和记忆元数据（hit_count / last_hit_at）
+        
+        Returns:
+            更新的记忆数量
+        """
+        with self._hits_lock:
+            hits, self._hits = self._hits, {}
+        if not hits:
+            return 0
         
-        # 使用 LangChain 的相似度搜索
-        results = self.vectorstore.similarity_search_with_score(
-            query,
-            k=n_results,
-            filter=filter_dict
+        self.recency_index.record_hits(hits)
+        ids = list(hits)
+        updated = 0
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            try:
+                data = self.vectorstore.get(ids=batch, include=["metadatas"])
+                found = data.get("ids", [])
+                if not found:
+                    continue
+                metadatas = []
+                for memory_id, metadata in zip(found, data.get("metadatas", [])):
+                    count, accessed_at = hits[memory_id]
+                    metadata = dict(metadata or {})
+                    metadata["hit_count"] = int(metadata.get("hit_count") or 0) + count
+                    metadata["last_hit_at"] = accessed_at
+                    metadatas.append(metadata)
+                self.vectorstore._collection.update(ids=found, metadatas=metadatas)
+                updated += len(found)
+            except Exception as e:
+                print(f"写回记忆命中统计失败: {e}")
+        return updated
+    
+    def _rerank(self, reranker: MemoryReranker, query: str, memories: List[Dict], k: int) -> List[Dict]:
+        """读取候选记忆的向量并重排序"""
+        data = self.vectorstore._collection.get(
+            ids=[memory["id"] for memory in memories],
+            include=["embeddings"]
+        )
+        vectors = dict(zip(data["ids"], data["embeddings"]))
+        memories = [memory for memory in memories if memory["id"] in vectors]
+        return reranker.rerank(
+            self.embeddings.embed_query(query),
+            memories,
+            [vectors[memory["id"]] for memory in memories],
+            k
+        )
+    
+    def _vector_search(self, query: str, k: int, filter_dict: Optional[Dict]) -> List[Dict]:
+        """向量相似度检索（直接查询集合，以便拿到记忆ID）"""
+        results = self.vectorstore._collection.query(
+            query_embeddings=[self.embeddings.embed_query(query)],
+            n_results=k,
+            where=filter_dict,
+            include=["documents", "metadatas", "distances"]
         )
         
         # 格式化结果
         memories = []
-        for doc, score in results:
-            memory = {
-                "id": doc.metadata.get("id", ""),
-                "content": doc.page_content,
-                "metadata": doc.metadata,
-                "distance": score
-            }
-            memories.append(memory)
+        for memory_id, content, metadata, distance in zip(
+            results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0]
+        ):
+            memories.append({
+                "id": memory_id,
+                "content": content,
+                "metadata": metadata or {},
+                "distance": distance
+            })
         
         return memories
     
+    def _hybrid_search(
+        self,
+        query: str,
+        n_results: int,
+        filter_dict: Optional[Dict],
+        memory_type: Optional[str],
+        session_id: Optional[str],
+        user_id: Optional[str]
+    ) -> List[Dict]:
+        """向量检索与 BM25 检索各取 2 * n_results 个候选，按 RRF 融合后取前 n_results 个"""
+        candidates = n_results * 2
+        vector_hits = self._vector_search(query, candidates, filter_dict)
+        
+        self._ensure_lexical()
+        lexical_hits = self.lexical_index.search(
+            query, candidates, memory_type, **self._scope_metadata(session_id, user_id)
+        )
+        
+        fused = reciprocal_rank_fusion([
+            [memory["id"] for memory in vector_hits],
+            [memory_id for memory_id, _ in lexical_hits]
+        ])[:n_results]
+        
+        # 只被词法检索命中的记忆需要按ID补充读取内容
+        by_id = {memory["id"]: memory for memory in vector_hits}
+        missing = [memory_id for memory_id, _ in fused if memory_id not in by_id]
+        if missing:
+            data = self.vectorstore.get(ids=missing)
+            for memory_id, content, metadata in zip(
+                data.get("ids", []), data.get("documents", []), data.get("metadatas", [])
+            ):
+                by_id[memory_id] = {
+                    "id": memory_id,
+                    "content": content,
+                    "metadata": metadata or {},
+                    "distance": None
+                }
+        
+        bm25_scores = dict(lexical_hits)
+        memories = []
+        for memory_id, score in fused:
+            if memory_id in by_id:
+                memory = dict(by_id[memory_id])
+                memory["rrf_score"] = score
+                memory["bm25_score"] = bm25_scores.get(memory_id)
+                memories.append(memory)
+        return memories
+    
     def get_retriever(self, search_kwargs: Optional[Dict] = None):
         """
         获取 LangChain Retriever 对象
@@ -190,90 +704,309 @@ class MemoryStore:
         
         return self.vectorstore.as_retriever(search_kwargs=search_kwargs)
     
-    def get_recent_memories(self, n: int = 10) -> List[Dict]:
+    def get_recent_memories(
+        self,
+        n: int = 10,
+        offset: int = 0,
+        memory_type: Optional[str] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> List[Dict]:
         """
-        获取最近的记忆（按时间排序）
+        获取最近的记忆（按时间倒序）
+        
+        通过时间索引取出第 offset 条起的 n 个ID，再按ID从集合中读取内容。
+        
+        Args:
+            n: 返回数量
+            offset: 跳过的条数（分页）
+            memory_type: 过滤记忆类型（conversation/fact）
+            session_id: 只返回该会话的记忆
+            user_id: 只返回该用户的记忆（优先于 session_id）
         """
-        # 获取所有文档
-        all_docs = self.vectorstore.get()
+        self._ensure_flushed()
+        self._ensure_index()
         
-        if not all_docs or not all_docs.get('documents'):
+        scope = self._scope_metadata(session_id, user_id)
+        ids = self.recency_index.recent(n, offset, memory_type, **scope)
+        if not ids:
             return []
         
-        # 组合并按时间排序
-        memories = []
-        documents = all_docs.get('documents', [])
-        metadatas = all_docs.get('metadatas', [])
-        ids = all_docs.get('ids', [])
-        
-        for i, doc_content in enumerate(documents):
-            memories.append({
-                "id": ids[i] if i < len(ids) else "",
-                "content": doc_content,
-                "metadata": metadatas[i] if i < len(metadatas) else {}
-            })
+        data = self.vectorstore.get(ids=ids)
+        rows = {
+            memory_id: (content, metadata)
+            for memory_id, content, metadata in zip(
+                data.get('ids', []), data.get('documents', []), data.get('metadatas', [])
+            )
+        }
         
-        # 按时间戳排序
-        memories.sort(
-            key=lambda x: x['metadata'].get('timestamp', ''),
-            reverse=True
-        )
+        memories = []
+        for memory_id in ids:
+            if memory_id in rows:
+                content, metadata = rows[memory_id]
+                memories.append({
+                    "id": memory_id,
+                    "content": content,
+                    "metadata": metadata or {}
+                })
+        return memories
+    
+    def get_memory_page(
+        self,
+        page: int = 1,
+        page_size: int = 20,
+        memory_type: Optional[str] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> Dict:
+        """
+        分页浏览记忆（按时间倒序）
         
-        return memories[:n]
+        Returns:
+            {"items": 记忆列表, "total": 总数, "page": 页码, "page_size": 每页数量, "has_more": 是否还有下一页}
+        """
+        page = max(1, page)
+        page_size = max(1, page_size)
+        items = self.get_recent_memories(page_size, (page - 1) * page_size, memory_type, session_id, user_id)
+        total = self.recency_index.count(memory_type, **self._scope_metadata(session_id, user_id))
+        return {
+            "items": items,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "has_more": page * page_size < total
+        }
     
     def delete_memory(self, memory_id: str) -> bool:
         """删除指定记忆"""
         try:
+            self._ensure_flushed()
             self.vectorstore.delete([memory_id])
+            self.recency_index.remove([memory_id])
+            self.lexical_index.remove([memory_id])
+            self._sync_count()
             return True
         except Exception as e:
             print(f"删除记忆失败: {e}")
             return False
     
-    def clear_all_memories(self) -> bool:
-        """清空所有记忆"""
+    def delete_memories(self, ids: List[str], batch_size: int = 100) -> int:
+        """
+        批量删除记忆（按 batch_size 分批，避免长时间占用集合）
+        
+        Returns:
+            删除请求中的ID数量
+        """
+        self._ensure_flushed()
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            self.vectorstore.delete(batch)
+            self.recency_index.remove(batch)
+            self.lexical_index.remove(batch)
+        self._sync_count()
+        return len(ids)
+    
+    def clear_all_memories(
+        self,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        batch_size: int = 500
+    ) -> bool:
+        """
+        清空记忆
+        
+        不指定作用域时删除并重建整个集合（不再逐个读取ID），同时丢弃尚未落盘的记忆、
+        重置计数器和所有侧车索引；指定 session_id / user_id 时通过 where 过滤分批删除
+        该命名空间的记忆。
+        
+        Args:
+            session_id: 只清空该会话的记忆
+            user_id: 只清空该用户的记忆（优先于 session_id）
+            batch_size: 作用域清空时每批删除的数量
+        """
+        where = self._build_filter(None, session_id, user_id)
         try:
-            # 获取所有ID并删除
-            all_data = self.vectorstore.get()
-            if all_data and all_data.get('ids'):
-                self.vectorstore.delete(all_data['ids'])
+            if where is not None:
+                self._clear_scope(where, batch_size)
+                return True
+            with self._flush_lock, self._index_lock:
+                with self._pending_cond:
+                    self._pending, self._pending_ids = [], []
+                with self._hits_lock:
+                    self._hits = {}
+                # 删除并重建集合：耗时与记忆数量无关
+                self.vectorstore.delete_collection()
+                self.vectorstore = self._open_vectorstore()
+                with self._count_lock:
+                    self._memory_count = 0
+                self.recency_index.clear()
+                self.lexical_index.clear()
+                self._index_ready = True
+                self._lexical_ready = True
             return True
         except Exception as e:
             print(f"清空记忆失败: {e}")
             return False
     
+    def _clear_scope(self, where: Dict, batch_size: int) -> int:
+        """按 where 过滤分批删除某个命名空间的记忆，每批只读取ID"""
+        self._ensure_flushed()
+        deleted = 0
+        while True:
+            ids = self.vectorstore._collection.get(where=where, limit=batch_size, include=[]).get("ids") or []
+            if not ids:
+                break
+            self.vectorstore.delete(ids)
+            self.recency_index.remove(ids)
+            self.lexical_index.remove(ids)
+            deleted += len(ids)
+        self._sync_count()
+        return deleted
+    
     def get_memory_count(self) -> int:
-        """获取记忆数量"""
-        try:
-            all_data = self.vectorstore.get()
-            return len(all_data.get('ids', [])) if all_data else 0
-        except:
-            return 0
+        """获取记忆数量（O(1)，读取维护的计数器）"""
+        return self._memory_count
+    
+    def get_stats(self) -> Dict:
+        """获取记忆存储统计信息"""
+        return {
+            "memory_count": self._memory_count,
+            "pending_writes": self.pending_count(),
+            "embedding": self.embeddings.get_stats(),
+            "collection_name": self.collection_name,
+            "persist_directory": self.persist_directory
+        }
+    
+    @staticmethod
+    def _open_dump(filepath: str, mode: str, compress: Optional[bool] = None):
+        """
+        打开导出文件
+        
+        写入时 compress 为 None 则按 .gz 后缀决定是否 gzip 压缩；
+        读取时按文件头的 gzip 魔数（1f 8b）判断，与文件名无关
+        """
+        if compress is None:
+            if mode == "r":
+                with open(filepath, "rb") as f:
+                    compress = f.read(2) == b"\x1f\x8b"
+            else:
+                compress = filepath.endswith(".gz")
+        if compress:
+            return gzip.open(filepath, mode + "t", encoding="utf-8")
+        return open(filepath, mode, encoding="utf-8")
     
-    def export_memories(self, filepath: str) -> bool:
-        """导出所有记忆到JSON文件"""
+    def export_memories(
+        self,
+        filepath: str,
+        include_embeddings: bool = False,
+        compress: Optional[bool] = None,
+        page_size: int = 1000
+    ) -> bool:
+        """
+        导出所有记忆到 JSONL 文件（每行一条记忆）
+        
+        按 page_size 分页读取集合并逐行写入，内存占用与记忆总数无关。
+        
+        Args:
+            filepath: 导出文件路径
+            include_embeddings: 是否同时导出向量（导入时可跳过重新嵌入）
+            compress: 是否 gzip 压缩，默认根据 .gz 后缀判断
+            page_size: 每页读取的记忆数量
+        """
         try:
-            all_data = self.vectorstore.get()
-            
-            if not all_data:
-                return False
-            
-            export_data = []
-            documents = all_data.get('documents', [])
-            metadatas = all_data.get('metadatas', [])
-            ids = all_data.get('ids', [])
-            
-            for i, doc_content in enumerate(documents):
-                export_data.append({
-                    "id": ids[i] if i < len(ids) else "",
-                    "content": doc_content,
-                    "metadata": metadatas[i] if i < len(metadatas) else {}
-                })
-            
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, ensure_ascii=False, indent=2)
-            
+            self._ensure_flushed()
+            include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+            exported = 0
+            with self._open_dump(filepath, "w", compress) as f:
+                for page in self._iter_collection(page_size, include):
+                    ids = page.get('ids', [])
+                    documents = page.get('documents', [])
+                    metadatas = page.get('metadatas', [])
+                    embeddings = page.get('embeddings')
+                    for i, memory_id in enumerate(ids):
+                        record = {
+                            "id": memory_id,
+                            "content": documents[i] if i < len(documents) else "",
+                            "metadata": (metadatas[i] if i < len(metadatas) else None) or {}
+                        }
+                        if include_embeddings and embeddings is not None and i < len(embeddings):
+                            record["embedding"] = [float(x) for x in embeddings[i]]
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    exported += len(ids)
+            print(f"导出记忆完成: {exported} 条 -> {filepath}")
             return True
         except Exception as e:
             print(f"导出记忆失败: {e}")
             return False
+    
+    @staticmethod
+    def _read_dump(f) -> Iterator[Dict]:
+        """逐条读取导出文件；兼容旧版的 JSON 数组格式"""
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        if first == "[":
+            # 旧版 export_memories 输出的是整个 JSON 数组，只能整体加载
+            yield from json.loads(first + f.read())
+            return
+        line = first + f.readline()
+        while line:
+            if line.strip():
+                yield json.loads(line)
+            line = f.readline()
+    
+    def _import_batch(self, records: List[Dict]) -> int:
+        """写入一批导入记录：带向量的直接写入集合，不带向量的走嵌入"""
+        embedded = [r for r in records if r.get("embedding")]
+        plain = [r for r in records if not r.get("embedding")]
+        
+        if embedded:
+            ids = [r.get("id") or str(uuid.uuid4()) for r in embedded]
+            # Chroma 不接受空字典作为元数据
+            metadatas = [r.get("metadata") or None for r in embedded]
+            self.vectorstore._collection.upsert(
+                ids=ids,
+                embeddings=[r["embedding"] for r in embedded],
+                documents=[r.get("content", "") for r in embedded],
+                metadatas=metadatas
+            )
+            self.recency_index.add(ids, metadatas)
+            self._index_lexical(ids, [r.get("content", "") for r in embedded], metadatas)
+        if plain:
+            docs = [Document(page_content=r.get("content", ""), metadata=r.get("metadata") or {}) for r in plain]
+            self._write_documents(docs, [r.get("id") or str(uuid.uuid4()) for r in plain])
+        return len(records)
+    
+    def import_memories(self, filepath: str, batch_size: int = 500) -> int:
+        """
+        从 export_memories 导出的文件批量导入记忆
+        
+        逐行读取并按 batch_size 分批写入；记录中带有向量时直接写入，
+        不再重新计算嵌入。已存在的ID会被覆盖。
+        
+        Args:
+            filepath: 导入文件路径（gzip 压缩的文件按文件头自动识别并解压）
+            batch_size: 每批写入的记忆数量
+            
+        Returns:
+            导入的记忆数量
+        """
+        imported = 0
+        try:
+            self._ensure_flushed()
+            batch: List[Dict] = []
+            with self._open_dump(filepath, "r") as f:
+                for record in self._read_dump(f):
+                    batch.append(record)
+                    if len(batch) >= batch_size:
+                        imported += self._import_batch(batch)
+                        batch = []
+                if batch:
+                    imported += self._import_batch(batch)
+            print(f"导入记忆完成: {imported} 条 <- {filepath}")
+        except Exception as e:
+            print(f"导入记忆失败（已导入 {imported} 条）: {e}")
+        finally:
+            # upsert 可能覆盖已有ID，以集合原生计数为准
+            self._sync_count()
+        return imported
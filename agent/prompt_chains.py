@@ -0,0 +1,105 @@
+"""
+提示词链注册表
+从 prompts.json 加载提示词配置，启动时一次性构建 ChatPromptTemplate | llm | 解析器，
+请求时只通过 invoke 的变量传入用户文本：
+1. 热路径上不再重复构建模板和链
+2. 用户文本不再拼进模板，文本中的花括号不会被当作模板变量
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import Runnable
+
+
+# 随代码发布的 prompt 配置文件（相对本模块所在目录）
+DEFAULT_PROMPTS_FILE = "prompts.json"
+
+
+def load_prompts(prompts_file: str = DEFAULT_PROMPTS_FILE) -> Dict:
+    """
+    从 JSON 文件加载 prompt 配置
+
+    Args:
+        prompts_file: prompt配置文件路径（相对路径从本模块所在目录查找）
+
+    Returns:
+        prompt配置字典
+    """
+    prompts_path = Path(prompts_file)
+
+    # 如果是相对路径，从当前脚本目录查找
+    if not prompts_path.is_absolute():
+        script_dir = Path(__file__).parent
+        prompts_path = script_dir / prompts_file
+
+    try:
+        with open(prompts_path, 'r', encoding='utf-8') as f:
+            prompts = json.load(f)
+        print(f"✓ 成功加载 prompt 配置文件: {prompts_path}")
+        return prompts
+    except FileNotFoundError:
+        print(f"⚠ 未找到 prompt 配置文件: {prompts_path}，使用默认配置")
+        return {
+            "chat": {
+                "system_prompt": "你是一个友好、有帮助的AI助手。"
+            }
+        }
+    except json.JSONDecodeError as e:
+        print(f"⚠ prompt 配置文件格式错误: {e}，使用默认配置")
+        return {
+            "chat": {
+                "system_prompt": "你是一个友好、有帮助的AI助手。"
+            }
+        }
+
+
+# 由代码生成、必须出现在用户消息模板中的变量：自定义模板（如旧版 prompts.json）
+# 未包含时追加到模板末尾，避免对应的要求被静默忽略
+_TRAILING_VARIABLES = {
+    "summarize": ("length_requirement",),
+}
+
+
+class ChainRegistry:
+    """
+    预构建的参数化链
+
+    每项配置：
+    - system_prompt: 系统提示词模板
+    - user_template: 用户消息模板（默认 "{input}"）
+    - output: "text"（默认，经 StrOutputParser 返回字符串）或 "message"（返回消息，用于流式输出）
+    """
+
+    def __init__(self, llm, configs: Dict[str, Dict]):
+        self._chains: Dict[str, Runnable] = {
+            name: self._build(llm, config, _TRAILING_VARIABLES.get(name, ())) for name, config in configs.items()
+        }
+
+    @staticmethod
+    def _build(llm, config: Dict, trailing_variables: Iterable[str] = ()) -> Runnable:
+        user_template = config.get("user_template", "{input}")
+        for variable in trailing_variables:
+            if "{" + variable + "}" not in user_template:
+                user_template += "{" + variable + "}"
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", config["system_prompt"]),
+            ("human", user_template)
+        ])
+        chain = prompt | llm
+        if config.get("output", "text") == "text":
+            chain = chain | StrOutputParser()
+        return chain
+
+    def __getitem__(self, name: str) -> Runnable:
+        return self._chains[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._chains
+
+    def missing(self, names: Iterable[str]) -> List[str]:
+        """返回未配置的链名称"""
+        return [name for name in names if name not in self._chains]
@@ -0,0 +1,283 @@
+"""
+记忆时间索引
+与 ChromaDB 并存的 SQLite 侧车表，按时间戳维护记忆ID，
+使 "最近 N 条" 和分页浏览无需拉取整个集合再在 Python 中排序。
+"""
+
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class RecencyIndex:
+    """
+    基于 SQLite 的增量时间索引
+
+    特性：
+    1. 每条记忆一行：id、timestamp、type、session_id、user_id
+    2. 在 (timestamp)、(type, timestamp)、(session_id, timestamp)、(user_id, timestamp)
+       上建立索引，最近 N 条查询为 O(log N + n)
+    3. 随记忆的增删增量维护；与集合不一致时可整体重建
+    4. 记录检索命中次数和最近命中时间，供保留策略按 LRU / LFU 淘汰
+    5. 持久化后台任务的扫描游标，分批扫描可以跨多次运行接续
+    """
+
+    def __init__(self, db_path: str):
+        """
+        初始化时间索引
+
+        Args:
+            db_path: SQLite 文件路径（通常位于 Chroma 持久化目录下）
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS memory_recency ("
+                "id TEXT PRIMARY KEY, timestamp TEXT NOT NULL, type TEXT, "
+                "session_id TEXT, user_id TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_recency_ts ON memory_recency (timestamp)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_recency_type ON memory_recency (type, timestamp)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_recency_session ON memory_recency (session_id, timestamp)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_recency_user ON memory_recency (user_id, timestamp)")
+            # 旧版索引文件没有命中统计列
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(memory_recency)")}
+            if "hit_count" not in columns:
+                self._conn.execute("ALTER TABLE memory_recency ADD COLUMN hit_count INTEGER NOT NULL DEFAULT 0")
+            if "last_access" not in columns:
+                self._conn.execute("ALTER TABLE memory_recency ADD COLUMN last_access TEXT")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS scan_cursor ("
+                "name TEXT PRIMARY KEY, user_id TEXT, session_id TEXT, timestamp TEXT, id TEXT)"
+            )
+
+    @staticmethod
+    def _row(memory_id: str, metadata: Dict) -> Tuple:
+        metadata = metadata or {}
+        return (
+            memory_id,
+            metadata.get("timestamp", ""),
+            metadata.get("type"),
+            metadata.get("session_id"),
+            metadata.get("user_id"),
+            int(metadata.get("hit_count") or 0),
+            metadata.get("last_hit_at")
+        )
+
+    @staticmethod
+    def _where(
+        memory_type: Optional[str] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> Tuple[str, List[str]]:
+        """构建 WHERE 子句（作用域规则与 MemoryStore._build_filter 一致，user_id 优先）"""
+        clauses, params = [], []
+        if memory_type:
+            clauses.append("type = ?")
+            params.append(memory_type)
+        if user_id:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        elif session_id:
+            clauses.append("session_id = ?")
+            params.append(session_id)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def add(self, ids: List[str], metadatas: List[Dict]) -> None:
+        """登记新写入的记忆"""
+        rows = [self._row(memory_id, metadata) for memory_id, metadata in zip(ids, metadatas)]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO memory_recency "
+                "(id, timestamp, type, session_id, user_id, hit_count, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def remove(self, ids: List[str]) -> None:
+        """移除已删除的记忆"""
+        if not ids:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM memory_recency WHERE id = ?", [(memory_id,) for memory_id in ids])
+
+    def clear(self) -> None:
+        """清空索引（扫描游标一并重置）"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM memory_recency")
+            self._conn.execute("DELETE FROM scan_cursor")
+
+    def rebuild(self, entries: Iterable[Tuple[List[str], List[Dict]]]) -> int:
+        """
+        根据集合内容重建索引
+
+        Args:
+            entries: 逐页产出 (ids, metadatas) 的可迭代对象
+
+        Returns:
+            重建后的条目数
+        """
+        self.clear()
+        for ids, metadatas in entries:
+            self.add(ids, metadatas)
+        return self.count()
+
+    def count(
+        self,
+        memory_type: Optional[str] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> int:
+        """统计（指定作用域内的）记忆数量"""
+        where, params = self._where(memory_type, session_id, user_id)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM memory_recency{where}", params).fetchone()[0]
+
+    def recent(
+        self,
+        limit: int,
+        offset: int = 0,
+        memory_type: Optional[str] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> List[str]:
+        """按时间倒序返回记忆ID"""
+        where, params = self._where(memory_type, session_id, user_id)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM memory_recency{where} ORDER BY timestamp DESC LIMIT ? OFFSET ?",
+                params + [max(0, limit), max(0, offset)]
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def older_than(
+        self,
+        cutoff: str,
+        memory_type: Optional[str] = None,
+        limit: int = 1000,
+        after: Optional[Tuple[str, str, str, str]] = None
+    ) -> List[Tuple[str, str, Optional[str], Optional[str]]]:
+        """
+        返回时间戳早于 cutoff 的记忆，按 (user_id, session_id, timestamp, id) 排序
+        （缺少 user_id / session_id 的记忆按空字符串排在最前）
+
+        Args:
+            after: 扫描游标 (user_id, session_id, timestamp, id)，只返回排在其后的记忆
+
+        Returns:
+            [(id, timestamp, session_id, user_id), ...]，最多 limit 条
+        """
+        where, params = self._where(memory_type)
+        clauses = ["timestamp < ?"]
+        params.append(cutoff)
+        if after is not None:
+            clauses.append("(COALESCE(user_id, ''), COALESCE(session_id, ''), timestamp, id) > (?, ?, ?, ?)")
+            params.extend(after)
+        where += (" AND " if where else " WHERE ") + " AND ".join(clauses)
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT id, timestamp, session_id, user_id FROM memory_recency{where} "
+                "ORDER BY COALESCE(user_id, ''), COALESCE(session_id, ''), timestamp, id LIMIT ?",
+                params + [max(0, limit)]
+            ).fetchall()
+
+    @staticmethod
+    def cursor_for(row: Tuple[str, str, Optional[str], Optional[str]]) -> Tuple[str, str, str, str]:
+        """由 older_than 返回的一行构造扫描游标"""
+        memory_id, timestamp, session_id, user_id = row
+        return (user_id or "", session_id or "", timestamp, memory_id)
+
+    def get_cursor(self, name: str) -> Optional[Tuple[str, str, str, str]]:
+        """读取扫描游标；不存在时返回 None（从头扫描）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT user_id, session_id, timestamp, id FROM scan_cursor WHERE name = ?", (name,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def set_cursor(self, name: str, cursor: Optional[Tuple[str, str, str, str]]) -> None:
+        """保存扫描游标；cursor 为 None 时删除（下次从头扫描）"""
+        with self._lock, self._conn:
+            if cursor is None:
+                self._conn.execute("DELETE FROM scan_cursor WHERE name = ?", (name,))
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO scan_cursor (name, user_id, session_id, timestamp, id) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (name, *cursor)
+                )
+
+    def record_hits(self, hits: Dict[str, Tuple[int, str]]) -> None:
+        """累加检索命中：{id: (命中次数, 最近命中时间)}"""
+        if not hits:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE memory_recency SET hit_count = hit_count + ?, last_access = ? WHERE id = ?",
+                [(count, accessed_at, memory_id) for memory_id, (count, accessed_at) in hits.items()]
+            )
+
+    def expired(self, memory_type: str, cutoff: str, limit: int) -> List[str]:
+        """返回指定类型中时间戳早于 cutoff 的记忆ID（最旧的优先）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM memory_recency WHERE type = ? AND timestamp < ? ORDER BY timestamp LIMIT ?",
+                (memory_type, cutoff, max(0, limit))
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def over_capacity(self, max_count: int) -> List[Tuple[str, str, int]]:
+        """
+        返回记忆数超过 max_count 的命名空间
+
+        用户作用域按 user_id 统计；没有 user_id 的记忆按 session_id 统计；全局记忆不受限制。
+
+        Returns:
+            [(作用域列名, 作用域值, 超出数量), ...]
+        """
+        with self._lock:
+            users = self._conn.execute(
+                "SELECT user_id, COUNT(*) FROM memory_recency WHERE user_id IS NOT NULL "
+                "GROUP BY user_id HAVING COUNT(*) > ?",
+                (max_count,)
+            ).fetchall()
+            sessions = self._conn.execute(
+                "SELECT session_id, COUNT(*) FROM memory_recency WHERE user_id IS NULL AND session_id IS NOT NULL "
+                "GROUP BY session_id HAVING COUNT(*) > ?",
+                (max_count,)
+            ).fetchall()
+        return (
+            [("user_id", value, count - max_count) for value, count in users]
+            + [("session_id", value, count - max_count) for value, count in sessions]
+        )
+
+    def eviction_candidates(self, column: str, value: str, limit: int, policy: str = "lru") -> List[str]:
+        """
+        按淘汰策略返回作用域内最应淘汰的记忆ID
+
+        Args:
+            column: 作用域列名（user_id / session_id）
+            value: 作用域值
+            limit: 返回数量
+            policy: lru（最久未被检索命中）或 lfu（命中次数最少，次数相同按最久未命中）
+        """
+        if column not in ("user_id", "session_id"):
+            raise ValueError(f"未知的作用域列: {column}")
+        order = "COALESCE(last_access, timestamp)"
+        if policy == "lfu":
+            order = f"hit_count, {order}"
+        scope = "user_id = ?" if column == "user_id" else "user_id IS NULL AND session_id = ?"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM memory_recency WHERE {scope} ORDER BY {order} LIMIT ?",
+                (value, max(0, limit))
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,214 @@
+"""
+语义响应缓存
+按查询向量的余弦相似度复用之前生成的回答，相近的问题（FAQ、重复的测试问题）不再重新调用 LLM：
+1. 查询向量复用记忆模块的嵌入服务，记忆检索已经嵌入过的查询不会重复计算
+2. 按会话（或用户）隔离，也可以全局共享
+3. 条目有存活时间，超过容量时淘汰最久未命中的条目
+由调用方决定哪些请求可以使用缓存（联网搜索、文件操作、计算不走缓存）。
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CacheScope:
+    """缓存隔离范围"""
+    SESSION = "session"  # 按会话 / 用户隔离
+    GLOBAL = "global"    # 所有会话共享
+
+
+class _ScopeEntries:
+    """
+    单个隔离范围内的缓存条目
+
+    lookup 使用堆叠后的向量矩阵，只在条目变化后重建一次，而不是每次查找都重新堆叠。
+    """
+
+    __slots__ = ("entries", "queries", "matrix", "expires")
+
+    def __init__(self):
+        # 规范化后的查询 -> (归一化查询向量, 回答, 过期时间)
+        self.entries: Dict[str, Tuple[np.ndarray, str, float]] = {}
+        self.queries: List[str] = []
+        self.matrix: Optional[np.ndarray] = None
+        self.expires: Optional[np.ndarray] = None
+
+    def invalidate(self) -> None:
+        self.matrix = None
+
+    def stacked(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        if self.matrix is None:
+            self.queries = list(self.entries)
+            self.matrix = np.stack([self.entries[query][0] for query in self.queries])
+            self.expires = np.array([self.entries[query][2] for query in self.queries])
+        return self.queries, self.matrix, self.expires
+
+
+class SemanticResponseCache:
+    """
+    基于查询向量相似度的响应缓存
+
+    lookup 返回相似度不低于 threshold 的最相近条目的回答，store 写入新回答。
+    条目按隔离范围分组，每个范围缓存自己的向量矩阵；容量和 LRU 顺序在所有范围间共享。
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        threshold: float = 0.95,
+        ttl: Optional[float] = 3600.0,
+        maxsize: int = 1000,
+        scope: str = CacheScope.SESSION
+    ):
+        """
+        初始化语义响应缓存
+
+        Args:
+            embeddings: 嵌入模型（通常为 MemoryStore.embeddings）
+            threshold: 命中所需的最低余弦相似度
+            ttl: 条目存活时间（秒），None 表示永不过期
+            maxsize: 最大条目数
+            scope: 隔离范围（session / global）
+        """
+        if scope not in (CacheScope.SESSION, CacheScope.GLOBAL):
+            raise ValueError(f"未知的缓存范围: {scope}")
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.scope = scope
+        self.ttl = ttl
+        self.maxsize = max(1, maxsize)
+        self._scopes: Dict[str, _ScopeEntries] = {}
+        # 所有条目的 LRU 顺序，键: (范围, 规范化后的查询)
+        self._lru: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _scope_key(self, session_id: Optional[str], user_id: Optional[str]) -> str:
+        """与记忆命名空间一致：指定用户时按用户，否则按会话（None / default 为全局会话）"""
+        if self.scope == CacheScope.GLOBAL:
+            return "*"
+        if user_id:
+            return f"user:{user_id}"
+        return f"session:{session_id or 'default'}"
+
+    def _embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _count(self, hit: bool) -> None:
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _remove(self, scope: str, query: str) -> None:
+        """删除一个条目（调用方持有 _lock）"""
+        self._lru.pop((scope, query), None)
+        entries = self._scopes.get(scope)
+        if entries is None or entries.entries.pop(query, None) is None:
+            return
+        if entries.entries:
+            entries.invalidate()
+        else:
+            del self._scopes[scope]
+
+    def lookup(
+        self,
+        query: str,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> Optional[Tuple[str, float]]:
+        """
+        查找相近问题的缓存回答
+
+        Returns:
+            (回答, 相似度)；未命中时返回 None
+        """
+        query = query.strip()
+        scope = self._scope_key(session_id, user_id)
+        if not query or scope not in self._scopes:
+            self._count(False)
+            return None
+
+        vector = self._embed(query)
+        with self._lock:
+            entries = self._scopes.get(scope)
+            if entries is not None:
+                queries, matrix, expires = entries.stacked()
+                now = time.monotonic()
+                expired = expires <= now
+                if expired.any():
+                    for index in np.flatnonzero(expired):
+                        self._remove(scope, queries[index])
+                    entries = self._scopes.get(scope)
+            if entries is None:
+                self._count(False)
+                return None
+            queries, matrix, _ = entries.stacked()
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+            if score < self.threshold:
+                self._count(False)
+                return None
+            self._lru.move_to_end((scope, queries[best]))  # 刷新 LRU 顺序
+            response = entries.entries[queries[best]][1]
+
+        self._count(True)
+        return response, score
+
+    def store(
+        self,
+        query: str,
+        response: str,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> None:
+        """写入回答（空问题或空回答不缓存），超过容量时淘汰最久未命中的条目"""
+        query = query.strip()
+        if not query or not response:
+            return
+        scope = self._scope_key(session_id, user_id)
+        vector = self._embed(query)
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            entries = self._scopes.get(scope)
+            if entries is None:
+                entries = self._scopes[scope] = _ScopeEntries()
+            entries.entries[query] = (vector, response, expires_at)
+            entries.invalidate()
+            self._lru[(scope, query)] = None
+            self._lru.move_to_end((scope, query))
+            while len(self._lru) > self.maxsize:
+                oldest_scope, oldest_query = next(iter(self._lru))
+                self._remove(oldest_scope, oldest_query)
+
+    def clear(self) -> None:
+        """清空缓存（记忆被清除后，依赖旧记忆生成的回答不再可用）"""
+        with self._lock:
+            self._scopes.clear()
+            self._lru.clear()
+
+    def get_stats(self) -> Dict:
+        """缓存条目数和命中率"""
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "scope": self.scope,
+            "threshold": self.threshold,
+            "ttl": self.ttl,
+            "size": len(self._lru),
+            "maxsize": self.maxsize,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0
+        }
@@ -0,0 +1,78 @@
+"""ContextAssembler 单元测试"""
+
+import sys
+
+import pytest
+
+from context_assembler import ContextAssembler, TokenCounter, _TRUNCATED
+
+
+@pytest.fixture
+def counter(monkeypatch):
+    # 屏蔽 tiktoken，使用确定的估算计数：CJK 字符 1 token，其余 4 个字符 1 token
+    monkeypatch.setitem(sys.modules, "tiktoken", None)
+    return TokenCounter()
+
+
+def assembler(counter, budget, min_item_tokens=5):
+    return ContextAssembler(counter=counter, budgets={"memory": budget}, min_item_tokens=min_item_tokens)
+
+
+def test_items_within_budget_are_kept_in_order(counter):
+    result = assembler(counter, 20).fit_items("memory", [("一二三\n", "a"), ("四五六\n", "b")], header="记忆：\n")
+
+    assert result == "记忆：\n一二三\n四五六\n"
+
+
+def test_header_counts_against_budget_and_tail_is_dropped(counter):
+    items = [("一二三四五六", None), ("七八九十", None)]
+
+    assert assembler(counter, 10).fit_items("memory", items) == "一二三四五六七八九十"
+    assert assembler(counter, 9).fit_items("memory", items) == "一二三四五六"
+    # 标题占用 3 token 后第一条仍可放下，第二条剩余预算不足 min_item_tokens
+    assert assembler(counter, 10).fit_items("memory", items, header="标题：") == "标题：一二三四五六"
+    assert assembler(counter, 5).fit_items("memory", items, header="标题：") == ""
+
+
+def test_item_crossing_budget_is_truncated(counter):
+    marker = counter.count(_TRUNCATED)
+    items = [("甲" * 10, None), ("乙" * 20 + "\n", None), ("丙" * 5, None)]
+
+    result = assembler(counter, 10 + marker + 4).fit_items("memory", items)
+
+    assert result == "甲" * 10 + "乙" * 4 + _TRUNCATED + "\n"
+
+
+def test_empty_items_and_unknown_source(counter):
+    context = assembler(counter, 10)
+
+    assert context.fit_items("memory", []) == ""
+    assert context.fit_items("search", [("一二三四五六", None)]) == ""
+
+
+def test_item_token_counts_are_cached_by_key(counter):
+    context = assembler(counter, 100)
+    context.fit_items("memory", [("一二三", "m1"), ("四五", None)])
+    context.fit_items("memory", [("一二三", "m1")])
+
+    stats = counter.stats()
+    assert stats["encoding"] == "estimate"
+    assert stats["cache"]["size"] == 1
+    assert stats["cache"]["hits"] == 1
+
+
+def test_fit_text_keeps_head(counter):
+    marker = counter.count(_TRUNCATED)
+    context = ContextAssembler(counter=counter, budgets={"file": marker + 3})
+
+    assert context.fit_text("file", "短文") == "短文"
+    assert context.fit_text("file", "一二三四五六七八九十") == "一二三" + _TRUNCATED
+
+
+def test_default_budgets_read_environment(counter, monkeypatch):
+    monkeypatch.setenv("CONTEXT_MEMORY_TOKENS", "123")
+
+    budgets = ContextAssembler(counter=counter).budgets
+
+    assert budgets["memory"] == 123
+    assert budgets["file"] == 4000
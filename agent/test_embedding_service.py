@@ -0,0 +1,61 @@
+"""EmbeddingService 单元测试"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from embedding_service import EmbeddingService
+
+
+def test_query_cache_skips_recomputation(embeddings):
+    service = EmbeddingService(embeddings, max_wait_ms=0)
+
+    first = service.embed_query("你好  世界")
+    second = service.embed_query(" 你好 世界 ")
+
+    assert first == second
+    assert embeddings.calls == 1
+    assert service.get_stats()["query_cache"]["hits"] == 1
+
+
+def test_concurrent_requests_share_a_batch(embeddings):
+    service = EmbeddingService(embeddings, max_wait_ms=200)
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda text: service.embed_documents([text]), ["a", "b", "c", "a"]))
+    finally:
+        service.close()
+
+    assert results[0] == results[3]
+    assert embeddings.calls < 4
+    assert service.get_stats()["avg_requests_per_batch"] > 1
+
+
+def test_encode_after_close_raises_instead_of_blocking(embeddings):
+    service = EmbeddingService(embeddings, max_wait_ms=5)
+    service.close()
+
+    result = {}
+
+    def call():
+        try:
+            service.embed_documents(["迟到的请求"])
+        except RuntimeError as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=call, daemon=True)
+    thread.start()
+    thread.join(timeout=2)
+
+    assert not thread.is_alive()
+    assert isinstance(result.get("error"), RuntimeError)
+
+
+def test_close_is_idempotent_without_batching(embeddings):
+    service = EmbeddingService(embeddings, max_wait_ms=0)
+    service.close()
+    service.close()
+
+    with pytest.raises(RuntimeError):
+        service.embed_query("x")
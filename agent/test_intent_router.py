@@ -0,0 +1,90 @@
+"""IntentRouter 单元测试"""
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from intent_router import IntentRouter, IntentTier
+
+
+class KeywordEmbeddings(Embeddings):
+    """按关键词出现与否生成向量"""
+    KEYWORDS = ("天气", "文件", "算", "聊")
+
+    def __init__(self):
+        self.calls = 0
+
+    def _vector(self, text):
+        return [1.0 if keyword in text else 0.0 for keyword in self.KEYWORDS] + [0.01]
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+EXAMPLES = {
+    "search": ["天气预报", "明天天气"],
+    "file": ["打开文件", "文件列表"],
+    "calculate": ["算数", "帮我算"],
+    "chat": ["聊天", "随便聊聊"],
+}
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("今天北京天气怎么样", "search"),
+    ("最近的新闻有哪些", "search"),
+    ("读取 notes.txt 的内容", "file"),
+    ("列出工作区里的所有文件", "file"),
+    ("(3+5)*12", "calculate"),
+    ("123 乘以 456 等于多少", "calculate"),
+    ("你好！", "chat"),
+    ("thanks", "chat"),
+])
+def test_rule_tier_decides_single_match(text, intent):
+    decision = IntentRouter(rule_confidence=0.9).classify(text)
+
+    assert decision.intent == intent
+    assert decision.tier == IntentTier.RULE
+    assert decision.confidence == 0.9
+
+
+def test_empty_input_is_chat():
+    decision = IntentRouter().classify("   ")
+
+    assert decision.intent == "chat"
+    assert decision.tier == IntentTier.RULE
+
+
+def test_without_embeddings_unmatched_or_ambiguous_input_defers():
+    router = IntentRouter()
+
+    assert router.classify("给我讲个笑话") is None
+    # 同时命中 search 与 file 规则
+    assert router.classify("搜一下 report.md 文件") is None
+
+
+def test_embedding_tier_only_compares_matched_intents():
+    embeddings = KeywordEmbeddings()
+    router = IntentRouter(embeddings, min_confidence=0.5, min_margin=0.1, examples=EXAMPLES)
+
+    decision = router.classify("最新天气保存到 weather.txt")
+    assert decision.intent == "search"
+    assert decision.tier == IntentTier.EMBEDDING
+
+    assert router.classify("陪我聊聊").intent == "chat"
+    assert router.classify("随便说点什么") is None
+    assert embeddings.calls == len(EXAMPLES)
+
+
+def test_stats_report_local_rate():
+    router = IntentRouter()
+    for tier in (IntentTier.RULE, IntentTier.EMBEDDING, IntentTier.LLM, IntentTier.RULE):
+        router.record(tier)
+
+    stats = router.get_stats()
+
+    assert stats["tiers"] == {IntentTier.RULE: 2, IntentTier.EMBEDDING: 1, IntentTier.LLM: 1}
+    assert stats["total"] == 4
+    assert stats["local_rate"] == 0.75
@@ -0,0 +1,69 @@
+"""BM25 词法索引单元测试"""
+
+import pytest
+
+from lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_splits_cjk_into_bigrams_and_keeps_words():
+    assert tokenize("张三生日是2024-03-05") == ["张三", "三生", "生日", "日是", "2024-03-05"]
+    assert tokenize("Hello, 我 API v1.2") == ["hello", "我", "api", "v1.2"]
+    assert tokenize("") == []
+    assert tokenize(None) == []
+
+
+@pytest.fixture
+def index():
+    index = BM25Index()
+    index.add(
+        ["a", "b", "c", "d"],
+        ["张三的生日是三月五日", "李四喜欢喝咖啡", "张三喜欢爬山", "张三住在北京"],
+        [
+            {"type": "conversation", "session_id": "s1", "user_id": "u1"},
+            {"type": "conversation", "session_id": "s1", "user_id": "u1"},
+            {"type": "fact", "session_id": "s2", "user_id": "u1"},
+            {"type": "conversation", "session_id": "s2", "user_id": "u2"},
+        ],
+    )
+    return index
+
+
+def test_search_ranks_exact_terms(index):
+    results = index.search("张三的生日", k=2)
+
+    assert [doc_id for doc_id, _ in results][0] == "a"
+    assert len(results) == 2
+    assert results[0][1] > results[1][1]
+
+
+def test_search_filters_by_type_and_session(index):
+    assert {doc_id for doc_id, _ in index.search("张三", memory_type="fact")} == {"c"}
+    assert {doc_id for doc_id, _ in index.search("张三", session_id="s2")} == {"c", "d"}
+
+
+def test_user_id_takes_precedence_over_session(index):
+    results = index.search("张三", session_id="s1", user_id="u1")
+
+    assert {doc_id for doc_id, _ in results} == {"a", "c"}
+
+
+def test_add_overwrites_and_remove_drops_documents(index):
+    index.add(["a"], ["王五的生日"], [{"type": "conversation"}])
+    assert "a" not in {doc_id for doc_id, _ in index.search("张三")}
+    assert index.search("王五")[0][0] == "a"
+
+    index.remove(["a", "missing"])
+    assert index.search("王五") == []
+    assert len(index) == 3
+
+    index.clear()
+    assert len(index) == 0
+    assert index.search("张三") == []
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "d"]], k=1)
+
+    assert [doc_id for doc_id, _ in fused] == ["b", "c", "a", "d"]
+    assert fused[0][1] == pytest.approx(1 / 3 + 1 / 2)
+    assert fused[-1][1] == pytest.approx(1 / 4)
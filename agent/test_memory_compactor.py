@@ -0,0 +1,170 @@
+"""MemoryCompactor 单元测试（真实 Chroma 集合）"""
+
+from datetime import datetime, timedelta
+
+from langchain_core.language_models import FakeListChatModel
+
+from memory_compactor import MemoryCompactor
+
+
+OLD = (datetime.now() - timedelta(days=30)).isoformat()
+
+
+def make_compactor(memory_store, responses=("用户喜欢喝咖啡",)):
+    return MemoryCompactor(
+        memory_store,
+        FakeListChatModel(responses=list(responses)),
+        similarity_threshold=0.5,
+        pause_seconds=0
+    )
+
+
+def add_old_conversations(memory_store, count=3, user_id="u1"):
+    return [
+        memory_store.add_memory(f"我喜欢喝咖啡{i}", f"好的，记住了{i}", {"timestamp": OLD}, user_id=user_id)
+        for i in range(count)
+    ]
+
+
+def test_purge_ignores_records_without_tombstone(memory_store):
+    collection = memory_store.vectorstore._collection
+    plain = memory_store.add_fact("没有墓碑字段的记忆")
+    summary_id = memory_store.add_summary("摘要", ["x"])
+    marked = memory_store.add_fact("已被摘要替代的记忆")
+    legacy = memory_store.add_fact("旧版本写入的空墓碑")
+    for memory_id, metadata in ((marked, {"tombstoned": True, "tombstone": summary_id}),
+                                (legacy, {"tombstone": ""})):
+        current = collection.get(ids=[memory_id])["metadatas"][0]
+        collection.update(ids=[memory_id], metadatas=[{**current, **metadata}])
+
+    report = make_compactor(memory_store).run()
+
+    remaining = set(collection.get(include=[])["ids"])
+    assert report.purged_tombstones == 1
+    assert marked not in remaining
+    assert {plain, summary_id, legacy} <= remaining
+
+
+def test_purge_restores_tombstones_without_summary(memory_store):
+    collection = memory_store.vectorstore._collection
+    memory_id = memory_store.add_fact("摘要写入前中断")
+    current = collection.get(ids=[memory_id])["metadatas"][0]
+    collection.update(ids=[memory_id], metadatas=[{**current, "tombstoned": True, "tombstone": "missing"}])
+
+    report = make_compactor(memory_store).run()
+
+    metadata = collection.get(ids=[memory_id])["metadatas"][0]
+    assert report.purged_tombstones == 0
+    assert metadata["tombstoned"] is False
+    assert metadata["tombstone"] == ""
+
+
+def test_run_replaces_cluster_with_summary(memory_store):
+    ids = add_old_conversations(memory_store)
+    memory_store.add_memory("最近的对话", "不应被压缩", user_id="u1")
+
+    report = make_compactor(memory_store).run()
+
+    assert report.summarized == 1
+    assert report.deleted == 3
+    assert memory_store.get_memories_by_ids(ids) == []
+    summaries = memory_store.get_recent_memories(memory_type="summary", user_id="u1")
+    assert [memory["content"] for memory in summaries] == ["用户喜欢喝咖啡"]
+    assert memory_store.get_memory_count() == 2
+
+
+def test_dry_run_does_not_modify(memory_store):
+    ids = add_old_conversations(memory_store)
+
+    report = make_compactor(memory_store).plan()
+
+    assert len(report.clusters) == 1
+    assert sorted(report.clusters[0]["ids"]) == sorted(ids)
+    assert report.deleted == 0
+    assert len(memory_store.get_memories_by_ids(ids)) == 3
+
+
+def test_run_rebuilds_incomplete_index(memory_store):
+    ids = add_old_conversations(memory_store)
+    # 模拟升级前的数据：时间索引中没有这些记忆
+    memory_store.recency_index.remove(ids)
+    memory_store._index_ready = False
+
+    report = make_compactor(memory_store).run()
+
+    assert report.scanned == 3
+    assert report.summarized == 1
+
+
+def test_scan_cursor_moves_past_unclustered_groups(memory_store):
+    # 前三个用户各只有一条旧记忆，正好占满扫描窗口
+    for user_id in ("a1", "a2", "a3"):
+        memory_store.add_memory("孤立的旧对话", "无法成簇", {"timestamp": OLD}, user_id=user_id)
+    ids = add_old_conversations(memory_store, user_id="u9")
+    compactor = make_compactor(memory_store)
+    compactor.max_scan = 3
+    cursor = memory_store.recency_index.get_cursor
+
+    first = compactor.run()
+    assert first.scanned == 3 and first.summarized == 0
+    # 窗口已满，最后一组（a3）可能不完整，游标停在 a2
+    assert cursor(MemoryCompactor.CURSOR_NAME)[0] == "a2"
+
+    assert compactor.run().summarized == 0
+    assert cursor(MemoryCompactor.CURSOR_NAME)[0] == "a3"
+
+    third = compactor.run()
+    assert third.summarized == 1
+    assert memory_store.get_memories_by_ids(ids) == []
+
+    # 扫描到末尾后游标归零
+    compactor.run()
+    assert cursor(MemoryCompactor.CURSOR_NAME) is None
+
+
+def test_dry_run_does_not_move_cursor(memory_store):
+    for user_id in ("a1", "a2", "a3"):
+        memory_store.add_memory("孤立的旧对话", "无法成簇", {"timestamp": OLD}, user_id=user_id)
+    compactor = make_compactor(memory_store)
+    compactor.max_scan = 2
+
+    compactor.plan()
+
+    assert memory_store.recency_index.get_cursor(MemoryCompactor.CURSOR_NAME) is None
+
+
+def test_interrupted_cluster_is_hidden_until_restored(memory_store, monkeypatch):
+    ids = add_old_conversations(memory_store)
+    compactor = make_compactor(memory_store, responses=("用户喜欢喝咖啡",) * 2)
+    add_summary = memory_store.add_summary
+    crashed = [True]
+
+    def flaky_add_summary(*args, **kwargs):
+        if crashed[0]:
+            raise RuntimeError("写入摘要前进程退出")
+        return add_summary(*args, **kwargs)
+
+    monkeypatch.setattr(memory_store, "add_summary", flaky_add_summary)
+    report = compactor.run()
+    assert report.errors and report.summarized == 0
+
+    def found(mode):
+        results = memory_store.search_memories("我喜欢喝咖啡", n_results=5, mode=mode, user_id="u1")
+        return {memory["id"] for memory in results}
+
+    # 墓碑记忆既不出现在向量检索中，也不在词法索引里（包括重建后的词法索引）
+    assert found("vector") == set()
+    assert found("hybrid") == set()
+    memory_store._lexical_ready = False
+    assert found("hybrid") == set()
+
+    # 下次运行发现摘要不存在，恢复原始记忆（本次不压缩）
+    crashed[0] = False
+    compactor.max_clusters = 0
+    assert compactor.run().purged_tombstones == 0
+    assert found("vector") == set(ids)
+    assert found("hybrid") == set(ids)
+
+    compactor.max_clusters = 50
+    assert compactor.run().summarized == 1
+    assert memory_store.get_memories_by_ids(ids) == []
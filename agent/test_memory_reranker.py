@@ -0,0 +1,65 @@
+"""MemoryReranker 单元测试"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from memory_reranker import MemoryReranker
+
+
+NOW = datetime(2024, 6, 1, 12, 0, 0)
+
+
+def memory(content, memory_type="conversation", days_ago=None):
+    metadata = {"type": memory_type}
+    if days_ago is not None:
+        metadata["timestamp"] = (NOW - timedelta(days=days_ago)).isoformat()
+    return {"content": content, "metadata": metadata}
+
+
+def ids(results):
+    return [result["content"] for result in results]
+
+
+def test_mmr_skips_near_duplicates():
+    memories = [memory("a"), memory("a2"), memory("b")]
+    vectors = [[1.0, 0.0], [1.0, 0.01], [0.7, 0.7]]
+
+    greedy = MemoryReranker(mmr_lambda=1.0).rerank([1.0, 0.0], memories, vectors, k=2, now=NOW)
+    diverse = MemoryReranker(mmr_lambda=0.5).rerank([1.0, 0.0], memories, vectors, k=2, now=NOW)
+
+    assert ids(greedy) == ["a", "a2"]
+    assert ids(diverse) == ["a", "b"]
+
+
+def test_recency_and_type_weights_break_ties():
+    reranker = MemoryReranker(mmr_lambda=1.0)
+    vectors = [[1.0, 0.0]] * 3
+
+    by_age = reranker.rerank([1.0, 0.0], [memory("old", days_ago=90), memory("new", days_ago=1)],
+                             vectors[:2], k=2, now=NOW)
+    by_type = reranker.rerank([1.0, 0.0], [memory("chat"), memory("fact", memory_type="fact")],
+                              vectors[:2], k=2, now=NOW)
+
+    assert ids(by_age) == ["new", "old"]
+    assert by_age[0]["recency"] == pytest.approx(0.5 ** (1 / 30))
+    assert ids(by_type) == ["fact", "chat"]
+
+
+def test_min_relevance_drops_candidates_and_reports_scores():
+    reranker = MemoryReranker(min_relevance=0.5, mmr_lambda=1.0)
+    memories = [memory("match", days_ago=0), memory("unrelated", days_ago=0)]
+
+    results = reranker.rerank([1.0, 0.0], memories, [[2.0, 0.0], [0.0, 1.0]], k=5, now=NOW)
+
+    assert ids(results) == ["match"]
+    assert results[0]["relevance"] == pytest.approx(1.0)
+    assert results[0]["rerank_score"] == pytest.approx(1.0)
+    assert "rerank_score" not in memories[0]
+
+
+def test_empty_inputs_return_nothing():
+    reranker = MemoryReranker()
+
+    assert reranker.rerank([1.0, 0.0], [], [], k=3) == []
+    assert reranker.rerank([1.0, 0.0], [memory("a")], [[1.0, 0.0]], k=0) == []
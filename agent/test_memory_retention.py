@@ -0,0 +1,110 @@
+"""RetentionSweeper 单元测试（真实 Chroma 集合）"""
+
+from datetime import datetime, timedelta
+
+from memory_retention import RetentionPolicy, RetentionSweeper
+
+
+def days_ago(days):
+    return (datetime.now() - timedelta(days=days)).isoformat()
+
+
+def remaining(memory_store):
+    return set(memory_store.vectorstore._collection.get(include=[])["ids"])
+
+
+def sweep(memory_store, **policy):
+    return RetentionSweeper(memory_store, RetentionPolicy(**policy), pause_seconds=0).run()
+
+
+def test_expires_by_type_age(memory_store):
+    memory_store.add_memory("旧问题", "旧回答", {"timestamp": days_ago(40)})
+    new_chat = memory_store.add_memory("新问题", "新回答", {"timestamp": days_ago(5)})
+    old_fact = memory_store.add_fact("很久以前的事实")
+    memory_store.vectorstore._collection.update(
+        ids=[old_fact], metadatas=[{"type": "fact", "fact": "很久以前的事实", "timestamp": days_ago(400)}]
+    )
+
+    result = sweep(memory_store, max_age_days={"conversation": 30})
+
+    assert result["expired"] == 1
+    assert remaining(memory_store) == {new_chat, old_fact}
+    assert memory_store.get_memory_count() == 2
+    assert memory_store.recency_index.count() == 2
+
+
+def test_disabled_policy_only_flushes_hits(memory_store):
+    memory_id = memory_store.add_fact("事实")
+    memory_store.record_hits([memory_id])
+
+    result = sweep(memory_store)
+
+    assert result == {"hits_flushed": 1, "expired": 0, "evicted": 0}
+    assert memory_store.get_memories_by_ids([memory_id])[0]["metadata"]["hit_count"] == 1
+
+
+def add_scoped(memory_store, user_id, timestamps, **extra):
+    return [
+        memory_store.add_memory(f"问题{i}", f"回答{i}", {"timestamp": timestamp, **extra}, user_id=user_id)
+        for i, timestamp in enumerate(timestamps)
+    ]
+
+
+def test_lru_counts_pending_hits_before_selecting(memory_store):
+    oldest, middle, newest = add_scoped(memory_store, "u1", ["2024-01-01", "2024-01-02", "2024-01-03"])
+    # 尚未写回的命中：若不先 flush_hits，最旧的记忆会被淘汰
+    memory_store.record_hits([oldest])
+
+    result = sweep(memory_store, max_per_scope=2, eviction="lru")
+
+    assert result["hits_flushed"] == 1
+    assert result["evicted"] == 1
+    assert remaining(memory_store) == {oldest, newest}
+
+
+def test_lfu_evicts_least_hit(memory_store):
+    frequent = add_scoped(memory_store, "u1", ["2024-01-01"], hit_count=5, last_hit_at="2024-01-02")[0]
+    never, recent = add_scoped(memory_store, "u1", ["2024-01-03", "2024-01-04"])
+    memory_store.record_hits([recent])
+    memory_store.flush_hits()
+    # LRU 会淘汰命中多但最久未命中的记忆，LFU 淘汰从未命中的
+    assert memory_store.recency_index.eviction_candidates("user_id", "u1", 1, "lru") == [frequent]
+
+    result = sweep(memory_store, max_per_scope=2, eviction="lfu")
+
+    assert result["evicted"] == 1
+    assert remaining(memory_store) == {frequent, recent}
+
+
+def test_capacity_cap_per_scope_with_sweep_budget(memory_store):
+    user_ids = add_scoped(memory_store, "u1", [f"2024-01-0{i}" for i in range(1, 6)])
+    session_ids = [
+        memory_store.add_memory(f"会话问题{i}", "回答", {"timestamp": f"2024-02-0{i}"}, session_id="s1")
+        for i in range(1, 4)
+    ]
+    global_ids = [memory_store.add_memory(f"全局{i}", "回答", {"timestamp": "2024-03-01"}) for i in range(4)]
+
+    # 每轮最多删除 2 条，分两轮完成
+    first = sweep(memory_store, max_per_scope=2, max_deletes_per_sweep=2, batch_size=1)
+    assert first["evicted"] == 2
+    second = sweep(memory_store, max_per_scope=2, max_deletes_per_sweep=2, batch_size=1)
+    assert second["evicted"] == 2
+
+    assert remaining(memory_store) == set(user_ids[3:]) | set(session_ids[1:]) | set(global_ids)
+    assert memory_store.recency_index.over_capacity(2) == []
+    assert sweep(memory_store, max_per_scope=2)["evicted"] == 0
+    assert memory_store.get_memory_count() == 8
+
+
+def test_policy_from_env(monkeypatch):
+    monkeypatch.setenv("MEMORY_MAX_PER_SCOPE", "50")
+    monkeypatch.setenv("MEMORY_MAX_AGE_DAYS", "conversation:180, summary:365")
+    monkeypatch.setenv("MEMORY_EVICTION", "LFU")
+
+    policy = RetentionPolicy.from_env()
+
+    assert policy.max_per_scope == 50
+    assert policy.max_age_days == {"conversation": 180.0, "summary": 365.0}
+    assert policy.eviction == "lfu"
+    assert policy.enabled
+    assert not RetentionPolicy().enabled
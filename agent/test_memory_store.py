@@ -0,0 +1,159 @@
+"""MemoryStore 单元测试（真实 Chroma 集合 + 本地字符嵌入）"""
+
+import gzip
+import json
+import time
+
+import pytest
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def test_queued_writes_are_visible_to_next_read(store_factory, embeddings):
+    store = store_factory(write_behind=True, flush_batch_size=100, flush_interval=60)
+    ids = [store.queue_memory(f"第{i}个问题", f"第{i}个回答", session_id="s1") for i in range(3)]
+
+    assert store.pending_count() == 3
+    assert store.get_memory_count() == 0
+    assert store.get_stats()["pending_writes"] == 3
+
+    calls = embeddings.calls
+    results = store.search_memories("第1个问题", n_results=3, session_id="s1")
+
+    assert {memory["id"] for memory in results} == set(ids)
+    assert store.pending_count() == 0
+    assert store.get_memory_count() == 3
+    # 整批只调用一次 embed_documents，另一次是查询嵌入
+    assert embeddings.calls - calls == 2
+
+
+def test_queued_ids_are_readable_by_id_and_recent(store_factory):
+    store = store_factory(write_behind=True, flush_batch_size=100, flush_interval=60)
+    memory_id = store.queue_memory("问题", "回答", user_id="u1")
+
+    assert [memory["id"] for memory in store.get_memories_by_ids([memory_id])] == [memory_id]
+    store.queue_memory("第二个问题", "第二个回答", user_id="u1")
+    assert len(store.get_recent_memories(10, user_id="u1")) == 2
+
+
+def test_background_flush_on_batch_size(store_factory):
+    store = store_factory(write_behind=True, flush_batch_size=2, flush_interval=60)
+    store.queue_memory("问题1", "回答1")
+    store.queue_memory("问题2", "回答2")
+
+    assert wait_until(lambda: store.get_memory_count() == 2)
+    assert store.pending_count() == 0
+
+
+def test_background_flush_on_interval(store_factory):
+    store = store_factory(write_behind=True, flush_batch_size=100, flush_interval=0.05)
+    store.queue_memory("问题", "回答")
+
+    assert wait_until(lambda: store.get_memory_count() == 1)
+    assert store.pending_count() == 0
+
+
+def test_close_drains_pending_writes(store_factory):
+    store = store_factory(write_behind=True, flush_batch_size=100, flush_interval=60)
+    ids = [store.queue_memory(f"问题{i}", f"回答{i}") for i in range(3)]
+
+    store.close()
+
+    assert store.pending_count() == 0
+    assert not store._flusher.is_alive()
+    reopened = store_factory()
+    assert reopened.get_memory_count() == 3
+    assert {memory["id"] for memory in reopened.get_memories_by_ids(ids)} == set(ids)
+
+
+def test_failed_flush_keeps_pending_writes(store_factory, monkeypatch):
+    store = store_factory(write_behind=True, flush_batch_size=100, flush_interval=60)
+    store.queue_memory("问题", "回答")
+    write_documents = store._write_documents
+    offline = [True]
+
+    def flaky(docs, ids=None):
+        if offline[0]:
+            raise RuntimeError("chroma offline")
+        return write_documents(docs, ids)
+
+    monkeypatch.setattr(store, "_write_documents", flaky)
+    assert store.flush() == 0
+    assert store.pending_count() == 1
+    assert store.get_memory_count() == 0
+
+    offline[0] = False
+    assert store.flush() == 1
+    assert store.get_memory_count() == 1
+
+
+def snapshot(store):
+    data = store.vectorstore._collection.get(include=["documents", "metadatas", "embeddings"])
+    return {
+        memory_id: (content, metadata, [round(float(x), 5) for x in vector])
+        for memory_id, content, metadata, vector in zip(
+            data["ids"], data["documents"], data["metadatas"], data["embeddings"]
+        )
+    }
+
+
+@pytest.mark.parametrize("filename, compress", [
+    ("backup.jsonl", None),
+    ("backup.jsonl.gz", None),
+    # 没有 .gz 后缀但要求压缩：导入时按文件头识别
+    ("backup.jsonl", True),
+])
+@pytest.mark.parametrize("include_embeddings", [False, True])
+def test_export_import_round_trip(store_factory, embeddings, tmp_path, filename, compress, include_embeddings):
+    source = store_factory()
+    source.add_memory("我叫小明", "你好小明", user_id="u1")
+    source.add_fact("小明住在北京", category="profile", user_id="u1")
+    source.add_summary("小明喜欢喝咖啡", ["a", "b"], session_id="s1")
+    path = str(tmp_path / filename)
+
+    assert source.export_memories(path, include_embeddings=include_embeddings, compress=compress, page_size=2)
+    with open(path, "rb") as f:
+        assert (f.read(2) == b"\x1f\x8b") == bool(compress or filename.endswith(".gz"))
+
+    target = store_factory(persist_directory=str(tmp_path / "restored"))
+    calls = embeddings.calls
+    assert target.import_memories(path, batch_size=2) == 3
+
+    # 带向量导入时不再重新嵌入
+    assert (embeddings.calls == calls) == include_embeddings
+    assert target.get_memory_count() == 3
+    assert snapshot(target) == snapshot(source)
+    assert [m["content"] for m in target.get_recent_memories(10, user_id="u1")] == [
+        "小明住在北京", "用户: 我叫小明\n助手: 你好小明"
+    ]
+    assert target.search_memories("咖啡", n_results=1, mode="hybrid")[0]["content"] == "小明喜欢喝咖啡"
+
+
+def test_import_reads_legacy_json_array(store_factory, tmp_path):
+    path = tmp_path / "legacy.json"
+    path.write_text(json.dumps([
+        {"id": "m1", "content": "旧格式记忆", "metadata": {"type": "fact", "timestamp": "2024-01-01T00:00:00"}}
+    ], ensure_ascii=False, indent=2), encoding="utf-8")
+
+    store = store_factory()
+
+    assert store.import_memories(str(path)) == 1
+    assert store.get_memories_by_ids(["m1"])[0]["content"] == "旧格式记忆"
+
+
+def test_import_reports_corrupt_gzip(store_factory, tmp_path):
+    path = tmp_path / "broken.jsonl"
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write('{"id": "m1", "content": "完整的一行", "metadata": {"type": "fact"}}\n{"id": "m2", "con')
+
+    store = store_factory()
+
+    assert store.import_memories(str(path), batch_size=1) == 1
+    assert store.get_memory_count() == 1
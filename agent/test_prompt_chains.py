@@ -0,0 +1,33 @@
+"""prompt_chains 单元测试"""
+
+from langchain_core.language_models import FakeListChatModel
+
+from prompt_chains import ChainRegistry, load_prompts
+
+
+def test_load_prompts_falls_back_on_missing_or_malformed_file(tmp_path):
+    broken = tmp_path / "prompts.json"
+    broken.write_text("{not json", encoding="utf-8")
+
+    assert "chat" in load_prompts(str(broken))
+    assert "chat" in load_prompts(str(tmp_path / "missing.json"))
+
+
+def test_summarize_template_without_length_placeholder_keeps_requirement():
+    chains = ChainRegistry(FakeListChatModel(responses=["ok"]), {
+        "summarize": {"system_prompt": "总结助手", "user_template": "请总结：{text}"}
+    })
+
+    prompt = chains["summarize"].first.invoke({"text": "正文", "length_requirement": "\n不超过10字"})
+
+    assert prompt.messages[-1].content == "请总结：正文\n不超过10字"
+
+
+def test_template_with_length_placeholder_is_unchanged():
+    chains = ChainRegistry(FakeListChatModel(responses=["ok"]), {
+        "summarize": {"system_prompt": "总结助手", "user_template": "{length_requirement}请总结：{text}"}
+    })
+
+    prompt = chains["summarize"].first.invoke({"text": "正文", "length_requirement": "短一点。"})
+
+    assert prompt.messages[-1].content == "短一点。请总结：正文"
@@ -0,0 +1,135 @@
+"""RecencyIndex 单元测试"""
+
+import sqlite3
+
+import pytest
+
+from recency_index import RecencyIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = RecencyIndex(str(tmp_path / "recency.sqlite3"))
+    yield index
+    index.close()
+
+
+def meta(timestamp, memory_type="conversation", session_id=None, user_id=None, **extra):
+    metadata = {"timestamp": timestamp, "type": memory_type, **extra}
+    if session_id:
+        metadata["session_id"] = session_id
+    if user_id:
+        metadata["user_id"] = user_id
+    return metadata
+
+
+def test_recent_orders_by_timestamp_and_pages(index):
+    index.add(["a", "b", "c"], [meta("2024-01-01"), meta("2024-01-03"), meta("2024-01-02", "fact")])
+
+    assert index.recent(2) == ["b", "c"]
+    assert index.recent(2, offset=2) == ["a"]
+    assert index.recent(10, memory_type="fact") == ["c"]
+    assert index.count() == 3
+
+
+def test_recent_scopes_user_before_session(index):
+    index.add(
+        ["s1", "s2", "u1"],
+        [meta("2024-01-01", session_id="s"), meta("2024-01-02", session_id="other"),
+         meta("2024-01-03", session_id="other", user_id="u")]
+    )
+
+    assert index.recent(10, session_id="s") == ["s1"]
+    assert index.recent(10, session_id="s", user_id="u") == ["u1"]
+    assert index.count(session_id="other") == 2
+
+
+def test_older_than_groups_by_scope(index):
+    index.add(
+        ["a", "b", "c", "d"],
+        [meta("2024-01-02", user_id="u2"), meta("2024-01-01", user_id="u1"),
+         meta("2024-01-03", user_id="u1"), meta("2024-06-01", user_id="u1")]
+    )
+
+    rows = index.older_than("2024-02-01", "conversation")
+
+    assert [row[0] for row in rows] == ["b", "c", "a"]
+    assert rows[0] == ("b", "2024-01-01", None, "u1")
+    assert len(index.older_than("2024-02-01", limit=1)) == 1
+
+
+def test_older_than_resumes_after_cursor(tmp_path):
+    path = str(tmp_path / "recency.sqlite3")
+    index = RecencyIndex(path)
+    index.add(
+        ["g", "s", "u1", "u2", "u3"],
+        [meta("2024-01-05"), meta("2024-01-04", session_id="s"), meta("2024-01-01", user_id="u"),
+         meta("2024-01-02", user_id="u"), meta("2024-01-02", user_id="u")]
+    )
+
+    first = index.older_than("2024-02-01", limit=3)
+    # 没有作用域的记忆排在最前；时间戳相同按ID排序
+    assert [row[0] for row in first] == ["g", "s", "u1"]
+    index.set_cursor("job", RecencyIndex.cursor_for(first[-1]))
+    index.close()
+
+    # 游标持久化在同一个 SQLite 文件中
+    index = RecencyIndex(path)
+    cursor = index.get_cursor("job")
+    assert cursor == ("u", "", "2024-01-01", "u1")
+    assert [row[0] for row in index.older_than("2024-02-01", limit=3, after=cursor)] == ["u2", "u3"]
+
+    index.set_cursor("job", None)
+    assert index.get_cursor("job") is None
+    index.set_cursor("job", cursor)
+    index.clear()
+    assert index.get_cursor("job") is None
+    index.close()
+
+
+def test_over_capacity_counts_users_then_sessions(index):
+    index.add(
+        ["u1", "u2", "u3", "s1", "s2", "g1", "g2", "g3"],
+        [meta("1", user_id="u")] * 3 + [meta("1", session_id="s")] * 2 + [meta("1")] * 3
+    )
+
+    assert sorted(index.over_capacity(1)) == [("session_id", "s", 1), ("user_id", "u", 2)]
+    assert index.over_capacity(3) == []
+
+
+def test_eviction_candidates_lru_and_lfu(index):
+    index.add(
+        ["old", "mid", "new"],
+        [meta("2024-01-01", user_id="u"), meta("2024-01-02", user_id="u"), meta("2024-01-03", user_id="u")]
+    )
+    index.record_hits({"old": (5, "2024-02-01"), "new": (1, "2024-01-04")})
+
+    # LRU：按最近命中时间（从未命中的按写入时间）
+    assert index.eviction_candidates("user_id", "u", 2, "lru") == ["mid", "new"]
+    # LFU：命中次数最少优先
+    assert index.eviction_candidates("user_id", "u", 2, "lfu") == ["mid", "new"]
+    assert index.eviction_candidates("user_id", "u", 3, "lfu")[-1] == "old"
+    with pytest.raises(ValueError):
+        index.eviction_candidates("type", "conversation", 1)
+
+
+def test_remove_rebuild_and_close(tmp_path):
+    index = RecencyIndex(str(tmp_path / "recency.sqlite3"))
+    index.add(["a", "b"], [meta("1"), meta("2")])
+    index.remove(["a"])
+    assert index.recent(10) == ["b"]
+
+    assert index.rebuild([(["x", "y"], [meta("1"), meta("2")])]) == 2
+    assert index.recent(10) == ["y", "x"]
+
+    index.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        index.count()
+
+
+def test_memory_store_close_closes_index(memory_store):
+    memory_store.add_fact("事实")
+    memory_store.close()
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        memory_store.recency_index.count()
@@ -0,0 +1,115 @@
+"""SemanticResponseCache 单元测试"""
+
+import time
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from response_cache import SemanticResponseCache, CacheScope
+
+
+class TableEmbeddings(Embeddings):
+    """按预设表返回向量的嵌入，统计调用次数"""
+
+    def __init__(self, table):
+        self.table = table
+        self.calls = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        return self.table[text]
+
+
+EMBEDDINGS = {
+    "今天天气怎么样": [1.0, 0.0, 0.0],
+    "今天天气如何": [0.99, 0.14, 0.0],
+    "讲个笑话": [0.0, 1.0, 0.0],
+    "推荐一本书": [0.0, 0.0, 1.0],
+}
+
+
+def make_cache(**kwargs):
+    return SemanticResponseCache(TableEmbeddings(EMBEDDINGS), **kwargs)
+
+
+def test_similar_query_hits_above_threshold():
+    cache = make_cache(threshold=0.95)
+    cache.store("今天天气怎么样", "晴天", session_id="s1")
+
+    response, score = cache.lookup("今天天气如何", session_id="s1")
+
+    assert response == "晴天"
+    assert score > 0.95
+    assert cache.lookup("讲个笑话", session_id="s1") is None
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 1
+
+
+def test_threshold_rejects_less_similar_query():
+    cache = make_cache(threshold=0.999)
+    cache.store("今天天气怎么样", "晴天")
+
+    assert cache.lookup("今天天气如何") is None
+    assert cache.lookup("今天天气怎么样") == ("晴天", 1.0)
+
+
+def test_session_scope_isolates_sessions_and_users():
+    cache = make_cache()
+    cache.store("今天天气怎么样", "会话一的回答", session_id="s1")
+    cache.store("今天天气怎么样", "用户的回答", session_id="s1", user_id="u1")
+
+    assert cache.lookup("今天天气怎么样", session_id="s2") is None
+    assert cache.lookup("今天天气怎么样", session_id="s1")[0] == "会话一的回答"
+    assert cache.lookup("今天天气怎么样", session_id="s2", user_id="u1")[0] == "用户的回答"
+
+
+def test_global_scope_shares_entries():
+    cache = make_cache(scope=CacheScope.GLOBAL)
+    cache.store("今天天气怎么样", "晴天", session_id="s1")
+
+    assert cache.lookup("今天天气怎么样", session_id="s2", user_id="u2")[0] == "晴天"
+
+
+def test_lookup_in_empty_scope_skips_embedding():
+    cache = make_cache()
+    cache.store("今天天气怎么样", "晴天", session_id="s1")
+    calls = cache.embeddings.calls
+
+    assert cache.lookup("今天天气怎么样", session_id="s2") is None
+    assert cache.embeddings.calls == calls
+
+
+def test_maxsize_evicts_least_recently_hit_across_scopes():
+    cache = make_cache(maxsize=2)
+    cache.store("今天天气怎么样", "晴天", session_id="s1")
+    cache.store("讲个笑话", "笑话", session_id="s2")
+    cache.lookup("今天天气怎么样", session_id="s1")
+    cache.store("推荐一本书", "三体", session_id="s1")
+
+    assert cache.lookup("讲个笑话", session_id="s2") is None
+    assert cache.lookup("今天天气怎么样", session_id="s1")[0] == "晴天"
+    assert cache.lookup("推荐一本书", session_id="s1")[0] == "三体"
+    assert cache.get_stats()["size"] == 2
+
+
+def test_expired_entries_are_dropped():
+    cache = make_cache(ttl=0.05)
+    cache.store("今天天气怎么样", "晴天")
+    time.sleep(0.1)
+    cache.store("讲个笑话", "笑话")
+
+    assert cache.lookup("今天天气怎么样") is None
+    assert cache.lookup("讲个笑话")[0] == "笑话"
+    assert cache.get_stats()["size"] == 1
+
+
+def test_store_replaces_existing_query():
+    cache = make_cache()
+    cache.store("今天天气怎么样", "晴天")
+    cache.store("今天天气怎么样 ", "多云")
+
+    assert cache.lookup("今天天气怎么样")[0] == "多云"
+    assert cache.get_stats()["size"] == 1
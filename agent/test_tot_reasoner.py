@@ -0,0 +1,161 @@
+"""TreeOfThoughtReasoner 单元测试（使用假的 LLM 和嵌入，不发起网络请求）"""
+
+import threading
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+
+from tot_reasoner import TreeOfThoughtReasoner, StreamEvent, StopReason, SearchLimits, _SiblingDeduplicator
+
+
+class TableEmbeddings(Embeddings):
+    """按预设表返回向量的嵌入"""
+
+    def __init__(self, table):
+        self.table = table
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.table[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.table[text]
+
+
+# A≈B、B≈C，但 A 与 C 不相似（余弦约 0.62）
+CHAIN = {
+    "A": [1.0, 0.0],
+    "B": [0.9, 0.436],
+    "C": [0.62, 0.785],
+    "D": [0.0, 1.0],
+}
+
+
+def test_dedup_keeps_item_similar_only_to_dropped_item():
+    dedup = _SiblingDeduplicator(TableEmbeddings(CHAIN), threshold=0.85)
+
+    assert dedup.filter(["A", "B", "C"]) == ["A", "C"]
+    assert dedup.merged == 1
+
+
+def test_dedup_compares_against_earlier_batches():
+    dedup = _SiblingDeduplicator(TableEmbeddings(CHAIN), threshold=0.85)
+    dedup.filter(["A"])
+
+    assert dedup.filter(["B", "D"]) == ["D"]
+    assert dedup.merged == 1
+
+
+def test_dedup_skips_when_embedding_fails():
+    class Broken(Embeddings):
+        def embed_documents(self, texts):
+            raise RuntimeError("offline")
+
+        def embed_query(self, text):
+            raise RuntimeError("offline")
+
+    dedup = _SiblingDeduplicator(Broken(), threshold=0.85)
+
+    assert dedup.filter(["A", "A"]) == ["A", "A"]
+
+
+def test_merges_in_final_layer_are_reported():
+    llm = FakeListChatModel(responses=[
+        '["A", "B", "D"]',
+        '{"score": 6, "reason": "ok"}',
+        '{"score": 5, "reason": "ok"}',
+    ])
+    reasoner = TreeOfThoughtReasoner(
+        llm=llm,
+        max_concurrency=1,
+        embeddings=TableEmbeddings(CHAIN),
+        dedup_threshold=0.85
+    )
+
+    events = list(reasoner.solve_stream("问题", max_branches=3, max_depth=1))
+
+    merged = [event for event in events if event.get("merged")]
+    assert [(event["layer"], event["merged"]) for event in merged] == [(1, 1)]
+    assert events[-1]["type"] == StreamEvent.THINKING_END
+    assert events[-1]["merged_thoughts"] == 1
+
+
+def test_search_limits_are_disabled_by_default():
+    llm = FakeListChatModel(responses=['["A"]', '{"score": 9.8, "reason": "ok"}'])
+    reasoner = TreeOfThoughtReasoner(llm=llm, max_concurrency=1, dedup_threshold=None)
+
+    result = reasoner.solve("问题", max_branches=1, max_depth=3)
+
+    assert result["stop_reason"] == StopReason.MAX_DEPTH
+
+
+def test_search_limits_from_env(monkeypatch):
+    monkeypatch.setenv("TOT_SCORE_THRESHOLD", "9.5")
+    monkeypatch.setenv("TOT_PLATEAU_LAYERS", "1")
+    monkeypatch.setenv("TOT_ADAPTIVE_BEAM", "true")
+
+    limits = SearchLimits.from_env()
+
+    assert limits.score_threshold == 9.5
+    assert limits.plateau_layers == 1
+    assert limits.adaptive_beam is True
+    assert limits.max_seconds is None and limits.max_tokens is None
+    assert SearchLimits() == SearchLimits(score_threshold=None, plateau_layers=0, adaptive_beam=False)
+
+
+def test_parse_batch_scores_handles_code_fence_and_missing_items():
+    raw = """评分如下：
+```json
+[{"index": 2, "score": 7, "reason": "b"}, {"index": 1, "score": "8.5", "reason": "a"}, {"index": 9, "score": 1}]
+```"""
+
+    assert TreeOfThoughtReasoner._parse_batch_scores(raw, 3) == [(8.5, "a"), (7.0, "b"), None]
+
+
+def test_parse_batch_scores_uses_position_without_index_and_ignores_bad_items():
+    raw = '[{"score": 6}, "oops", {"index": 1, "score": 9}, {"score": "n/a"}]'
+
+    # 第一个条目按位置落在 1 号，后面重复的 1 号被忽略；无法解析的分数跳过
+    assert TreeOfThoughtReasoner._parse_batch_scores(raw, 4) == [(6.0, ""), None, None, None]
+
+
+def test_parse_batch_scores_returns_none_for_unparseable_output():
+    assert TreeOfThoughtReasoner._parse_batch_scores("无法打分", 2) == [None, None]
+    assert TreeOfThoughtReasoner._parse_batch_scores("[not json]", 1) == [None]
+
+
+def test_batch_strategy_falls_back_to_single_scores():
+    llm = FakeListChatModel(responses=[
+        '["A", "D"]',
+        '[{"index": 1, "score": 8, "reason": "batch"}]',
+        '{"score": 3, "reason": "single"}',
+    ])
+    reasoner = TreeOfThoughtReasoner(llm=llm, max_concurrency=1, dedup_threshold=None)
+
+    events = list(reasoner.solve_stream("问题", max_branches=2, max_depth=1, score_strategy="batch"))
+
+    scores = [(event["proposal"], event["score"], event["reason"])
+              for event in events if event["type"] == StreamEvent.THINKING_SCORE]
+    assert scores == [("A", 8.0, "batch"), ("D", 3.0, "single")]
+
+
+def test_cancelled_search_stops_before_next_llm_call():
+    cancelled = threading.Event()
+    prompts = []
+
+    def llm(prompt):
+        prompts.append(prompt.to_string())
+        if len(prompts) == 1:
+            # 生成思路期间客户端断开
+            cancelled.set()
+            return '["A", "B"]'
+        return '{"score": 5, "reason": "ok"}'
+
+    reasoner = TreeOfThoughtReasoner(llm=RunnableLambda(llm), max_concurrency=1, dedup_threshold=None)
+
+    events = list(reasoner.solve_stream("问题", max_branches=2, max_depth=2, cancelled=cancelled))
+
+    assert len(prompts) == 1
+    assert events[-1]["type"] == StreamEvent.THINKING_END
+    assert events[-1]["stop_reason"] == StopReason.CANCELLED
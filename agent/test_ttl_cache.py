@@ -0,0 +1,76 @@
+"""TTLCache 单元测试"""
+
+import ttl_cache
+from ttl_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ttl_cache.time, "monotonic", clock)
+    cache = TTLCache(maxsize=4, ttl=10)
+    cache.set("a", 1)
+
+    clock.now += 9
+    assert cache.get("a") == 1
+
+    clock.now += 2
+    assert cache.get("a", "missing") == "missing"
+    assert len(cache) == 0
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_none_never_expires(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ttl_cache.time, "monotonic", clock)
+    cache = TTLCache(maxsize=4, ttl=None)
+    cache.set("a", 1)
+    clock.now += 10 ** 9
+
+    assert cache.get("a") == 1
+
+
+def test_lru_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_set_existing_key_refreshes_order():
+    cache = TTLCache(maxsize=2, ttl=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("a", 10)
+
+    cache.set("c", 3)
+
+    assert cache.get("a") == 10
+    assert cache.get("b") is None
+
+
+def test_pop_and_clear():
+    cache = TTLCache(maxsize=2, ttl=None)
+    cache.set("a", 1)
+
+    assert cache.pop("a") == 1
+    assert cache.pop("a", "gone") == "gone"
+
+    cache.set("b", 2)
+    cache.clear()
+    assert len(cache) == 0
@@ -0,0 +1,216 @@
+"""AgentWorkerPool / StreamBridge 单元测试"""
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from langchain_core.runnables import RunnableLambda
+from tot_reasoner import TreeOfThoughtReasoner, StreamEvent
+from worker_pool import AgentWorkerPool, StreamBridge, WorkerPoolFullError
+
+
+def test_rejects_when_queue_is_full():
+    async def scenario():
+        pool = AgentWorkerPool(max_workers=1, max_queue=1)
+        release = threading.Event()
+        try:
+            running = asyncio.create_task(pool.run("chat", release.wait))
+            await asyncio.sleep(0.05)
+            queued = asyncio.create_task(pool.run("chat", lambda: "queued"))
+            await asyncio.sleep(0.05)
+
+            with pytest.raises(WorkerPoolFullError):
+                await pool.run("chat", lambda: "rejected")
+
+            metrics = pool.get_metrics()
+            assert metrics["queue_depth"] == 1
+            assert metrics["endpoints"]["chat"]["rejected"] == 1
+
+            release.set()
+            assert await running is True
+            assert await queued == "queued"
+            assert pool.get_metrics()["endpoints"]["chat"]["completed"] == 2
+        finally:
+            release.set()
+            pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_async_calls_use_their_own_limit():
+    async def scenario():
+        pool = AgentWorkerPool(max_workers=1, max_async=2, max_queue=0)
+
+        async def work(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        try:
+            results = await asyncio.gather(*(pool.run_async("chat", work, i) for i in range(5)))
+            assert results == list(range(5))
+            assert pool.get_metrics()["endpoints"]["chat"]["completed"] == 5
+        finally:
+            pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_async_backlog_does_not_reject_sync_calls():
+    async def scenario():
+        pool = AgentWorkerPool(max_workers=1, max_async=1, max_queue=1)
+        release_async = asyncio.Event()
+        release_sync = threading.Event()
+
+        async def blocked():
+            await release_async.wait()
+            return "async"
+
+        try:
+            running_async = asyncio.create_task(pool.run_async("chat", blocked))
+            queued_async = asyncio.create_task(pool.run_async("chat", blocked))
+            await asyncio.sleep(0.05)
+            with pytest.raises(WorkerPoolFullError):
+                await pool.run_async("chat", blocked)
+
+            # 异步队列已满，但同步队列仍为空
+            running_sync = asyncio.create_task(pool.run("summarize", release_sync.wait))
+            await asyncio.sleep(0.05)
+            queued_sync = asyncio.create_task(pool.run("summarize", lambda: "sync"))
+            await asyncio.sleep(0.05)
+            assert pool.get_metrics()["queue_depth"] == 2
+            with pytest.raises(WorkerPoolFullError):
+                await pool.run("translate", lambda: "rejected")
+
+            release_async.set()
+            release_sync.set()
+            assert await asyncio.gather(running_async, queued_async, running_sync, queued_sync) == [
+                "async", "async", True, "sync"
+            ]
+            assert pool.get_metrics()["queue_depth"] == 0
+        finally:
+            release_async.set()
+            release_sync.set()
+            pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+class _FullPool:
+    """run / run_async 总是抛出 WorkerPoolFullError 的工作池"""
+
+    async def run(self, endpoint, func, *args, **kwargs):
+        raise WorkerPoolFullError("Agent 工作池已满（排队 1）")
+
+    run_async = run
+
+
+def test_chat_returns_503_when_pool_is_full(monkeypatch):
+    monkeypatch.setattr(main, "USE_LANGGRAPH", True)
+    monkeypatch.setattr(main, "langgraph_agent", SimpleNamespace(achat=None, achat_with_search=None))
+    monkeypatch.setattr(main, "worker_pool", _FullPool())
+
+    response = TestClient(main.app).post("/api/chat", json={"message": "你好"})
+
+    assert response.status_code == 503
+    assert "工作池已满" in response.json()["detail"]
+
+
+def test_stream_bridge_stops_producer_when_consumer_breaks():
+    closed = threading.Event()
+    produced = []
+
+    def endless():
+        try:
+            i = 0
+            while True:
+                produced.append(i)
+                yield i
+                i += 1
+        finally:
+            closed.set()
+
+    async def scenario():
+        bridge = StreamBridge(max_streams=2, buffer_size=2)
+        try:
+            stream = bridge.iterate(endless)
+            received = []
+            async for item in stream:
+                received.append(item)
+                if len(received) == 3:
+                    break
+            await stream.aclose()
+            assert received == [0, 1, 2]
+            assert bridge.active_streams == 0
+        finally:
+            bridge.shutdown(wait=True)
+
+    asyncio.run(scenario())
+
+    assert closed.wait(timeout=2)
+    # 背压：生产者最多领先消费端 buffer_size 个事件
+    assert len(produced) <= 3 + 2 + 1
+
+
+def test_stream_bridge_cancels_tot_blocked_in_llm_calls():
+    gate = threading.Event()
+    finished = threading.Event()
+    scored = []
+
+    def llm(prompt):
+        if "候选思路:" not in prompt.to_string():
+            return '["A", "B", "C"]'
+        scored.append(prompt.to_string())
+        gate.wait(timeout=5)
+        return '{"score": 5, "reason": "ok"}'
+
+    # 两个工作线程都阻塞在打分调用上，第三个打分任务还在排队
+    reasoner = TreeOfThoughtReasoner(llm=RunnableLambda(llm), max_concurrency=2, dedup_threshold=None)
+    cancelled = threading.Event()
+
+    def factory():
+        try:
+            yield from reasoner.solve_stream("问题", max_branches=3, max_depth=1, cancelled=cancelled)
+        finally:
+            finished.set()
+
+    async def scenario():
+        bridge = StreamBridge(max_streams=1)
+        try:
+            stream = bridge.iterate(factory, cancelled=cancelled)
+            async for event in stream:
+                if event["type"] == StreamEvent.THINKING_STEP:
+                    break
+            await stream.aclose()
+            # 生产者在 LLM 调用返回之前就结束，不再等待消费端拉取下一个事件
+            assert await asyncio.to_thread(finished.wait, 2)
+        finally:
+            gate.set()
+            bridge.shutdown(wait=True)
+
+    asyncio.run(scenario())
+    reasoner._executor.shutdown(wait=True)
+
+    assert len(scored) == 2
+
+
+def test_stream_bridge_reraises_producer_errors():
+    def failing():
+        yield "first"
+        raise ValueError("boom")
+
+    async def scenario():
+        bridge = StreamBridge(max_streams=1)
+        received = []
+        try:
+            with pytest.raises(ValueError, match="boom"):
+                async for item in bridge.iterate(failing):
+                    received.append(item)
+        finally:
+            bridge.shutdown()
+        assert received == ["first"]
+
+    asyncio.run(scenario())
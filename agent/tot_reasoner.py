@@ -4,15 +4,25 @@ Generates multiple thought branches and scores them to pick the best answer.
 支持流式输出，边思考边输出。
 """
 
+import os
 import json
+import re
+import math
+import time
+import hashlib
+import threading
+import statistics
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import List, Optional, Tuple, Callable, Generator, Any
 
+import numpy as np
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 from langchain_core.messages import HumanMessage
 from langchain_openai import ChatOpenAI
 
+from ttl_cache import TTLCache
+
 
 # 流式事件类型
 class StreamEvent:
@@ -28,6 +38,69 @@ class StreamEvent:
     ERROR = "error"                        # 错误
 
 
+# 打分策略
+class ScoreStrategy:
+    """思路打分策略"""
+    SINGLE = "single"  # 每个思路单独调用一次 LLM
+    BATCH = "batch"    # 一次 LLM 调用为同一节点的全部思路打分
+
+
+# 搜索结束原因
+class StopReason:
+    """深度思考结束原因"""
+    MAX_DEPTH = "max_depth"              # 达到最大深度
+    SCORE_THRESHOLD = "score_threshold"  # 出现足够好的思路
+    PLATEAU = "plateau"                  # 连续多层最佳得分没有明显提升
+    TIME_BUDGET = "time_budget"          # 超出时间预算
+    TOKEN_BUDGET = "token_budget"        # 超出 token 预算
+    NO_CANDIDATES = "no_candidates"      # 没有生成新的思路
+    CANCELLED = "cancelled"              # 调用方取消（如客户端断开）
+
+
+@dataclass
+class SearchLimits:
+    """
+    树搜索的停止规则和自适应剪枝参数（默认全部关闭，搜索固定探索 max_depth 层）
+
+    Attributes:
+        score_threshold: 任一思路得分达到该值即停止（None 表示不启用）
+        plateau_layers: 连续多少层最佳得分提升不足 plateau_min_gain 即停止（0 表示不启用）
+        plateau_min_gain: 视为"有提升"的最小得分增量
+        max_seconds: 墙钟时间预算（秒）
+        max_tokens: LLM token 预算（提示 + 生成）
+        adaptive_beam: 是否启用自适应束宽
+        beam_std_threshold: 候选得分标准差低于该值时按比例收窄束宽
+        min_beam_width: 自适应收窄后的最小束宽
+    """
+    score_threshold: Optional[float] = None
+    plateau_layers: int = 0
+    plateau_min_gain: float = 0.1
+    max_seconds: Optional[float] = None
+    max_tokens: Optional[int] = None
+    adaptive_beam: bool = False
+    beam_std_threshold: float = 1.0
+    min_beam_width: int = 1
+
+    @classmethod
+    def from_env(cls) -> "SearchLimits":
+        """
+        从环境变量读取停止规则（未设置或为 0 时不启用）
+
+        TOT_SCORE_THRESHOLD=9.5
+        TOT_PLATEAU_LAYERS=1
+        TOT_MAX_SECONDS=60
+        TOT_MAX_TOKENS=20000
+        TOT_ADAPTIVE_BEAM=true
+        """
+        return cls(
+            score_threshold=float(os.getenv("TOT_SCORE_THRESHOLD", "0")) or None,
+            plateau_layers=int(os.getenv("TOT_PLATEAU_LAYERS", "0")),
+            max_seconds=float(os.getenv("TOT_MAX_SECONDS", "0")) or None,
+            max_tokens=int(os.getenv("TOT_MAX_TOKENS", "0")) or None,
+            adaptive_beam=os.getenv("TOT_ADAPTIVE_BEAM", "false").lower() in ("1", "true", "yes")
+        )
+
+
 @dataclass
 class Thought:
     content: str
@@ -35,18 +108,157 @@ class Thought:
     path: List[str]
 
 
+class _SearchStats:
+    """单次搜索内的缓存命中和 LLM 用量统计（多个工作线程会同时更新），并携带取消标志"""
+
+    def __init__(self, cancelled: Optional[threading.Event] = None) -> None:
+        self.cancelled = cancelled
+        self._lock = threading.Lock()
+        self.counts = {"score_hits": 0, "score_misses": 0, "propose_hits": 0, "propose_misses": 0}
+        self.llm_calls = 0
+        self.tokens = 0
+
+    def record(self, kind: str, hit: bool) -> None:
+        with self._lock:
+            self.counts[f"{kind}_{'hits' if hit else 'misses'}"] += 1
+
+    def record_usage(self, tokens: int) -> None:
+        with self._lock:
+            self.llm_calls += 1
+            self.tokens += tokens
+
+    def is_cancelled(self) -> bool:
+        return self.cancelled is not None and self.cancelled.is_set()
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+    def usage(self) -> dict:
+        with self._lock:
+            return {"llm_calls": self.llm_calls, "tokens": self.tokens}
+
+
+class _SiblingDeduplicator:
+    """
+    同一层内的思路去重：与已保留思路的余弦相似度超过阈值的新思路直接合并（丢弃），
+    不再打分和展开。不同前沿节点的思路可能并发到达，因此需要加锁。
+    """
+
+    def __init__(self, embeddings: Any, threshold: float) -> None:
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.merged = 0
+        self._vectors: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def filter(self, proposals: List[str]) -> List[str]:
+        """返回去重后的思路，保持原有顺序"""
+        if len(proposals) == 0:
+            return proposals
+        try:
+            vectors = np.asarray(self.embeddings.embed_documents(proposals), dtype=np.float32)
+        except Exception as e:
+            print(f"⚠️ 思路去重嵌入失败，跳过去重: {e}")
+            return proposals
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        with self._lock:
+            # 贪心：每个新思路只与已保留的思路（本层之前的批次 + 本批中已保留的）比较，
+            # 被丢弃的思路不会再导致后续思路被丢弃
+            existing = (
+                (vectors @ self._vectors.T >= self.threshold).any(axis=1)
+                if self._vectors is not None else np.zeros(len(proposals), dtype=bool)
+            )
+            similar = vectors @ vectors.T >= self.threshold
+            duplicate = np.zeros(len(proposals), dtype=bool)
+            kept_indices: List[int] = []
+            for i in range(len(proposals)):
+                if existing[i] or similar[i, kept_indices].any():
+                    duplicate[i] = True
+                else:
+                    kept_indices.append(i)
+
+            kept = vectors[kept_indices]
+            self._vectors = kept if self._vectors is None else np.vstack([self._vectors, kept])
+            self.merged += int(duplicate.sum())
+
+        return [proposal for proposal, dup in zip(proposals, duplicate) if not dup]
+
+
+def _normalize_thought(text: str) -> str:
+    """规范化思路文本：去掉编号、首尾标点，合并空白，统一小写"""
+    text = re.sub(r"^\s*(?:[-*•]|\d+[.、)）])\s*", "", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip().strip("。.!！?？;；,，").lower()
+
+
 class TreeOfThoughtReasoner:
-    """Lightweight Tree-of-Thought reasoning helper with streaming support."""
+    """Lightweight Tree-of-Thought reasoning helper with streaming support.
+
+    When ``max_concurrency`` > 1, every ``_propose`` call for a layer's frontier
+    and every ``_score`` call for the resulting proposals are fanned out to a
+    shared thread pool, so a layer costs roughly one propose plus one score
+    round trip instead of branches x (propose + branches x score).
+
+    With ``score_strategy="batch"`` all proposals of a node are scored by a
+    single LLM call that returns a JSON array; items that cannot be parsed
+    fall back to the per-thought ``_score`` path.
+
+    ``_score`` results are memoized in an LRU+TTL cache keyed on the
+    normalized thought plus a hash of problem and context; ``_propose``
+    results can optionally be cached by path as well. Hit/miss counts for
+    each search are reported on the ``THINKING_END`` event.
+
+    ``SearchLimits`` adds opt-in early termination (score threshold, plateau,
+    wall-clock and token budgets) and an adaptive beam width that narrows
+    the frontier when candidate scores are close together; all of them are
+    off by default. The reason the search stopped is reported as
+    ``stop_reason`` on ``THINKING_END``.
+
+    When ``embeddings`` is given (e.g. ``MemoryStore.embeddings``), proposals
+    within a layer whose cosine similarity exceeds ``dedup_threshold`` are
+    merged before scoring, so paraphrases are neither scored nor expanded.
+    The merged count is reported on a ``THINKING_STEP`` event at the end of
+    the layer where the merges happened and in total on ``THINKING_END``.
+
+    ``solve_stream`` accepts a ``cancelled`` event (set by ``StreamBridge``
+    when the client disconnects); it is checked before every propose/score
+    call, so an abandoned search stops issuing LLM requests without waiting
+    for the consumer to pull the next event.
+    """
 
     def __init__(
         self,
         llm: ChatOpenAI,
         default_branches: int = 5,
         default_depth: int = 3,
+        max_concurrency: int = 8,
+        score_cache_size: int = 4096,
+        cache_ttl: float = 3600.0,
+        cache_proposals: bool = False,
+        propose_cache_size: int = 512,
+        limits: Optional[SearchLimits] = None,
+        embeddings: Any = None,
+        dedup_threshold: Optional[float] = 0.9,
     ) -> None:
         self.llm = llm
+        self.limits = limits or SearchLimits()
+        # 用于兄弟思路去重的嵌入模型（需提供 embed_documents）；为 None 时不去重
+        self.embeddings = embeddings
+        self.dedup_threshold = dedup_threshold
         self.default_branches = max(1, default_branches)
         self.default_depth = max(1, default_depth)
+        self.max_concurrency = max(1, max_concurrency)
+        # 所有请求共享的 LLM 调用线程池，max_concurrency 即并发上限
+        self._executor = (
+            ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="tot-worker")
+            if self.max_concurrency > 1 else None
+        )
+        # 并发扩展时检查取消标志的间隔（秒）
+        self._cancel_poll_seconds = 0.2
+        self._score_cache = TTLCache(maxsize=score_cache_size, ttl=cache_ttl)
+        self._propose_cache = TTLCache(maxsize=propose_cache_size, ttl=cache_ttl) if cache_proposals else None
 
         self._propose_chain = (
             ChatPromptTemplate.from_messages(
@@ -64,7 +276,6 @@ class TreeOfThoughtReasoner:
                 ]
             )
             | self.llm
-            | StrOutputParser()
         )
 
         self._score_chain = (
@@ -82,12 +293,45 @@ class TreeOfThoughtReasoner:
                 ]
             )
             | self.llm
-            | StrOutputParser()
         )
 
-    def _propose(self, problem: str, context: str, path: List[str], branches: int) -> List[str]:
-        raw = self._propose_chain.invoke(
-            {"problem": problem, "context": context, "path": " -> ".join(path) or "(root)", "branches": branches}
+        self._batch_score_chain = (
+            ChatPromptTemplate.from_messages(
+                [
+                    (
+                        "system",
+                        "你是评估员，给每个候选思路打分，0-10，10最好。\n"
+                        "按候选思路的编号顺序返回 JSON 数组，每个元素为 "
+                        "{{\"index\": 编号, \"score\": number, \"reason\": string}}，不要返回其他内容。",
+                    ),
+                    (
+                        "human",
+                        "问题: {problem}\n上下文: {context}\n候选思路:\n{thoughts}\n请逐个打分并简述理由",
+                    ),
+                ]
+            )
+            | self.llm
+        )
+
+    @staticmethod
+    def _invoke(chain, inputs: dict, stats: Optional[_SearchStats] = None) -> str:
+        """调用链并记录 token 用量；模型未返回用量时按字符数粗略估算"""
+        message = chain.invoke(inputs)
+        text = getattr(message, "content", message)
+        text = text if isinstance(text, str) else str(text)
+        if stats is not None:
+            usage = getattr(message, "usage_metadata", None) or {}
+            tokens = usage.get("total_tokens") or (sum(len(str(v)) for v in inputs.values()) + len(text)) // 2
+            stats.record_usage(int(tokens))
+        return text
+
+    def _propose(
+        self, problem: str, context: str, path: List[str], branches: int, stats: Optional[_SearchStats] = None
+    ) -> List[str]:
+        raw = self._invoke(
+            self._propose_chain,
+            {"problem": problem, "context": context, "path": " -> ".join(path) or "(root)", "branches": branches},
+            stats,
         )
         try:
             data = json.loads(raw)
@@ -97,8 +341,10 @@ class TreeOfThoughtReasoner:
             pass
         return [line.strip("- ") for line in raw.splitlines() if line.strip()][:branches]
 
-    def _score(self, problem: str, context: str, thought: str) -> Tuple[float, str]:
-        raw = self._score_chain.invoke({"problem": problem, "context": context, "thought": thought})
+    def _score(
+        self, problem: str, context: str, thought: str, stats: Optional[_SearchStats] = None
+    ) -> Tuple[float, str]:
+        raw = self._invoke(self._score_chain, {"problem": problem, "context": context, "thought": thought}, stats)
         try:
             data = json.loads(raw)
             score = float(data.get("score", 0))
@@ -112,21 +358,267 @@ class TreeOfThoughtReasoner:
             except Exception:
                 return 0.0, raw
 
+    @staticmethod
+    def _context_key(problem: str, context: str) -> str:
+        return hashlib.sha1(f"{problem}\x00{context}".encode("utf-8")).hexdigest()
+
+    def _cached_score(self, problem: str, context: str, thought: str, stats: _SearchStats) -> Tuple[float, str]:
+        """带缓存的 _score"""
+        key = (self._context_key(problem, context), _normalize_thought(thought))
+        cached = self._score_cache.get(key)
+        stats.record("score", cached is not None)
+        if cached is not None:
+            return cached
+        result = self._score(problem, context, thought, stats)
+        self._score_cache.set(key, result)
+        return result
+
+    def _cached_propose(
+        self, problem: str, context: str, path: List[str], branches: int, stats: _SearchStats
+    ) -> List[str]:
+        """带缓存的 _propose（未启用 cache_proposals 时直接调用）"""
+        if self._propose_cache is None:
+            return self._propose(problem, context, path, branches, stats)
+        key = (self._context_key(problem, context), tuple(_normalize_thought(step) for step in path), branches)
+        cached = self._propose_cache.get(key)
+        stats.record("propose", cached is not None)
+        if cached is not None:
+            return list(cached)
+        proposals = self._propose(problem, context, path, branches, stats)
+        self._propose_cache.set(key, tuple(proposals))
+        return proposals
+
+    def _layer_deduplicator(self) -> Optional[_SiblingDeduplicator]:
+        if self.embeddings is None or self.dedup_threshold is None:
+            return None
+        return _SiblingDeduplicator(self.embeddings, self.dedup_threshold)
+
+    def _propose_unique(
+        self,
+        problem: str,
+        context: str,
+        path: List[str],
+        branches: int,
+        stats: _SearchStats,
+        dedup: Optional[_SiblingDeduplicator],
+    ) -> List[str]:
+        """生成思路并去掉与本层已有思路语义重复的部分"""
+        proposals = self._cached_propose(problem, context, path, branches, stats)
+        return dedup.filter(proposals) if dedup is not None else proposals
+
+    @staticmethod
+    def _parse_batch_scores(raw: str, count: int) -> List[Optional[Tuple[float, str]]]:
+        """
+        解析批量打分结果，返回与候选思路一一对应的列表；
+        无法解析的条目为 None（由调用方回退到逐个打分）。
+        """
+        results: List[Optional[Tuple[float, str]]] = [None] * count
+        # 兼容 ```json 代码块或前后附带说明文字的情况
+        match = re.search(r"\[.*\]", raw, re.DOTALL)
+        if not match:
+            return results
+        try:
+            data = json.loads(match.group(0))
+        except Exception:
+            return results
+        if not isinstance(data, list):
+            return results
+
+        for position, item in enumerate(data):
+            if not isinstance(item, dict):
+                continue
+            index = item.get("index", position + 1)
+            try:
+                slot = int(index) - 1
+                score = float(item["score"])
+            except Exception:
+                continue
+            if 0 <= slot < count and results[slot] is None:
+                results[slot] = (score, str(item.get("reason", "")))
+        return results
+
+    def _score_batch(
+        self, problem: str, context: str, thoughts: List[str], stats: _SearchStats
+    ) -> List[Tuple[float, str]]:
+        """
+        一次 LLM 调用为全部候选思路打分：已缓存的思路不再发送，
+        解析失败的条目回退到逐个打分
+        """
+        context_key = self._context_key(problem, context)
+        keys = [(context_key, _normalize_thought(thought)) for thought in thoughts]
+        results: List[Optional[Tuple[float, str]]] = [self._score_cache.get(key) for key in keys]
+        for result in results:
+            stats.record("score", result is not None)
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+
+        numbered = "\n".join(f"{n}. {thoughts[i]}" for n, i in enumerate(missing, 1))
+        try:
+            raw = self._invoke(
+                self._batch_score_chain, {"problem": problem, "context": context, "thoughts": numbered}, stats
+            )
+            parsed = self._parse_batch_scores(raw, len(missing))
+        except Exception:
+            parsed = [None] * len(missing)
+
+        for i, result in zip(missing, parsed):
+            if result is None:
+                result = self._score(problem, context, thoughts[i], stats)
+            self._score_cache.set(keys[i], result)
+            results[i] = result
+        return results
+
+    def _step_event(self, node: Thought) -> dict:
+        current_path = ' → '.join(node.path[-2:]) if len(node.path) > 1 else '(起点)'
+        return {
+            "type": StreamEvent.THINKING_STEP,
+            "content": f"  └─ 当前路径: {current_path}",
+            "path": current_path
+        }
+
+    def _score_event(self, index: int, proposal: str, score: float, reason: str) -> dict:
+        short_proposal = proposal[:50] + ('...' if len(proposal) > 50 else '')
+        return {
+            "type": StreamEvent.THINKING_SCORE,
+            "content": f"     {index}. [{score:.1f}分] {short_proposal}",
+            "proposal": proposal,
+            "score": score,
+            "reason": reason
+        }
+
+    @staticmethod
+    def _candidate(node: Thought, proposal: str, score: float, reason: str) -> Thought:
+        combined = f"思路: {proposal}\n理由: {reason}"
+        return Thought(content=combined, score=score, path=node.path + [proposal])
+
+    def _expand_serial(
+        self,
+        problem: str,
+        context: str,
+        frontier: List[Thought],
+        branches: int,
+        score_strategy: str,
+        stats: _SearchStats,
+        dedup: Optional[_SiblingDeduplicator] = None,
+    ) -> Generator[Tuple[dict, Optional[Thought]], None, None]:
+        """逐个节点、逐个思路地扩展一层，产出 (事件, 候选思路或 None)；每次调用 LLM 前检查是否已取消"""
+        for node in frontier:
+            if stats.is_cancelled():
+                return
+            proposals = self._propose_unique(problem, context, node.path, branches, stats, dedup)
+            yield self._step_event(node), None
+
+            if score_strategy == ScoreStrategy.BATCH:
+                if stats.is_cancelled():
+                    return
+                scored = self._score_batch(problem, context, proposals, stats)
+                for i, (proposal, (score, reason)) in enumerate(zip(proposals, scored), 1):
+                    yield self._score_event(i, proposal, score, reason), self._candidate(node, proposal, score, reason)
+                continue
+
+            for i, proposal in enumerate(proposals, 1):
+                if stats.is_cancelled():
+                    return
+                score, reason = self._cached_score(problem, context, proposal, stats)
+                yield self._score_event(i, proposal, score, reason), self._candidate(node, proposal, score, reason)
+
+    def _expand_concurrent(
+        self,
+        problem: str,
+        context: str,
+        frontier: List[Thought],
+        branches: int,
+        score_strategy: str,
+        stats: _SearchStats,
+        dedup: Optional[_SiblingDeduplicator] = None,
+    ) -> Generator[Tuple[dict, Optional[Thought]], None, None]:
+        """
+        并发扩展一层：同时为所有前沿节点生成思路，某个节点的思路一返回就立即
+        并发打分（batch 策略下每个节点一次批量打分）；事件按完成顺序产出。
+        等待期间定期检查是否已取消，取消后不再提交新的 LLM 调用。
+        """
+        pending = {}
+        for node in frontier:
+            future = self._executor.submit(
+                self._propose_unique, problem, context, node.path, branches, stats, dedup
+            )
+            pending[future] = (node, 0, None)
+
+        try:
+            while pending:
+                done, _ = wait(pending, timeout=self._cancel_poll_seconds, return_when=FIRST_COMPLETED)
+                if stats.is_cancelled():
+                    return
+                for future in done:
+                    node, index, proposal = pending.pop(future)
+                    if proposal is None:
+                        # 生成思路完成 → 提交该节点所有思路的打分任务
+                        yield self._step_event(node), None
+                        proposals = future.result()
+                        if score_strategy == ScoreStrategy.BATCH:
+                            if proposals:
+                                score_future = self._executor.submit(self._score_batch, problem, context, proposals, stats)
+                                pending[score_future] = (node, 0, proposals)
+                            continue
+                        for i, item in enumerate(proposals, 1):
+                            score_future = self._executor.submit(self._cached_score, problem, context, item, stats)
+                            pending[score_future] = (node, i, item)
+                    elif isinstance(proposal, list):
+                        for i, (item, (score, reason)) in enumerate(zip(proposal, future.result()), 1):
+                            yield self._score_event(i, item, score, reason), self._candidate(node, item, score, reason)
+                    else:
+                        score, reason = future.result()
+                        yield self._score_event(index, proposal, score, reason), self._candidate(node, proposal, score, reason)
+        finally:
+            # 生成器被提前关闭或搜索被取消（如客户端断开）时取消尚未开始的 LLM 调用
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def _beam_width(candidates: List[Thought], branches: int, limits: SearchLimits) -> int:
+        """自适应束宽：候选得分越接近（标准差越小），保留的节点越少"""
+        if not limits.adaptive_beam or len(candidates) < 2:
+            return branches
+        spread = statistics.pstdev(candidate.score for candidate in candidates)
+        if spread >= limits.beam_std_threshold:
+            return branches
+        width = math.ceil(branches * spread / limits.beam_std_threshold)
+        return max(max(1, limits.min_beam_width), min(branches, width))
+
+    @staticmethod
+    def _budget_exceeded(limits: SearchLimits, started_at: float, stats: _SearchStats) -> Optional[str]:
+        """检查时间和 token 预算，超出时返回结束原因"""
+        if limits.max_seconds is not None and time.monotonic() - started_at >= limits.max_seconds:
+            return StopReason.TIME_BUDGET
+        if limits.max_tokens is not None and stats.usage()["tokens"] >= limits.max_tokens:
+            return StopReason.TOKEN_BUDGET
+        return None
+
     def solve(
         self,
         problem: str,
         context: str = "",
         max_branches: Optional[int] = None,
         max_depth: Optional[int] = None,
+        score_strategy: str = ScoreStrategy.SINGLE,
+        limits: Optional[SearchLimits] = None,
     ) -> dict:
         """Run a small tree search and return the best reasoning path.
         
+        Args:
+            score_strategy: 打分策略，"single" 逐个打分，"batch" 每个节点批量打分
+            limits: 本次搜索的停止规则（默认使用构造时的 limits）
+        
         Returns:
             dict: {
                 "thinking_process": str,  # 思考过程
                 "best_score": float,      # 最佳得分
                 "final_answer": str,      # 最终答案
-                "success": bool           # 是否成功
+                "success": bool,          # 是否成功
+                "cache": dict,            # 本次搜索的缓存命中统计
+                "stop_reason": str        # 搜索结束原因
             }
         """
         # 非流式版本：收集所有事件然后返回
@@ -134,8 +626,10 @@ class TreeOfThoughtReasoner:
         best_score = 0.0
         final_answer = ""
         success = False
+        cache_stats = {}
+        stop_reason = ""
         
-        for event in self.solve_stream(problem, context, max_branches, max_depth):
+        for event in self.solve_stream(problem, context, max_branches, max_depth, score_strategy, limits):
             event_type = event.get("type", "")
             if event_type in [StreamEvent.THINKING_START, StreamEvent.THINKING_LAYER, 
                               StreamEvent.THINKING_STEP, StreamEvent.THINKING_SCORE,
@@ -145,12 +639,16 @@ class TreeOfThoughtReasoner:
                 best_score = event.get("best_score", 0.0)
                 final_answer = event.get("final_answer", "")
                 success = event.get("success", False)
+                cache_stats = event.get("cache", {})
+                stop_reason = event.get("stop_reason", "")
         
         return {
             "thinking_process": "\n".join(thinking_steps),
             "best_score": best_score,
             "final_answer": final_answer,
-            "success": success
+            "success": success,
+            "cache": cache_stats,
+            "stop_reason": stop_reason
         }
     
     def solve_stream(
@@ -159,22 +657,37 @@ class TreeOfThoughtReasoner:
         context: str = "",
         max_branches: Optional[int] = None,
         max_depth: Optional[int] = None,
+        score_strategy: str = ScoreStrategy.SINGLE,
+        limits: Optional[SearchLimits] = None,
+        cancelled: Optional[threading.Event] = None,
     ) -> Generator[dict, None, None]:
         """
         流式版本的 solve，边思考边输出事件。
         
+        Args:
+            score_strategy: 打分策略，"single" 逐个打分，"batch" 每个节点批量打分
+            limits: 本次搜索的停止规则（默认使用构造时的 limits）
+            cancelled: 取消标志；被设置后不再发起新的 LLM 调用，搜索以 cancelled 结束
+        
         Yields:
             dict: 包含 type 和 content 的事件字典
         """
         branches = max_branches or self.default_branches
         depth_limit = max_depth or self.default_depth
+        limits = limits or self.limits
 
         # 开始事件
         yield {
             "type": StreamEvent.THINKING_START,
-            "content": f"🎯 问题: {problem}\n⚙️ 参数: 分支数={branches}, 深度={depth_limit}"
+            "content": f"🎯 问题: {problem}\n⚙️ 参数: 分支数={branches}, 深度={depth_limit}, 打分策略={score_strategy}"
         }
 
+        stats = _SearchStats(cancelled)
+        started_at = time.monotonic()
+        stop_reason = StopReason.MAX_DEPTH
+        stale_layers = 0
+        layers_explored = 0
+        merged_total = 0
         frontier: List[Thought] = [Thought(content=problem, score=0.0, path=[problem])]
         best: Optional[Thought] = None
 
@@ -183,48 +696,88 @@ class TreeOfThoughtReasoner:
                 "type": StreamEvent.THINKING_LAYER,
                 "content": f"📊 第 {depth + 1}/{depth_limit} 层探索...",
                 "layer": depth + 1,
-                "total_layers": depth_limit
+                "total_layers": depth_limit,
+                "beam_width": len(frontier)
             }
+            layers_explored = depth + 1
+            previous_best = best.score if best is not None else None
             
             next_frontier: List[Thought] = []
-            for node in frontier:
-                proposals = self._propose(problem, context, node.path, branches)
-                
-                current_path = ' → '.join(node.path[-2:]) if len(node.path) > 1 else '(起点)'
+            expand = self._expand_concurrent if self._executor is not None else self._expand_serial
+            dedup = self._layer_deduplicator()
+            expansion = expand(problem, context, frontier, branches, score_strategy, stats, dedup)
+            try:
+                for event, candidate in expansion:
+                    yield event
+                    
+                    if candidate is not None:
+                        next_frontier.append(candidate)
+                        if best is None or candidate.score > best.score:
+                            best = candidate
+                        if limits.score_threshold is not None and candidate.score >= limits.score_threshold:
+                            stop_reason = StopReason.SCORE_THRESHOLD
+                            break
+                    
+                    exceeded = self._budget_exceeded(limits, started_at, stats)
+                    if exceeded:
+                        stop_reason = exceeded
+                        break
+            finally:
+                # 提前结束时关闭扩展生成器，取消尚未开始的 LLM 调用
+                expansion.close()
+            
+            merged = dedup.merged if dedup is not None else 0
+            merged_total += merged
+            if merged:
                 yield {
                     "type": StreamEvent.THINKING_STEP,
-                    "content": f"  └─ 当前路径: {current_path}",
-                    "path": current_path
+                    "content": f"  🔗 本层合并 {merged} 个相似思路",
+                    "layer": depth + 1,
+                    "merged": merged
                 }
-                
-                for i, proposal in enumerate(proposals, 1):
-                    score, reason = self._score(problem, context, proposal)
-                    thought_path = node.path + [proposal]
-                    combined = f"思路: {proposal}\n理由: {reason}"
-                    candidate = Thought(content=combined, score=score, path=thought_path)
-                    next_frontier.append(candidate)
-                    
-                    # 输出评分事件
-                    short_proposal = proposal[:50] + ('...' if len(proposal) > 50 else '')
-                    yield {
-                        "type": StreamEvent.THINKING_SCORE,
-                        "content": f"     {i}. [{score:.1f}分] {short_proposal}",
-                        "proposal": proposal,
-                        "score": score,
-                        "reason": reason
-                    }
-                    
-                    if best is None or score > best.score:
-                        best = candidate
             
-            frontier = sorted(next_frontier, key=lambda t: t.score, reverse=True)[:branches]
+            if stats.is_cancelled():
+                stop_reason = StopReason.CANCELLED
+            if stop_reason != StopReason.MAX_DEPTH:
+                break
+            
+            width = self._beam_width(next_frontier, branches, limits)
+            frontier = sorted(next_frontier, key=lambda t: t.score, reverse=True)[:width]
+            narrowed = "（得分接近，自适应收窄）" if width < branches and len(next_frontier) > width else ""
             yield {
                 "type": StreamEvent.THINKING_STEP,
-                "content": f"  ✅ 保留前 {len(frontier)} 个最优思路"
+                "content": f"  ✅ 保留前 {len(frontier)} 个最优思路{narrowed}"
             }
             
             if not frontier:
+                stop_reason = StopReason.NO_CANDIDATES
                 break
+            
+            # 平台期检测：连续多层最佳得分没有明显提升
+            if previous_best is not None and limits.plateau_layers > 0 and depth + 1 < depth_limit:
+                if best.score - previous_best < limits.plateau_min_gain:
+                    stale_layers += 1
+                else:
+                    stale_layers = 0
+                if stale_layers >= limits.plateau_layers:
+                    stop_reason = StopReason.PLATEAU
+                    break
+
+        if stop_reason != StopReason.MAX_DEPTH:
+            yield {
+                "type": StreamEvent.THINKING_STEP,
+                "content": f"  ⏹️ 提前结束搜索: {stop_reason}（已探索 {layers_explored}/{depth_limit} 层）",
+                "stop_reason": stop_reason
+            }
+
+        summary = {
+            "cache": stats.as_dict(),
+            "usage": stats.usage(),
+            "stop_reason": stop_reason,
+            "layers_explored": layers_explored,
+            "merged_thoughts": merged_total,
+            "elapsed_seconds": round(time.monotonic() - started_at, 3)
+        }
 
         if best is None:
             yield {
@@ -232,7 +785,8 @@ class TreeOfThoughtReasoner:
                 "content": "❌ 未能生成有效思路",
                 "best_score": 0.0,
                 "final_answer": "未能生成有效思路，请尝试提供更多信息。",
-                "success": False
+                "success": False,
+                **summary
             }
             return
 
@@ -250,5 +804,6 @@ class TreeOfThoughtReasoner:
             "content": "✅ 深度思考完成",
             "best_score": best.score,
             "final_answer": best.content,
-            "success": True
+            "success": True,
+            **summary
         }
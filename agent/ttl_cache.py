@@ -0,0 +1,81 @@
+"""
+LRU + TTL 缓存
+线程安全，供 TOT 推理、嵌入等模块缓存昂贵的计算结果
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    带过期时间的 LRU 缓存
+
+    特性：
+    1. 超过 maxsize 时淘汰最久未使用的条目
+    2. 条目写入超过 ttl 秒后视为过期（ttl 为 None 表示永不过期）
+    3. 统计命中/未命中次数
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 3600.0):
+        """
+        初始化缓存
+
+        Args:
+            maxsize: 最大条目数
+            ttl: 条目存活时间（秒）
+        """
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存，未命中或已过期时返回 default"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """写入缓存"""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """删除并返回缓存条目"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return entry[0] if entry is not None else default
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        """获取缓存统计"""
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses
+        }
@@ -0,0 +1,310 @@
+"""
+Agent 执行层
+将同步的 Agent 调用（LLM、向量检索、TOT 推理）放到有界线程池中执行，
+避免阻塞 uvicorn 事件循环，并按接口统计排队深度和等待时间。
+同时提供同步生成器到异步迭代器的流式桥接（用于 SSE）。
+"""
+
+import os
+import time
+import asyncio
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Any, AsyncGenerator, Awaitable, Iterator
+
+
+class WorkerPoolFullError(Exception):
+    """排队请求数超过上限"""
+
+
+@dataclass
+class EndpointMetrics:
+    """单个接口的执行统计"""
+    queue_depth: int = 0        # 当前排队等待的请求数
+    in_flight: int = 0          # 当前正在执行的请求数
+    submitted: int = 0          # 累计提交数
+    completed: int = 0          # 累计成功数
+    failed: int = 0             # 累计失败数
+    rejected: int = 0           # 因队列已满被拒绝的请求数
+    total_wait_ms: float = 0.0  # 累计排队等待时间
+    max_wait_ms: float = 0.0    # 最大排队等待时间
+    total_run_ms: float = 0.0   # 累计执行时间
+
+    def snapshot(self) -> Dict[str, Any]:
+        started = self.completed + self.failed + self.in_flight
+        finished = self.completed + self.failed
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_ms / started, 2) if started else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 2),
+            "avg_run_ms": round(self.total_run_ms / finished, 2) if finished else 0.0
+        }
+
+
+class AgentWorkerPool:
+    """
+    有界的 Agent 工作池
+
+    特性：
+    1. 固定大小的线程池执行同步调用（run）
+    2. 原生异步调用（run_async）等待 LLM 时不占用线程，使用单独的、更大的并发上限；
+       其中的阻塞步骤（检索、搜索、TOT）通过 executor 仍在同一个有界线程池中执行
+    3. 通过信号量限制并发数，超出的请求在事件循环中排队等待
+    4. 同步 / 异步调用各自的排队数超过 max_queue 时直接拒绝，避免请求无限堆积
+    5. 按接口统计排队深度、等待时间和执行时间
+
+    所有统计字段只在事件循环线程中修改，无需加锁。
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        max_async: Optional[int] = None
+    ):
+        """
+        初始化工作池
+
+        Args:
+            max_workers: 最大并发数（线程数），默认读取 AGENT_MAX_WORKERS，否则为 8
+            max_queue: 最大排队数，默认读取 AGENT_MAX_QUEUE，否则为 100；0 表示不限制
+            max_async: 异步调用的最大并发数，默认读取 AGENT_MAX_ASYNC，否则为 256
+        """
+        self.max_workers = max(1, max_workers or int(os.getenv("AGENT_MAX_WORKERS", "8")))
+        self.max_async = max(1, max_async or int(os.getenv("AGENT_MAX_ASYNC", "256")))
+        if max_queue is None:
+            max_queue = int(os.getenv("AGENT_MAX_QUEUE", "100"))
+        self.max_queue = max(0, max_queue)
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="agent-worker"
+        )
+        self._semaphore = asyncio.Semaphore(self.max_workers)
+        self._async_semaphore = asyncio.Semaphore(self.max_async)
+        # 每个信号量各自的排队数：同步与异步调用分别限流，互不占用对方的排队名额
+        self._queue_depths: Dict[asyncio.Semaphore, int] = {
+            self._semaphore: 0,
+            self._async_semaphore: 0
+        }
+        self._metrics: Dict[str, EndpointMetrics] = {}
+
+    def _get_metrics(self, endpoint: str) -> EndpointMetrics:
+        metrics = self._metrics.get(endpoint)
+        if metrics is None:
+            metrics = EndpointMetrics()
+            self._metrics[endpoint] = metrics
+        return metrics
+
+    def _total_queue_depth(self) -> int:
+        return sum(self._queue_depths.values())
+
+    async def run(self, endpoint: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        在工作池中执行同步函数
+
+        Args:
+            endpoint: 接口名称（用于统计）
+            func: 需要执行的同步函数
+
+        Returns:
+            函数返回值
+
+        Raises:
+            WorkerPoolFullError: 排队数超过上限
+        """
+        loop = asyncio.get_running_loop()
+
+        async def call():
+            return await loop.run_in_executor(self.executor, lambda: func(*args, **kwargs))
+
+        return await self._execute(endpoint, call, self._semaphore)
+
+    async def run_async(self, endpoint: str, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        在异步并发限制下执行协程函数（如 LangGraphAgent.achat）
+
+        Args:
+            endpoint: 接口名称（用于统计）
+            func: 需要执行的协程函数
+
+        Returns:
+            协程返回值
+
+        Raises:
+            WorkerPoolFullError: 排队数超过上限
+        """
+        return await self._execute(endpoint, lambda: func(*args, **kwargs), self._async_semaphore)
+
+    async def _execute(
+        self,
+        endpoint: str,
+        call: Callable[[], Awaitable[Any]],
+        semaphore: asyncio.Semaphore
+    ) -> Any:
+        """在并发限制下执行协程工厂 call，并记录统计"""
+        metrics = self._get_metrics(endpoint)
+
+        if self.max_queue and semaphore.locked() and self._queue_depths[semaphore] >= self.max_queue:
+            metrics.rejected += 1
+            raise WorkerPoolFullError(f"Agent 工作池已满（排队 {self.max_queue}）")
+
+        metrics.submitted += 1
+        metrics.queue_depth += 1
+        self._queue_depths[semaphore] += 1
+        enqueued_at = time.perf_counter()
+        waiting = True
+        try:
+            async with semaphore:
+                waiting = False
+                metrics.queue_depth -= 1
+                self._queue_depths[semaphore] -= 1
+                wait_ms = (time.perf_counter() - enqueued_at) * 1000
+                metrics.total_wait_ms += wait_ms
+                metrics.max_wait_ms = max(metrics.max_wait_ms, wait_ms)
+
+                metrics.in_flight += 1
+                started_at = time.perf_counter()
+                try:
+                    result = await call()
+                    metrics.completed += 1
+                    return result
+                except BaseException:
+                    metrics.failed += 1
+                    raise
+                finally:
+                    metrics.in_flight -= 1
+                    metrics.total_run_ms += (time.perf_counter() - started_at) * 1000
+        finally:
+            # 排队期间被取消（如客户端断开）
+            if waiting:
+                metrics.queue_depth -= 1
+                self._queue_depths[semaphore] -= 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取工作池统计信息"""
+        return {
+            "max_workers": self.max_workers,
+            "max_async": self.max_async,
+            "max_queue": self.max_queue,
+            "queue_depth": self._total_queue_depth(),
+            "endpoints": {name: m.snapshot() for name, m in self._metrics.items()}
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭线程池"""
+        self.executor.shutdown(wait=wait)
+
+
+# 流式桥接队列中的消息类型
+_STREAM_ITEM = "item"
+_STREAM_ERROR = "error"
+_STREAM_DONE = "done"
+
+
+class StreamBridge:
+    """
+    同步生成器 → 异步迭代器的共享桥接
+
+    特性：
+    1. 所有流共享一个有界线程池，不再为每个流单独创建线程池
+    2. 生产者线程通过 loop.call_soon_threadsafe 写入 asyncio.Queue，消费端无需轮询
+    3. 背压：每个流最多缓冲 buffer_size 个事件，客户端读取慢时生产者阻塞等待
+    4. 客户端断开时通知生产者停止，并 close() 同步生成器，
+       使其在 yield 处抛出 GeneratorExit，从而中止底层 LLM 流
+    5. 长时间不 yield 的生成器（如 TOT 推理）可共享 cancelled 标志，
+       在两次 LLM 调用之间自行检查并提前结束
+    """
+
+    def __init__(
+        self,
+        max_streams: Optional[int] = None,
+        buffer_size: Optional[int] = None
+    ):
+        """
+        初始化流式桥接
+
+        Args:
+            max_streams: 同时运行的流数量上限，默认读取 AGENT_MAX_STREAMS，否则为 32
+            buffer_size: 每个流的事件缓冲上限，默认读取 AGENT_STREAM_BUFFER，否则为 64
+        """
+        self.max_streams = max(1, max_streams or int(os.getenv("AGENT_MAX_STREAMS", "32")))
+        self.buffer_size = max(1, buffer_size or int(os.getenv("AGENT_STREAM_BUFFER", "64")))
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_streams,
+            thread_name_prefix="agent-stream"
+        )
+        self.active_streams = 0
+
+    async def iterate(
+        self,
+        stream_factory: Callable[[], Iterator[Any]],
+        cancelled: Optional[threading.Event] = None
+    ) -> AsyncGenerator[Any, None]:
+        """
+        在线程池中运行同步生成器，并以异步方式逐个产出事件
+
+        Args:
+            stream_factory: 返回同步生成器的无参函数（在工作线程中调用）
+            cancelled: 取消标志（默认自行创建）；消费端停止迭代时被设置，
+                可同时交给生成器，使其在 yield 之间也能感知客户端断开
+
+        Yields:
+            生成器产出的事件；生成器内部的异常会在消费端重新抛出
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        slots = threading.Semaphore(self.buffer_size)
+        cancelled = cancelled or threading.Event()
+
+        def push(kind: str, payload: Any = None) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (kind, payload))
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+        def produce() -> None:
+            stream = None
+            try:
+                stream = stream_factory()
+                for event in stream:
+                    # 缓冲区已满时等待消费端，期间检查是否已取消
+                    while not slots.acquire(timeout=0.5):
+                        if cancelled.is_set():
+                            return
+                    if cancelled.is_set():
+                        return
+                    push(_STREAM_ITEM, event)
+            except Exception as e:
+                push(_STREAM_ERROR, e)
+            finally:
+                if stream is not None and hasattr(stream, "close"):
+                    stream.close()
+                push(_STREAM_DONE)
+
+        self.active_streams += 1
+        loop.run_in_executor(self.executor, produce)
+        try:
+            while True:
+                kind, payload = await queue.get()
+                if kind == _STREAM_DONE:
+                    return
+                if kind == _STREAM_ERROR:
+                    raise payload
+                slots.release()
+                yield payload
+        finally:
+            # 正常结束、出错或客户端断开（任务被取消）时都通知生产者停止
+            cancelled.set()
+            self.active_streams -= 1
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭线程池"""
+        self.executor.shutdown(wait=wait)